@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+端到端基准测试
+启动本地模拟的豆瓣服务器（mock_douban.py），生成指定数量书名的 bookNames.json，
+在子进程中通过 douban_book_cover.main() 完整运行一次，统计：
+每秒处理书数、每本书的请求数、每本书耗时的 p50/p99（按直方图估计）和峰值内存
+
+用法: python benchmarks/bench_e2e.py [--sizes 100,1000,10000] [--latency 0.02] [--error-rate 0.01]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from mock_douban import MockDouban
+
+# 每个分类的书名数
+TITLES_PER_CATEGORY = 100
+
+
+def write_books(path, size):
+    """
+    生成 size 个书名的书籍列表
+    """
+    books = {}
+    for i in range(size):
+        books.setdefault(f"分类{i // TITLES_PER_CATEGORY:03d}", []).append(f"基准测试书目第{i:05d}号")
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(books, f, ensure_ascii=False)
+
+
+def run_child(args):
+    """
+    子进程：把豆瓣地址指向模拟服务器，运行一次 main()，输出 JSON 结果
+    """
+    os.environ['DOUBAN_SEARCH_URL'] = args.search_url
+    os.environ['DOUBAN_SUBJECT_URL'] = args.subject_url
+    sys.path.insert(0, REPO_DIR)
+    import douban_book_cover
+    import rate_limiter
+
+    # 模拟服务器的三个主机使用基准测试指定的速率和并发数
+    for netloc in args.netlocs.split(','):
+        rate_limiter.DEFAULT_HOST_CONFIGS[netloc] = {
+            'rate': args.host_rate, 'min_rate': args.host_rate / 20, 'max_rate': args.host_rate,
+        }
+        douban_book_cover.DEFAULT_HOST_LIMITS[netloc] = args.host_limit
+
+    os.chdir(args.workdir)
+    argv = ['--books', 'bookNames.json', '--concurrency', str(args.concurrency),
+            '--log-level', 'quiet', '--metrics-json', 'metrics.json', '--verify', args.verify]
+    start = time.perf_counter()
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        douban_book_cover.main(argv)
+    elapsed = time.perf_counter() - start
+
+    with open('metrics.json', 'r', encoding='utf-8') as f:
+        metrics = json.load(f)
+    print(json.dumps({
+        'elapsed': elapsed,
+        'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'books': metrics['books'],
+        'book_latency': metrics['stages'].get('book', {}),
+    }))
+
+
+def run_size(mock, size, args):
+    """
+    父进程：为一个规模准备工作目录并启动子进程
+    """
+    workdir = tempfile.mkdtemp(prefix=f'bench-e2e-{size}-')
+    try:
+        write_books(os.path.join(workdir, 'bookNames.json'), size)
+        mock.reset_counts()
+        command = [
+            sys.executable, os.path.abspath(__file__), '--child',
+            '--workdir', workdir,
+            '--search-url', mock.search_url,
+            '--subject-url', mock.subject_url,
+            '--netlocs', ','.join(mock.netloc(name) for name in ('www', 'book', 'img')),
+            '--host-rate', str(args.host_rate),
+            '--host-limit', str(args.host_limit),
+            '--concurrency', str(args.concurrency),
+            '--verify', args.verify,
+        ]
+        output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        result['requests'] = mock.total_requests()
+        return result
+    finally:
+        if args.keep:
+            print(f"  工作目录: {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="端到端基准测试（本地模拟服务器）")
+    parser.add_argument('--sizes', default='100,1000,10000', help="书名数量，逗号分隔（默认: 100,1000,10000）")
+    parser.add_argument('--latency', type=float, default=0.02, help="模拟服务器的基础延迟，单位秒（默认: 0.02）")
+    parser.add_argument('--jitter', type=float, default=0.02, help="模拟服务器的随机延迟上限，单位秒（默认: 0.02）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="模拟服务器返回 418/429/503 的概率（默认: 0）")
+    parser.add_argument('--concurrency', type=int, default=8, help="同时处理的书籍数量（默认: 8）")
+    parser.add_argument('--host-rate', type=float, default=200.0, help="每个模拟主机的请求速率上限，次/秒（默认: 200）")
+    parser.add_argument('--host-limit', type=int, default=8, help="每个模拟主机的并发请求数（默认: 8）")
+    parser.add_argument('--verify', default='lazy', help="封面验证策略（默认: lazy）")
+    parser.add_argument('--output', default=None, help="把结果写入 JSON 文件，便于比较不同版本")
+    parser.add_argument('--keep', action='store_true', help="保留每次运行的工作目录")
+    # 子进程参数
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--workdir', help=argparse.SUPPRESS)
+    parser.add_argument('--search-url', help=argparse.SUPPRESS)
+    parser.add_argument('--subject-url', help=argparse.SUPPRESS)
+    parser.add_argument('--netlocs', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    sizes = [int(size) for size in args.sizes.split(',') if size.strip()]
+    mock = MockDouban(args.latency, args.jitter, args.error_rate).start()
+    print(f"模拟服务器: 延迟 {args.latency}s + 抖动 {args.jitter}s，错误率 {args.error_rate:.1%}")
+    print(f"并发 {args.concurrency}，每主机 {args.host_rate} 次/秒、{args.host_limit} 个并发请求，验证策略 {args.verify}")
+    print("=" * 90)
+    print(f"{'书名数':>8}{'用时(s)':>10}{'书/秒':>10}{'请求/书':>10}{'p50(s)':>10}{'p99(s)':>10}{'峰值内存(MB)':>14}  结果")
+
+    results = []
+    try:
+        for size in sizes:
+            result = run_size(mock, size, args)
+            result['size'] = size
+            results.append(result)
+            latency = result['book_latency']
+            books = ', '.join(f"{status}: {count}" for status, count in sorted(result['books'].items()))
+            print(f"{size:>8}{result['elapsed']:>10.1f}{size / result['elapsed']:>10.1f}"
+                  f"{result['requests'] / size:>10.2f}{latency.get('p50', 0):>10.3f}{latency.get('p99', 0):>10.3f}"
+                  f"{result['max_rss_kb'] / 1024:>14.1f}  {books}")
+    finally:
+        mock.stop()
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump({
+                'latency': args.latency,
+                'jitter': args.jitter,
+                'error_rate': args.error_rate,
+                'concurrency': args.concurrency,
+                'results': results,
+            }, f, ensure_ascii=False, indent=2)
+        print(f"结果已保存: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
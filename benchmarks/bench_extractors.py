@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+页面解析器微基准测试
+用 fixtures/ 中保存的搜索页和详情页比较各解析器的耗时，
+并以旧实现（BeautifulSoup 解析整页后逐个 find）作为基准
+
+用法: python benchmarks/bench_extractors.py [--repeat 50]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from bs4 import BeautifulSoup
+
+import page_extractors
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def legacy_subject(html):
+    """
+    旧实现：整页建树后多次全树查找
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    soup.find('h1')
+    soup.find('a', {'name': 'author'})
+    soup.find('span', string='出版社:')
+    soup.find('span', string='出版年:')
+    soup.find('span', string='ISBN:')
+    soup.find('strong', class_='rating_num')
+    soup.find('a', class_='rating_people')
+    soup.find('div', id='mainpic')
+    soup.find('div', {'id': 'link-report'})
+
+
+def legacy_search(html):
+    """
+    旧实现：整页建树后查找所有搜索结果
+    """
+    soup = BeautifulSoup(html, 'html.parser')
+    for item in soup.find_all('div', class_='result'):
+        item.find('a')
+        item.find('span', class_='rating_nums')
+        item.find('p', class_='')
+
+
+def load_fixtures():
+    pages = {'search': [], 'subject': []}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, '*.html'))):
+        kind = 'search' if os.path.basename(path).startswith('search_') else 'subject'
+        with open(path, 'r', encoding='utf-8') as f:
+            pages[kind].append(f.read())
+    return pages
+
+
+def bench(func, pages, repeat):
+    """
+    返回每页的平均耗时（毫秒）
+    """
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for html in pages:
+            func(html)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(pages))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="页面解析器微基准测试")
+    parser.add_argument('--repeat', type=int, default=50, help="每个页面重复解析的次数（默认: 50）")
+    args = parser.parse_args()
+
+    pages = load_fixtures()
+    backends = page_extractors.available_backends()
+    print(f"可用解析器: {', '.join(backends)}")
+    print(f"样本: {len(pages['search'])} 个搜索页, {len(pages['subject'])} 个详情页, 每页重复 {args.repeat} 次")
+    print("=" * 50)
+
+    for kind, legacy, extract in (
+        ('subject', legacy_subject, page_extractors.extract_subject_page),
+        ('search', legacy_search, page_extractors.extract_search_results),
+    ):
+        if not pages[kind]:
+            continue
+        baseline = bench(legacy, pages[kind], args.repeat)
+        print(f"{kind}:")
+        print(f"  {'旧实现 (bs4 整页)':<20}{baseline:8.3f} ms/页")
+        for backend in backends:
+            elapsed = bench(lambda html: extract(html, backend), pages[kind], args.repeat)
+            print(f"  {backend:<20}{elapsed:8.3f} ms/页  ({baseline / elapsed:5.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
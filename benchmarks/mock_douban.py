@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+本地模拟的豆瓣服务器（基准测试用）
+分别模拟 www.douban.com（搜索页）、book.douban.com（详情页）和 doubanio.com（封面图片）三个主机，
+页面以 fixtures/ 中保存的真实页面为模板生成；可以设置响应延迟、抖动和 418/429/503 错误注入
+
+单独运行: python benchmarks/mock_douban.py [--latency 0.05] [--error-rate 0.01]
+然后按输出设置 DOUBAN_SEARCH_URL / DOUBAN_SUBJECT_URL 环境变量运行 douban_book_cover.py
+"""
+
+import argparse
+import hashlib
+import html
+import io
+import os
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, quote, urlsplit
+
+from PIL import Image
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# 每个书名的搜索结果：(书名后缀, 出版年)，只有最后一个版本符合出版年要求
+SEARCH_VERSIONS = [('（旧版）', 2010), ('', 2012), ('', 2021)]
+
+# 模板中需要替换的内容
+_TEMPLATE_TITLE = '活着（定本·2021新版 精装）'
+_TEMPLATE_IMAGE_HOST = 'https://img9.doubanio.com'
+_TEMPLATE_IMAGE_ID = 's33834064'
+_TEMPLATE_PUBDATE = '2021-10-1'
+
+
+def subject_id(title, position):
+    """
+    由书名和搜索结果位置确定的书籍ID（同一书名每次得到相同的ID）
+    """
+    digest = hashlib.md5(f"{title}\t{position}".encode('utf-8')).hexdigest()
+    return str(10000000 + int(digest[:7], 16) % 90000000)
+
+
+def _jpeg(size, color):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+class _Server(ThreadingHTTPServer):
+    """
+    客户端提前断开连接（对冲请求被取消、请求超时）是正常情况，不打印异常
+    """
+    daemon_threads = True
+
+    def handle_error(self, request, client_address):
+        if isinstance(sys.exc_info()[1], (ConnectionResetError, BrokenPipeError)):
+            return
+        super().handle_error(request, client_address)
+
+
+class MockDouban:
+    """
+    三个本地 HTTP 服务器，start() 后通过 search_url / subject_url 得到要使用的地址
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, error_codes=(418, 429, 503), host='127.0.0.1'):
+        self.latency = latency  # 每个请求的基础延迟（秒）
+        self.jitter = jitter  # 在基础延迟上随机增加 0~jitter 秒
+        self.error_rate = error_rate  # 返回错误状态码的概率
+        self.error_codes = tuple(error_codes)
+        self.host = host
+        self.requests = {}  # (服务器, 状态码) → 请求数
+        self._lock = threading.Lock()
+        self._servers = {}
+        self._subjects = {}  # 书籍ID → (书名, 出版年)
+
+        with open(os.path.join(FIXTURES_DIR, 'search_活着.html'), 'r', encoding='utf-8') as f:
+            search_page = f.read()
+        start = search_page.index('<div class="result-list">') + len('<div class="result-list">')
+        end = search_page.rindex('<div class="result">')
+        end = search_page.index('\n</div>\n', end) + len('\n</div>\n')
+        self._search_head, self._search_tail = search_page[:start], search_page[end:]
+        with open(os.path.join(FIXTURES_DIR, 'subject_35542002.html'), 'r', encoding='utf-8') as f:
+            self._subject_template = f.read()
+        self._images = {
+            'l': _jpeg((500, 740), (180, 40, 40)),
+            'm': _jpeg((270, 400), (180, 40, 40)),
+            's': _jpeg((135, 200), (180, 40, 40)),
+        }
+
+    @property
+    def search_url(self):
+        return f"{self.base_url('www')}/search"
+
+    @property
+    def subject_url(self):
+        return f"{self.base_url('book')}/subject/{{book_id}}/"
+
+    def base_url(self, name):
+        server = self._servers[name]
+        return f"http://{self.host}:{server.server_address[1]}"
+
+    def netloc(self, name):
+        return urlsplit(self.base_url(name)).netloc
+
+    def total_requests(self):
+        with self._lock:
+            return sum(self.requests.values())
+
+    def reset_counts(self):
+        with self._lock:
+            self.requests.clear()
+
+    def start(self):
+        for name in ('www', 'book', 'img'):
+            server = _Server((self.host, 0), self._handler_class(name))
+            threading.Thread(target=server.serve_forever, daemon=True, name=f'mock-{name}').start()
+            self._servers[name] = server
+        return self
+
+    def stop(self):
+        for server in self._servers.values():
+            server.shutdown()
+            server.server_close()
+        self._servers.clear()
+
+    def search_page(self, query):
+        items = []
+        for position, (suffix, year) in enumerate(SEARCH_VERSIONS):
+            sid = subject_id(query, position)
+            title = query + suffix
+            with self._lock:
+                self._subjects[sid] = (title, year)
+            link = html.escape(
+                "https://www.douban.com/link2/?url=" + quote(f"https://book.douban.com/subject/{sid}/", safe='')
+                + f"&query={quote(query)}&cat_id=1001&type=search&pos={position}"
+            )
+            items.append(f'''<div class="result">
+  <div class="pic">
+    <a class="nbg" href="{link}" target="_blank" title="{html.escape(title)}"><img src="{self.base_url('img')}/view/subject/s/public/s{sid}.jpg"></a>
+  </div>
+  <div class="content">
+    <div class="title">
+      <h3>
+        <span>[书籍]</span>&nbsp;<a href="{link}" target="_blank" >{html.escape(title)} </a>
+      </h3>
+      <div class="rating-info">
+        <span class="allstar45"></span>
+        <span class="rating_nums">9.{position}</span>
+        <span>(1000{position}人评价)</span>
+        <span class="subject-cast">作者 / 出版社 / {year}</span>
+      </div>
+    </div>
+    <p>模拟的搜索结果。</p>
+  </div>
+</div>
+''')
+        return self._search_head + '\n' + ''.join(items) + self._search_tail
+
+    def subject_page(self, sid):
+        with self._lock:
+            title, year = self._subjects.get(sid, (f"书籍{sid}", 2021))
+        page = self._subject_template.replace(_TEMPLATE_TITLE, html.escape(title))
+        page = page.replace(_TEMPLATE_IMAGE_HOST, self.base_url('img'))
+        page = page.replace(_TEMPLATE_IMAGE_ID, f"s{sid}")
+        return page.replace(_TEMPLATE_PUBDATE, f"{year}-10-1")
+
+    def _handler_class(self, name):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def _respond(self, status, body=b'', content_type='text/html; charset=utf-8', send_body=True):
+                with mock._lock:
+                    key = (name, status)
+                    mock.requests[key] = mock.requests.get(key, 0) + 1
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                if send_body:
+                    self.wfile.write(body)
+
+            def _handle(self, send_body):
+                delay = mock.latency + (random.uniform(0, mock.jitter) if mock.jitter else 0)
+                if delay:
+                    time.sleep(delay)
+                if mock.error_rate and random.random() < mock.error_rate:
+                    self._respond(random.choice(mock.error_codes), b'<html>blocked</html>', send_body=send_body)
+                    return
+
+                url = urlsplit(self.path)
+                if name == 'www' and url.path == '/search':
+                    query = parse_qs(url.query).get('q', [''])[0]
+                    self._respond(200, mock.search_page(query).encode('utf-8'), send_body=send_body)
+                    return
+                if name == 'book':
+                    match = re.match(r'^/subject/(\d+)/?$', url.path)
+                    if match:
+                        self._respond(200, mock.subject_page(match.group(1)).encode('utf-8'), send_body=send_body)
+                        return
+                if name == 'img':
+                    match = re.match(r'^/view/subject/([sml])/public/s\d+\.jpg$', url.path)
+                    if match:
+                        self._respond(200, mock._images[match.group(1)], 'image/jpeg', send_body=send_body)
+                        return
+                self._respond(404, b'not found', send_body=send_body)
+
+            def do_GET(self):
+                self._handle(True)
+
+            def do_HEAD(self):
+                self._handle(False)
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="本地模拟的豆瓣服务器")
+    parser.add_argument('--latency', type=float, default=0.0, help="每个请求的基础延迟，单位秒（默认: 0）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="随机增加的延迟上限，单位秒（默认: 0）")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="返回 418/429/503 的概率（默认: 0）")
+    args = parser.parse_args()
+
+    mock = MockDouban(args.latency, args.jitter, args.error_rate).start()
+    print("模拟服务器已启动，按 Ctrl-C 退出")
+    print(f"export DOUBAN_SEARCH_URL={mock.search_url}")
+    print(f"export DOUBAN_SUBJECT_URL='{mock.subject_url}'")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        mock.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+书籍信息目录（SQLite）
+所有书籍的信息保存在一个数据库中（covers/.catalog.sqlite），取代每本书一个 _info.json：
+- 保存详情页解析出的全部字段（作者、出版社、出版年、ISBN、评分、评分人数、简介、各尺寸封面地址）
+- 写入先放在缓冲区，攒够一批或超过刷新间隔后在一个事务中提交；批处理在进度日志记录
+  一本书完成之前会提交缓冲区，同时完成的几本书的信息在一个事务中提交
+- 按书名、ISBN、豆瓣书籍ID查询都有索引
+- 多个进程（任务队列的工作进程）可以同时写入同一个目录
+旧的每本书一个 _info.json 的格式仍可导出（export），也可以把已有的 _info.json 导入（import）
+
+python book_catalog.py lookup --title 活着
+python book_catalog.py lookup --isbn 9787506365437
+python book_catalog.py export                 # 按旧格式导出 covers/分类/书名_info.json
+python book_catalog.py import                 # 导入已有的 _info.json
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+CATALOG_NAME = '.catalog.sqlite'
+
+# 旧版 _info.json 中的字段（按原顺序）
+LEGACY_INFO_FIELDS = ('title', 'author', 'publisher', 'pubdate', 'small_cover', 'medium_cover', 'large_cover')
+
+# 书籍信息字段（covers 字典中的键）
+BOOK_FIELDS = ('subject_id', 'title', 'author', 'publisher', 'pubdate', 'isbn', 'rating', 'rating_people',
+               'intro', 'small_cover', 'medium_cover', 'large_cover')
+
+DEFAULT_BATCH_SIZE = 200  # 攒够多少条提交一次
+DEFAULT_FLUSH_INTERVAL = 5.0  # 距上次提交超过这个时间（秒）时立即提交
+
+
+def normalize_isbn(isbn):
+    return ''.join(c for c in str(isbn or '') if c.isalnum()).upper()
+
+
+def book_key(covers):
+    """
+    书籍的唯一键：豆瓣书籍ID；没有ID时（非豆瓣来源）用书名
+    """
+    subject_id = str(covers.get('subject_id') or '')
+    return subject_id or f"title:{covers.get('title') or ''}"
+
+
+def legacy_info(covers):
+    """
+    旧版 _info.json 的内容
+    """
+    return {key: covers.get(key, '') for key in LEGACY_INFO_FIELDS}
+
+
+def write_info_file(info_file, book_data):
+    """
+    先写临时文件再重命名，写入书籍信息文件；内容与已有文件相同时不改写，返回是否写入
+    """
+    content = json.dumps(book_data, ensure_ascii=False, indent=2)
+    try:
+        with open(info_file, encoding='utf-8') as f:
+            if f.read() == content:
+                return False
+    except (OSError, UnicodeDecodeError):
+        pass
+    directory = os.path.dirname(info_file) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.info-', suffix='.part', dir=directory)
+    try:
+        os.chmod(temp_path, 0o644)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(temp_path, info_file)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return True
+
+
+class BookCatalog:
+    """
+    书籍信息目录，同一进程内线程安全
+    books 表每本书（豆瓣书籍ID）一行；entries 表记录书单中的 (书名, 分类) 对应哪本书和封面文件
+    """
+
+    def __init__(self, path, batch_size=DEFAULT_BATCH_SIZE, flush_interval=DEFAULT_FLUSH_INTERVAL):
+        self.path = path
+        self.root = os.path.dirname(path) or '.'  # 封面路径相对于目录所在的文件夹保存
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = threading.Lock()
+        self._books = {}  # 待提交的书籍信息：book_key → 行
+        self._entries = {}  # 待提交的书单条目：(书名, 分类) → 行
+        self._last_flush = time.monotonic()
+        # 其他进程持有写锁时最多等待 30 秒
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS books (
+                book_key TEXT PRIMARY KEY,
+                subject_id TEXT,
+                title TEXT,
+                author TEXT,
+                publisher TEXT,
+                pubdate TEXT,
+                isbn TEXT,
+                rating TEXT,
+                rating_people TEXT,
+                intro TEXT,
+                small_cover TEXT,
+                medium_cover TEXT,
+                large_cover TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                search_title TEXT NOT NULL,
+                category TEXT NOT NULL,
+                book_key TEXT NOT NULL,
+                cover_path TEXT,
+                downloaded INTEGER NOT NULL DEFAULT 0,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (search_title, category)
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS books_subject ON books (subject_id)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS books_isbn ON books (isbn)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS books_title ON books (title)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS entries_book ON entries (book_key)')
+        self._conn.commit()
+
+    def record(self, search_title, category, covers, cover_path=None, downloaded=False):
+        """
+        记录一本书的信息（先放入缓冲区）
+        从解析索引得到的信息不含 ISBN、评分等字段，空字段不会覆盖目录中已有的值
+        """
+        key = book_key(covers)
+        now = time.time()
+        book = tuple(normalize_isbn(covers.get(name)) if name == 'isbn' else str(covers.get(name) or '')
+                     for name in BOOK_FIELDS)
+        if cover_path:
+            cover_path = os.path.relpath(cover_path, self.root)
+        with self._lock:
+            self._books[key] = (key,) + book + (now,)
+            self._entries[(search_title, category or '')] = (
+                search_title, category or '', key, cover_path, int(bool(downloaded)), now
+            )
+            due = (len(self._entries) >= self.batch_size
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def flush(self):
+        """
+        把缓冲区中的记录在一个事务中提交
+        """
+        with self._lock:
+            self._last_flush = time.monotonic()
+            if not self._books and not self._entries:
+                return
+            books = list(self._books.values())
+            entries = list(self._entries.values())
+            self._books.clear()
+            self._entries.clear()
+            columns = ', '.join(BOOK_FIELDS)
+            updates = ', '.join(f"{name} = COALESCE(NULLIF(excluded.{name}, ''), {name})" for name in BOOK_FIELDS)
+            with self._conn:
+                self._conn.executemany(
+                    f"INSERT INTO books (book_key, {columns}, updated_at) "
+                    f"VALUES ({', '.join('?' * (len(BOOK_FIELDS) + 2))}) "
+                    f"ON CONFLICT (book_key) DO UPDATE SET {updates}, updated_at = excluded.updated_at",
+                    books
+                )
+                self._conn.executemany(
+                    'INSERT OR REPLACE INTO entries (search_title, category, book_key, cover_path, downloaded, updated_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', entries
+                )
+
+    def _rows(self, where, params):
+        with self._lock:
+            cursor = self._conn.execute(
+                f"SELECT book_key, {', '.join(BOOK_FIELDS)}, updated_at FROM books WHERE {where}", params
+            )
+            rows = cursor.fetchall()
+        return [dict(zip(('book_key',) + BOOK_FIELDS + ('updated_at',), row)) for row in rows]
+
+    def by_subject(self, subject_id):
+        """
+        按豆瓣书籍ID查询，没有时返回 None
+        """
+        rows = self._rows('subject_id = ?', (str(subject_id),))
+        return rows[0] if rows else None
+
+    def by_isbn(self, isbn):
+        return self._rows('isbn = ?', (normalize_isbn(isbn),))
+
+    def by_title(self, title):
+        """
+        按书名查询：详情页上的书名或书单中的书名
+        """
+        return self._rows('title = ? OR book_key IN (SELECT book_key FROM entries WHERE search_title = ?)',
+                          (title, title))
+
+    def entries(self):
+        """
+        逐条返回书单条目及其书籍信息（按分类和书名排序）
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT e.search_title, e.category, e.cover_path, e.downloaded, "
+                f"{', '.join('b.' + name for name in BOOK_FIELDS)} "
+                f"FROM entries e JOIN books b ON b.book_key = e.book_key ORDER BY e.category, e.search_title"
+            ).fetchall()
+        for row in rows:
+            search_title, category, cover_path, downloaded = row[:4]
+            yield {
+                'search_title': search_title,
+                'category': category,
+                'cover_path': os.path.join(self.root, cover_path) if cover_path else None,
+                'downloaded': bool(downloaded),
+                'book': dict(zip(BOOK_FIELDS, row[4:])),
+            }
+
+    def counts(self):
+        with self._lock:
+            books = self._conn.execute('SELECT COUNT(*) FROM books').fetchone()[0]
+            entries, downloaded = self._conn.execute(
+                'SELECT COUNT(*), COALESCE(SUM(downloaded), 0) FROM entries'
+            ).fetchone()
+        return {'books': books, 'entries': entries, 'downloaded': downloaded}
+
+    def merge_from(self, path):
+        """
+        合并另一个目录（例如各分片的目录）；同一本书或同一书单条目取更新时间较新的一条，
+        较新的记录中为空的字段保留原有的值
+        """
+        self.flush()
+        with self._lock:
+            self._conn.execute('ATTACH DATABASE ? AS other', (path,))
+            try:
+                columns = ', '.join(('book_key',) + BOOK_FIELDS + ('updated_at',))
+                updates = ', '.join(f"{name} = COALESCE(NULLIF(excluded.{name}, ''), {name})" for name in BOOK_FIELDS)
+                entry_columns = 'search_title, category, book_key, cover_path, downloaded, updated_at'
+                entry_updates = ', '.join(f"{name} = excluded.{name}" for name in
+                                          ('book_key', 'cover_path', 'downloaded', 'updated_at'))
+                with self._conn:
+                    self._conn.execute(
+                        f"INSERT INTO books ({columns}) SELECT {columns} FROM other.books WHERE true "
+                        f"ON CONFLICT (book_key) DO UPDATE SET {updates}, updated_at = excluded.updated_at "
+                        f"WHERE excluded.updated_at > books.updated_at"
+                    )
+                    self._conn.execute(
+                        f"INSERT INTO entries ({entry_columns}) SELECT {entry_columns} FROM other.entries WHERE true "
+                        f"ON CONFLICT (search_title, category) DO UPDATE SET {entry_updates} "
+                        f"WHERE excluded.updated_at > entries.updated_at"
+                    )
+            finally:
+                self._conn.execute('DETACH DATABASE other')
+
+    def close(self):
+        self.flush()
+        with self._lock:
+            self._conn.close()
+
+
+def export_legacy(catalog):
+    """
+    按旧格式导出每本书的 _info.json（封面所在目录下的 书名_info.json），返回 (写入数, 未变化数)
+    """
+    written = unchanged = 0
+    for entry in catalog.entries():
+        if entry['cover_path']:
+            directory = os.path.dirname(entry['cover_path'])
+        else:
+            directory = os.path.join(catalog.root, entry['category']) if entry['category'] else catalog.root
+        info_file = os.path.join(directory, f"{entry['search_title']}_info.json")
+        if write_info_file(info_file, legacy_info(entry['book'])):
+            written += 1
+        else:
+            unchanged += 1
+    return written, unchanged
+
+
+def import_legacy(catalog):
+    """
+    导入目录下已有的 _info.json（分类为所在的子目录），返回导入数
+    """
+    imported = 0
+    for directory, dirnames, filenames in os.walk(catalog.root):
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+        category = os.path.relpath(directory, catalog.root)
+        category = '' if category == '.' else category
+        for name in filenames:
+            if not name.endswith('_info.json') or name.startswith('.'):
+                continue
+            try:
+                with open(os.path.join(directory, name), encoding='utf-8') as f:
+                    covers = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"⚠️ 跳过 {os.path.join(directory, name)}: {e}")
+                continue
+            if not isinstance(covers, dict):
+                continue
+            search_title = name[:-len('_info.json')]
+            safe_title = "".join(c for c in search_title if c.isalnum() or c in (' ', '-', '_')).rstrip()
+            cover_path = os.path.join(directory, f"{safe_title}.jpg")
+            catalog.record(search_title, category, covers, cover_path, os.path.exists(cover_path))
+            imported += 1
+    catalog.flush()
+    return imported
+
+
+def print_book(book):
+    print(f"{book['title']}（书籍ID: {book['subject_id'] or '无'}）")
+    for label, name in (('作者', 'author'), ('出版社', 'publisher'), ('出版年', 'pubdate'), ('ISBN', 'isbn'),
+                        ('评分', 'rating'), ('评分人数', 'rating_people'), ('封面', 'large_cover')):
+        if book.get(name):
+            print(f"  {label}: {book[name]}")
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="书籍信息目录")
+    parser.add_argument('--catalog', default=os.path.join('covers', CATALOG_NAME),
+                        help=f"目录数据库（默认: covers/{CATALOG_NAME}）")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    lookup_parser = subparsers.add_parser('lookup', help="查询书籍信息")
+    group = lookup_parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--title', help="书名（详情页上的书名或书单中的书名）")
+    group.add_argument('--isbn', help="ISBN")
+    group.add_argument('--subject', help="豆瓣书籍ID")
+    lookup_parser.add_argument('--json', action='store_true', help="以 JSON 格式输出全部字段")
+
+    subparsers.add_parser('export', help="按旧格式导出每本书的 _info.json")
+    subparsers.add_parser('import', help="导入目录所在文件夹下已有的 _info.json")
+    subparsers.add_parser('status', help="查看目录中的书籍数")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.command != 'import' and not os.path.exists(args.catalog):
+        print(f"错误：找不到目录 {args.catalog}")
+        return
+    catalog = BookCatalog(args.catalog)
+    try:
+        if args.command == 'lookup':
+            if args.subject:
+                book = catalog.by_subject(args.subject)
+                books = [book] if book else []
+            elif args.isbn:
+                books = catalog.by_isbn(args.isbn)
+            else:
+                books = catalog.by_title(args.title)
+            if not books:
+                print("没有找到")
+            for book in books:
+                if args.json:
+                    print(json.dumps(book, ensure_ascii=False, indent=2))
+                else:
+                    print_book(book)
+        elif args.command == 'export':
+            written, unchanged = export_legacy(catalog)
+            print(f"导出 _info.json: {written} 个，未变化: {unchanged} 个")
+        elif args.command == 'import':
+            print(f"导入 _info.json: {import_legacy(catalog)} 个")
+        else:
+            counts = catalog.counts()
+            print(f"书籍: {counts['books']} 本，书单条目: {counts['entries']} 条（已下载封面: {counts['downloaded']} 条）")
+    finally:
+        catalog.close()
+
+
+if __name__ == "__main__":
+    main()
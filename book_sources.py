@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+流式读取书籍列表
+支持三种格式，按扩展名区分，都逐条产出 {'title', 'category'[, 'author', 'isbn']}，不会把整个文件读入内存：
+- .json: 原有的 {"分类": ["书名", ...]} 格式（增量解析）
+- .jsonl / .ndjson: 每行一个 {"title": ..., "category": ..., "author": ..., "isbn": ...}
+- .csv: 表头为 title,category[,author,isbn]（也可以用 书名,分类,作者,ISBN），没有表头时按这个顺序
+"""
+
+import csv
+import json
+import os
+
+# CSV 表头 → 字段名
+CSV_COLUMNS = {
+    'title': 'title', '书名': 'title',
+    'category': 'category', '分类': 'category',
+    'author': 'author', '作者': 'author',
+    'isbn': 'isbn',
+}
+CSV_DEFAULT_ORDER = ('title', 'category', 'author', 'isbn')
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def iter_books(path):
+    """
+    按扩展名选择读取方式，逐条产出书籍信息
+    """
+    extension = os.path.splitext(path)[1].lower()
+    if extension in ('.jsonl', '.ndjson'):
+        return _iter_jsonl(path)
+    if extension == '.csv':
+        return _iter_csv(path)
+    return _iter_category_json(path)
+
+
+def _book(title, category='', author='', isbn=''):
+    book = {'title': str(title).strip(), 'category': str(category or '').strip()}
+    if author:
+        book['author'] = str(author).strip()
+    if isbn:
+        book['isbn'] = str(isbn).strip()
+    return book
+
+
+def _iter_jsonl(path):
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+                if isinstance(record, str):
+                    record = {'title': record}
+                if not record.get('title'):
+                    raise ValueError("缺少 title")
+            except (ValueError, AttributeError) as e:
+                print(f"⚠️ {path} 第 {line_number} 行无法解析（{e}），跳过")
+                continue
+            yield _book(record['title'], record.get('category'), record.get('author'), record.get('isbn'))
+
+
+def _iter_csv(path):
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        columns = CSV_DEFAULT_ORDER
+        for row_number, row in enumerate(reader, 1):
+            if not row or not any(cell.strip() for cell in row):
+                continue
+            if row_number == 1:
+                header = [CSV_COLUMNS.get(cell.strip().lower(), CSV_COLUMNS.get(cell.strip())) for cell in row]
+                if 'title' in header:
+                    columns = header
+                    continue
+            record = {column: cell for column, cell in zip(columns, row) if column}
+            if not record.get('title', '').strip():
+                print(f"⚠️ {path} 第 {row_number} 行没有书名，跳过")
+                continue
+            yield _book(record['title'], record.get('category'), record.get('author'), record.get('isbn'))
+
+
+class _JsonStream:
+    """
+    按块读取文件的 JSON 词法辅助类，只在缓冲区不够时读取下一块
+    """
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        if self.eof:
+            return False
+        chunk = self.f.read(_CHUNK_SIZE)
+        if not chunk:
+            self.eof = True
+            return False
+        # 丢弃已经处理过的部分，缓冲区大小只与单个值的长度有关
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """
+        跳过空白，返回下一个字符（文件结束时返回空字符串）
+        """
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in ' \t\r\n':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise ValueError(f"JSON 格式错误：应为 {char!r}，实际为 {found or '文件结束'!r}")
+        self.pos += 1
+
+    def value(self):
+        """
+        解析下一个完整的 JSON 值；值可能跨越块边界，解析失败或恰好停在缓冲区末尾时先读入更多内容
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            self._fill()
+
+
+def _iter_category_json(path):
+    with open(path, 'r', encoding='utf-8-sig') as f:
+        stream = _JsonStream(f)
+        stream.expect('{')
+        if stream.peek() == '}':
+            return
+        while True:
+            category = stream.value()
+            stream.expect(':')
+            stream.expect('[')
+            if stream.peek() == ']':
+                stream.pos += 1
+            else:
+                while True:
+                    item = stream.value()
+                    if isinstance(item, dict):
+                        if item.get('title'):
+                            yield _book(item['title'], item.get('category') or category,
+                                        item.get('author'), item.get('isbn'))
+                    elif item:
+                        yield _book(item, category)
+                    if stream.peek() == ',':
+                        stream.pos += 1
+                        continue
+                    stream.expect(']')
+                    break
+            if stream.peek() == ',':
+                stream.pos += 1
+                continue
+            stream.expect('}')
+            return
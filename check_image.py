@@ -2,29 +2,42 @@
 # -*- coding: utf-8 -*-
 """
 检查下载的图片是否正确
+并行扫描 covers/ 下的所有封面，只读取文件头（尺寸、格式、模式），不做完整解码；
+按修改时间和文件大小记录索引，再次运行时只检查有变化的文件；
+有问题的文件（空文件、被截断、不是 JPEG、实际是 HTML 页面）写入 JSON 报告，
+使用 --mark-failed 时在进度日志中记为失败，之后用 douban_book_cover.py --retry-failed 重新下载
 """
 
+import argparse
+import json
 import os
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
 from PIL import Image
-import requests
 
-def check_image_info(image_path):
-    """检查图片信息"""
-    try:
-        with Image.open(image_path) as img:
-            print(f"图片: {image_path}")
-            print(f"  尺寸: {img.size}")
-            print(f"  格式: {img.format}")
-            print(f"  模式: {img.mode}")
-            print(f"  文件大小: {os.path.getsize(image_path)} bytes")
-            print()
-    except Exception as e:
-        print(f"无法打开图片 {image_path}: {e}")
+from transport import Transport
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+# 问题类型
+PROBLEM_ZERO_BYTE = 'zero_byte'  # 空文件
+PROBLEM_HTML = 'html'  # 实际内容是 HTML（反爬虫页面、错误页面）
+PROBLEM_UNREADABLE = 'unreadable'  # 无法识别的图片格式
+PROBLEM_NOT_JPEG = 'not_jpeg'  # 是图片但不是 JPEG
+PROBLEM_TRUNCATED = 'truncated'  # 缺少文件结束标记，下载不完整
+PROBLEM_CORRUPT = 'corrupt'  # verify() 检查失败
+PROBLEM_MISSING = 'missing'  # 无法读取文件信息（例如指向的文件已不存在的符号链接）
+
+# 修改扫描逻辑后递增，旧索引中的结果全部作废
+SCAN_VERSION = 1
 
 def test_url_accessibility(url):
     """测试URL是否可访问"""
     try:
-        response = requests.head(url, timeout=10)
+        response = Transport().request('HEAD', url, timeout=10)
         print(f"URL: {url}")
         print(f"  状态码: {response.status_code}")
         print(f"  Content-Type: {response.headers.get('Content-Type', 'Unknown')}")
@@ -35,31 +48,256 @@ def test_url_accessibility(url):
         print(f"URL访问失败 {url}: {e}")
         return False
 
-def main():
-    print("检查《活着》封面图片")
-    print("=" * 50)
-    
-    # 检查本地图片
-    image_dir = "covers/活着"
-    if os.path.exists(image_dir):
-        print("本地图片信息:")
-        for filename in ['small.jpg', 'medium.jpg', 'large.jpg']:
-            image_path = os.path.join(image_dir, filename)
-            if os.path.exists(image_path):
-                check_image_info(image_path)
-    
+def inspect_image(path, deep=False):
+    """
+    检查一个图片文件（在进程池中执行），返回检查结果
+    deep 为 True 时额外调用 verify() 做更完整的检查
+    """
+    result = {
+        'problem': None,
+        'detail': '',
+        'format': None,
+        'mode': None,
+        'width': None,
+        'height': None,
+        'deep': deep,
+    }
+    try:
+        size = os.path.getsize(path)
+        if size == 0:
+            result['problem'] = PROBLEM_ZERO_BYTE
+            return result
+
+        with open(path, 'rb') as f:
+            head = f.read(512)
+            f.seek(max(0, size - 64))
+            tail = f.read()
+        if head.lstrip().startswith(b'<') or b'<html' in head.lower():
+            result['problem'] = PROBLEM_HTML
+            return result
+
+        with Image.open(path) as img:
+            result['format'] = img.format
+            result['mode'] = img.mode
+            result['width'], result['height'] = img.size
+            if deep:
+                img.verify()
+
+        if result['format'] != 'JPEG':
+            result['problem'] = PROBLEM_NOT_JPEG
+            result['detail'] = result['format'] or ''
+        elif b'\xff\xd9' not in tail:
+            result['problem'] = PROBLEM_TRUNCATED
+    except Exception as e:
+        result['problem'] = PROBLEM_CORRUPT if deep and result['format'] else PROBLEM_UNREADABLE
+        result['detail'] = str(e)
+    return result
+
+def walk_images(root):
+    """
+    遍历目录下的所有图片文件，跳过以 . 开头的目录（封面存储、临时文件）
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+        for entry in entries:
+            if entry.name.startswith('.'):
+                continue
+            if entry.is_dir(follow_symlinks=False):
+                stack.append(entry.path)
+            elif entry.name.lower().endswith(IMAGE_EXTENSIONS):
+                yield entry
+
+def load_index(path):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            index = json.load(f)
+        if index.get('version') == SCAN_VERSION:
+            return index.get('files', {})
+    except (OSError, ValueError, AttributeError):
+        pass
+    return {}
+
+def write_json(path, data):
+    """
+    先写临时文件再重命名，中断时不会留下写了一半的文件
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.scan-', suffix='.part', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def scan(root, index_path, deep=False, workers=None):
+    """
+    扫描目录，返回 (所有文件的检查结果, 本次实际检查的文件数)
+    大小和修改时间都没变、且已按相同深度检查过的文件直接沿用索引中的结果
+    """
+    previous = load_index(index_path)
+    files = {}
+    to_scan = []
+    unchanged = 0
+    for entry in walk_images(root):
+        try:
+            stat = entry.stat()
+        except OSError as e:
+            files[entry.path] = {'size': None, 'mtime_ns': None, 'problem': PROBLEM_MISSING, 'detail': str(e),
+                                 'format': None, 'mode': None, 'width': None, 'height': None, 'deep': deep}
+            continue
+        cached = previous.get(entry.path)
+        if (cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns
+                and (cached['deep'] or not deep)):
+            files[entry.path] = cached
+            unchanged += 1
+        else:
+            files[entry.path] = {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+            to_scan.append(entry.path)
+
+    if to_scan:
+        print(f"需要检查 {len(to_scan)} 个文件（其余 {unchanged} 个没有变化）")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(inspect_image, to_scan, repeat(deep), chunksize=64)
+            for count, (path, result) in enumerate(zip(to_scan, results), 1):
+                files[path].update(result)
+                if count % 1000 == 0:
+                    print(f"  已检查 {count}/{len(to_scan)}")
+
+    write_json(index_path, {'version': SCAN_VERSION, 'files': files})
+    return files, len(to_scan)
+
+def book_paths(books_file, journal_path):
+    """
+    封面文件路径 → (书名, 分类)，来自书籍列表和进度日志
+    """
+    from book_sources import iter_books
+    from douban_book_cover import cover_path
+    from progress_journal import ProgressJournal
+
+    books = [(record['title'], record['category']) for record in ProgressJournal(journal_path).load().values()]
+    if os.path.exists(books_file):
+        books += [(book['title'], book['category']) for book in iter_books(books_file)]
+    return {os.path.normpath(cover_path(title, category)[1]): (title, category) for title, category in books}
+
+def mark_failed(problems, journal_path, store_root):
+    """
+    把有问题的封面记为失败并删除（封面存储中的同一张图片没有其他书使用时也一起删除），
+    之后用 douban_book_cover.py --retry-failed 重新下载
+    """
+    from cover_store import CoverStore, file_sha256
+    from progress_journal import ProgressJournal, STATUS_FAILED
+
+    journal = ProgressJournal(journal_path)
+    store = CoverStore(store_root) if os.path.isdir(store_root) else None
+    marked = 0
+    for problem in problems:
+        if problem['title'] is None:
+            continue
+        path = problem['path']
+        sha256 = file_sha256(path) if store is not None and os.path.exists(path) else None
+        if os.path.lexists(path):
+            os.remove(path)
+        if sha256 is not None:
+            store.release(sha256)
+        journal.record(problem['title'], problem['category'], STATUS_FAILED,
+                       f"封面文件有问题: {problem['problem']}")
+        marked += 1
+    journal.close()
+    if store is not None:
+        store.close()
+    return marked
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="检查下载的封面图片")
+    parser.add_argument('root', nargs='?', default='covers', help="要扫描的目录（默认: covers）")
+    parser.add_argument('--deep', action='store_true', help="额外调用 verify() 做更完整的检查（较慢）")
+    parser.add_argument('--workers', type=int, default=None, help="检查进程数（默认: CPU 核数）")
+    parser.add_argument('--index', default=None, help="扫描索引文件（默认: <root>/.scan_index.json）")
+    parser.add_argument('--report', default=None, help="JSON 报告文件（默认: <root>/scan_report.json）")
+    parser.add_argument('--books', default='bookNames.json', help="书籍列表（.json/.jsonl/.csv），用于把文件对应到书名（默认: bookNames.json）")
+    parser.add_argument('--journal', default='covers/progress_journal.jsonl',
+                        help="进度日志文件（默认: covers/progress_journal.jsonl）")
+    parser.add_argument('--mark-failed', action='store_true',
+                        help="把有问题的封面在进度日志中记为失败并删除，之后用 --retry-failed 重新下载")
+    parser.add_argument('--url', action='append', default=[], help="测试封面URL是否可访问（可重复）")
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+
     # 测试URL可访问性
-    print("URL可访问性测试:")
-    urls = [
-        "https://img9.doubanio.com/view/subject/s/public/s29053580.jpg",
-        "https://img9.doubanio.com/view/subject/m/public/s29053580.jpg", 
-        "https://img9.doubanio.com/view/subject/l/public/s29053580.jpg"
-    ]
-    
-    for url in urls:
-        test_url_accessibility(url)
+    if args.url:
+        print("URL可访问性测试:")
+        for url in args.url:
+            test_url_accessibility(url)
+        return
 
-if __name__ == "__main__":
-    main()
+    if not os.path.isdir(args.root):
+        print(f"目录不存在: {args.root}")
+        return
+
+    index_path = args.index or os.path.join(args.root, '.scan_index.json')
+    report_path = args.report or os.path.join(args.root, 'scan_report.json')
+
+    print(f"检查封面图片: {args.root}")
+    print("=" * 50)
+    start = time.time()
+    files, scanned = scan(args.root, index_path, deep=args.deep, workers=args.workers)
+
+    paths = book_paths(args.books, args.journal)
+    problems = []
+    for path, result in sorted(files.items()):
+        if result.get('problem'):
+            title, category = paths.get(os.path.normpath(path), (None, None))
+            problems.append({
+                'path': path,
+                'problem': result['problem'],
+                'detail': result.get('detail', ''),
+                'size': result['size'],
+                'title': title,
+                'category': category,
+            })
 
+    counts = {}
+    for problem in problems:
+        counts[problem['problem']] = counts.get(problem['problem'], 0) + 1
+    report = {
+        'generated_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'root': args.root,
+        'deep': args.deep,
+        'total': len(files),
+        'scanned': scanned,
+        'problem_counts': counts,
+        'problems': problems,
+    }
+    write_json(report_path, report)
 
+    print(f"共 {len(files)} 个文件，本次检查 {scanned} 个，用时 {time.time() - start:.1f} 秒")
+    if problems:
+        print(f"发现 {len(problems)} 个有问题的文件:")
+        for problem in problems[:20]:
+            print(f"  ✗ {problem['path']}: {problem['problem']} {problem['detail']}")
+        if len(problems) > 20:
+            print(f"  ... 其余见报告")
+    else:
+        print("✓ 没有发现问题")
+    print(f"报告已保存: {report_path}")
+
+    if args.mark_failed and problems:
+        marked = mark_failed(problems, args.journal, os.path.join(args.root, '.store'))
+        print(f"已在进度日志中记为失败: {marked} 本（使用 douban_book_cover.py --retry-failed 重新下载）")
+        unmatched = len(problems) - marked
+        if unmatched:
+            print(f"⚠️ {unmatched} 个文件无法对应到书名，请手动处理")
+
+if __name__ == "__main__":
+    main()
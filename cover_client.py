@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+封面查询服务（cover_service.py）的客户端
+只依赖标准库，启动快，适合在其他程序中调用或在命令行中使用
+
+python cover_client.py 活着                          # 打印书籍信息和封面地址
+python cover_client.py 活着 --size medium -o 活着.jpg  # 保存封面图片
+"""
+
+import argparse
+import json
+import sys
+import urllib.error
+import urllib.request
+from urllib.parse import urlencode
+
+DEFAULT_URL = 'http://127.0.0.1:8765'
+
+
+class CoverServiceError(Exception):
+    """
+    服务不可用、繁忙（503）或内部错误
+    """
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status
+        self.retry_after = retry_after
+
+
+class CoverClient:
+    def __init__(self, base_url=DEFAULT_URL, timeout=120):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def _get(self, path, params=None):
+        """
+        返回 (状态码, 响应头, 内容)；404 等查询结果照常返回，服务端错误抛出 CoverServiceError
+        """
+        url = self.base_url + path + ('?' + urlencode(params) if params else '')
+        try:
+            with urllib.request.urlopen(url, timeout=self.timeout) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            body = e.read()
+            if e.code < 500:
+                return e.code, e.headers, body
+            try:
+                message = json.loads(body.decode('utf-8')).get('error') or body.decode('utf-8')
+            except ValueError:
+                message = body.decode('utf-8', 'replace')
+            retry_after = e.headers.get('Retry-After')
+            raise CoverServiceError(message, e.code, int(retry_after) if retry_after and retry_after.isdigit() else None)
+        except (urllib.error.URLError, OSError) as e:
+            raise CoverServiceError(f"无法连接封面查询服务 {self.base_url}: {e}")
+
+    def cover(self, title, category='', size='large'):
+        """
+        书籍信息和封面地址（服务返回的 JSON），没有找到时 status 为 not_found / too_old
+        """
+        _, _, body = self._get('/cover', {'title': title, 'category': category, 'size': size})
+        return json.loads(body.decode('utf-8'))
+
+    def image(self, title, category='', size='large'):
+        """
+        封面图片内容，没有找到或没有这个尺寸时返回 None
+        """
+        status, headers, body = self._get('/cover', {'title': title, 'category': category, 'size': size,
+                                                     'format': 'image'})
+        if status != 200 or not headers.get('Content-Type', '').startswith('image/'):
+            return None
+        return body
+
+    def health(self):
+        _, _, body = self._get('/health')
+        return json.loads(body.decode('utf-8'))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="封面查询服务的客户端")
+    parser.add_argument('title', help="书名")
+    parser.add_argument('--category', default='', help="分类")
+    parser.add_argument('--size', choices=['large', 'medium', 'small'], default='large', help="封面尺寸（默认: large）")
+    parser.add_argument('-o', '--output', default=None, help="把封面图片保存到这个文件")
+    parser.add_argument('--url', default=DEFAULT_URL, help=f"服务地址（默认: {DEFAULT_URL}）")
+    args = parser.parse_args(argv)
+
+    client = CoverClient(args.url)
+    try:
+        if args.output:
+            data = client.image(args.title, args.category, args.size)
+            if data is None:
+                print(f"没有找到封面: {args.title}")
+                return 1
+            with open(args.output, 'wb') as f:
+                f.write(data)
+            print(f"封面已保存: {args.output}（{len(data) / 1024:.0f} KB）")
+        else:
+            print(json.dumps(client.cover(args.title, args.category, args.size), ensure_ascii=False, indent=2))
+    except CoverServiceError as e:
+        print(f"错误：{e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+从一张下载好的封面本地生成其他尺寸
+只下载最大的可用尺寸，小尺寸（以及豆瓣没有提供的尺寸，例如 2 倍图）用 Pillow 缩放得到；
+JPEG 使用 draft 模式按需降采样解码，缩放在独立进程中进行，不占用下载线程
+"""
+
+import os
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+
+from PIL import Image
+
+DEFAULT_QUALITY = 85
+# 默认生成的尺寸：名称=最大宽x最大高（保持原图比例）
+DEFAULT_TARGETS = 'medium=270x400,small=135x200'
+
+
+def parse_targets(spec):
+    """
+    解析尺寸配置 "medium=270x400,small=135x200"，返回 [(名称, (宽, 高)), ...]
+    """
+    targets = []
+    for item in (spec or '').split(','):
+        item = item.strip()
+        if not item:
+            continue
+        try:
+            name, size = item.split('=', 1)
+            width, height = size.lower().split('x', 1)
+            width, height = int(width), int(height)
+        except ValueError:
+            raise ValueError(f"无法解析尺寸配置: {item}（格式: 名称=宽x高）")
+        if not name.strip() or width <= 0 or height <= 0:
+            raise ValueError(f"无效的尺寸配置: {item}")
+        targets.append((name.strip(), (width, height)))
+    return targets
+
+
+def derived_path(path, name):
+    """
+    生成尺寸的文件路径：covers/分类/书名.jpg → covers/分类/书名_medium.jpg
+    """
+    root, ext = os.path.splitext(path)
+    return f"{root}_{name}{ext or '.jpg'}"
+
+
+def derive_sizes(source, targets, quality=DEFAULT_QUALITY):
+    """
+    按 targets 生成各尺寸的 JPEG（在进程池中执行），返回生成的文件路径列表
+    原图比目标尺寸小时不放大，直接按原尺寸重新编码
+    """
+    written = []
+    with Image.open(source) as img:
+        # draft 让 JPEG 解码器直接按 1/2、1/4、1/8 降采样，只需满足最大的目标尺寸
+        largest = (max(size[0] for _, size in targets), max(size[1] for _, size in targets))
+        img.draft('RGB', largest)
+        img = img.convert('RGB')
+
+        for name, size in targets:
+            resized = img.copy()
+            resized.thumbnail(size, Image.LANCZOS)
+            dest = derived_path(source, name)
+            directory = os.path.dirname(dest) or '.'
+            fd, temp_path = tempfile.mkstemp(prefix='.resize-', suffix='.part', dir=directory)
+            try:
+                os.chmod(temp_path, 0o644)
+                with os.fdopen(fd, 'wb') as f:
+                    resized.save(f, 'JPEG', quality=quality, optimize=True, progressive=True)
+                os.replace(temp_path, dest)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+            written.append(dest)
+    return written
+
+
+class CoverResizer:
+    """
+    封面缩放阶段，进程池在第一次使用时创建
+    """
+
+    def __init__(self, targets=None, quality=DEFAULT_QUALITY, max_workers=None):
+        self.targets = parse_targets(DEFAULT_TARGETS) if targets is None else targets
+        self.quality = quality
+        self.max_workers = max_workers
+        self._executor = None
+
+    def _pool(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
+
+    async def derive_async(self, loop, source):
+        """
+        在批处理事件循环中生成各尺寸
+        """
+        if not self.targets:
+            return []
+        return await loop.run_in_executor(self._pool(), derive_sizes, source, self.targets, self.quality)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+常驻的封面查询服务
+进程一直运行，所有查询共用一个 DoubanBookCover（保持长连接、Cookie、限速状态和页面缓存），
+提供本地 HTTP/JSON 接口；解析过的书名和下载过的封面图片保存在内存 LRU 中，重复查询只需几毫秒。
+需要访问网络的查询同时进行的数量有上限，超过时排队，排队超时返回 503
+
+python cover_service.py --port 8765
+curl 'http://127.0.0.1:8765/cover?title=活着'                    # 书籍信息和封面地址（JSON）
+curl 'http://127.0.0.1:8765/cover?title=活着&size=medium&format=image' -o 活着.jpg
+curl 'http://127.0.0.1:8765/health'                              # 缓存命中率等运行状态
+
+客户端见 cover_client.py
+"""
+
+import argparse
+import json
+import os
+import signal
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from douban_book_cover import (DoubanBookCover, DEFAULT_HOST_LIMITS, COVER_SIZES, LOG_LEVELS, info, debug,
+                               set_log_level)
+from transport import Transport, http2_available
+from retry_scheduler import Throttled
+from http_cache import HttpCache
+from resolution_index import ResolutionIndex, index_key
+from cover_store import CoverStore
+from progress_journal import STATUS_RESOLVED, STATUS_FAILED, STATUS_NOT_FOUND, STATUS_TOO_OLD
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+DEFAULT_MAX_TITLES = 10000  # 内存中保存的书名解析结果数
+DEFAULT_MAX_IMAGE_MB = 64  # 内存中保存的封面图片总大小
+NEGATIVE_TTL = 600  # 没有找到的书名在内存中保留的时间（秒），之后重新查找
+QUEUE_TIMEOUT = 30  # 等待查询名额的最长时间（秒）
+
+# 尺寸参数 → covers 中的键
+SIZES = {cover_type.split('_')[0]: cover_type for cover_type, _ in COVER_SIZES}
+
+# 查询结果对应的 HTTP 状态码
+HTTP_STATUS = {
+    STATUS_RESOLVED: 200,
+    STATUS_NOT_FOUND: 404,
+    STATUS_TOO_OLD: 404,
+    STATUS_FAILED: 502,
+}
+
+
+class ServiceBusy(Exception):
+    """
+    同时进行的查询已达上限，排队超时
+    """
+
+
+class LRUCache:
+    """
+    按条目数和总大小淘汰最久未用条目的内存缓存，线程安全
+    """
+
+    def __init__(self, max_items=None, max_bytes=None):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()  # 键 → (值, 大小)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return item[0]
+
+    def put(self, key, value, size=0):
+        with self._lock:
+            if self.max_bytes is not None and size > self.max_bytes:
+                return
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+            self._items[key] = (value, size)
+            self.bytes += size
+            while ((self.max_items is not None and len(self._items) > self.max_items)
+                   or (self.max_bytes is not None and self.bytes > self.max_bytes)):
+                _, (_, evicted_size) = self._items.popitem(last=False)
+                self.bytes -= evicted_size
+
+    def discard(self, key):
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.bytes -= old[1]
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'items': len(self._items),
+                'bytes': self.bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': self.hits / total if total else 0.0,
+            }
+
+
+class CoverService:
+    """
+    查询逻辑：书名 → 书籍信息和封面地址（内存 LRU → 解析索引 → 搜索），封面地址 → 图片（内存 LRU → 封面存储 → 下载）
+    """
+
+    def __init__(self, cover_getter, concurrency=4, max_titles=DEFAULT_MAX_TITLES,
+                 max_image_bytes=DEFAULT_MAX_IMAGE_MB * 1024 * 1024):
+        self.cover_getter = cover_getter
+        self.concurrency = concurrency
+        self.titles = LRUCache(max_items=max_titles)
+        self.images = LRUCache(max_bytes=max_image_bytes)
+        self.started_at = time.time()
+        self.in_flight = 0
+        self._slots = threading.BoundedSemaphore(max(1, concurrency))
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        if not self._slots.acquire(timeout=QUEUE_TIMEOUT):
+            raise ServiceBusy(f"同时进行的查询已达上限（{self.concurrency}），请稍后重试")
+        with self._lock:
+            self.in_flight += 1
+
+    def _release(self):
+        with self._lock:
+            self.in_flight -= 1
+        self._slots.release()
+
+    def resolve(self, title, category=''):
+        """
+        返回 (书籍信息条目, 是否来自内存缓存)
+        条目为 {'status', 'reason', 'covers', 'resolved_at'}；网络错误（failed）不缓存
+        """
+        key = index_key(title, category)
+        entry = self.titles.get(key)
+        if entry is not None:
+            if entry['status'] == STATUS_RESOLVED or time.time() - entry['resolved_at'] < NEGATIVE_TTL:
+                return entry, True
+            self.titles.discard(key)
+
+        self._acquire()
+        try:
+            covers, status, reason = self.cover_getter.resolve_book(title, category)
+        finally:
+            self._release()
+        entry = {'status': status, 'reason': reason, 'covers': covers, 'resolved_at': time.time()}
+        if status != STATUS_FAILED:
+            self.titles.put(key, entry)
+        return entry, False
+
+    def invalidate(self, title, category=''):
+        """
+        封面地址已失效：丢弃内存中的解析结果和解析索引中的记录，下次查询时重新搜索
+        """
+        self.titles.discard(index_key(title, category))
+        resolution_index = self.cover_getter.resolution_index
+        if resolution_index is not None:
+            resolution_index.invalidate(title, category)
+
+    def image(self, url):
+        """
+        返回 (图片内容, 是否来自内存缓存)，无法获取时返回 (None, False)
+        """
+        data = self.images.get(url)
+        if data is not None:
+            return data, True
+
+        cover_store = self.cover_getter.cover_store
+        blob = cover_store.lookup(url) if cover_store is not None else None
+        if blob:
+            with open(blob, 'rb') as f:
+                data = f.read()
+        else:
+            self._acquire()
+            try:
+                data = self.cover_getter.fetch_image(url)
+            finally:
+                self._release()
+        if data:
+            self.images.put(url, data, len(data))
+        return data, False
+
+    def stats(self):
+        return {
+            'uptime_seconds': round(time.time() - self.started_at, 1),
+            'in_flight': self.in_flight,
+            'concurrency': self.concurrency,
+            'titles': self.titles.stats(),
+            'images': self.images.stats(),
+        }
+
+
+def book_payload(title, category, entry, size, cached):
+    """
+    /cover 接口返回的 JSON
+    """
+    payload = {
+        'query': {'title': title, 'category': category, 'size': size},
+        'status': entry['status'],
+        'reason': entry['reason'],
+        'cached': cached,
+    }
+    covers = entry['covers']
+    if covers:
+        payload['book'] = {key: value for key, value in covers.items()
+                           if key not in ('verified', 'from_index', 'unchanged')}
+        payload['cover_url'] = covers.get(SIZES[size], '')
+    return payload
+
+
+def image_content_type(data):
+    if data.startswith(b'\x89PNG'):
+        return 'image/png'
+    if data.startswith(b'GIF8'):
+        return 'image/gif'
+    if data[:4] == b'RIFF':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def log_message(self, format, *args):
+            debug(f"{self.address_string()} {format % args}")
+
+        def _respond(self, status, body, content_type, headers=None):
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _json(self, status, payload, headers=None):
+            body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+            self._respond(status, body, 'application/json; charset=utf-8', headers)
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            params = {key: values[0] for key, values in parse_qs(url.query).items()}
+            try:
+                if url.path == '/cover':
+                    self._cover(params)
+                elif url.path == '/health':
+                    self._json(200, service.stats())
+                else:
+                    self._json(404, {'error': f"未知的路径: {url.path}"})
+            except ServiceBusy as e:
+                self._json(503, {'error': str(e)}, {'Retry-After': '5'})
+            except Throttled as e:
+                retry_after = max(1, int(e.retry_after or 60))
+                self._json(503, {'error': str(e)}, {'Retry-After': str(retry_after)})
+            except Exception as e:
+                info(f"处理请求出错: {self.path} - {e}")
+                self._json(500, {'error': f"处理出错: {e}"})
+
+        def _cover(self, params):
+            title = params.get('title', '').strip()
+            category = params.get('category', '').strip()
+            size = params.get('size', 'large')
+            as_image = params.get('format', 'json') == 'image'
+            if not title:
+                self._json(400, {'error': "缺少 title 参数"})
+                return
+            if size not in SIZES:
+                self._json(400, {'error': f"size 只能是 {'/'.join(SIZES)}"})
+                return
+
+            for attempt in range(2):
+                entry, cached = service.resolve(title, category)
+                payload = book_payload(title, category, entry, size, cached)
+                status = HTTP_STATUS.get(entry['status'], 502)
+                if not as_image or status != 200:
+                    self._json(status, payload)
+                    return
+                if not payload['cover_url']:
+                    self._json(404, dict(payload, reason=f"没有 {size} 尺寸的封面"))
+                    return
+                data, image_cached = service.image(payload['cover_url'])
+                if data is not None:
+                    break
+                if attempt or not (cached or entry['covers'].get('from_index')):
+                    self._json(502, dict(payload, reason="封面下载失败"))
+                    return
+                # 封面地址可能已失效（内存中或解析索引中的旧地址），重新解析一次
+                info(f"封面地址已失效，重新解析: {title}")
+                service.invalidate(title, category)
+            self._respond(200, data, image_content_type(data), {
+                'Cache-Control': 'max-age=86400',
+                'X-Cover-Url': payload['cover_url'],
+                'X-Cache': 'hit' if cached and image_cached else 'miss',
+            })
+
+    return Handler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="常驻的豆瓣读书封面查询服务")
+    parser.add_argument('--host', default=DEFAULT_HOST, help=f"监听地址（默认: {DEFAULT_HOST}）")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"监听端口（默认: {DEFAULT_PORT}）")
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help="同时访问网络的查询数上限，超过时排队（默认: 4）")
+    parser.add_argument('--max-titles', type=int, default=DEFAULT_MAX_TITLES,
+                        help=f"内存中保存的书名解析结果数（默认: {DEFAULT_MAX_TITLES}）")
+    parser.add_argument('--max-image-mb', type=float, default=DEFAULT_MAX_IMAGE_MB,
+                        help=f"内存中保存的封面图片总大小，单位MB（默认: {DEFAULT_MAX_IMAGE_MB}）")
+    parser.add_argument('--cache-dir', default='.douban_cache',
+                        help="页面缓存和书名解析索引的目录（默认: .douban_cache）")
+    parser.add_argument('--no-cache', action='store_true', help="不使用页面缓存")
+    parser.add_argument('--no-index', action='store_true', help="不使用书名解析索引")
+    parser.add_argument('--no-store', action='store_true', help="不读取封面存储（covers/.store）中已有的封面")
+    parser.add_argument('--http2', action='store_true', help="使用 HTTP/2（需要安装 httpx[http2]）")
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default='info',
+                        help="输出级别，debug 时输出每个请求（默认: info）")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    set_log_level(args.log_level)
+
+    http_cache = None if args.no_cache else HttpCache(os.path.join(args.cache_dir, 'http_cache.sqlite'))
+    resolution_index = None if args.no_index else ResolutionIndex(
+        os.path.join(args.cache_dir, 'resolution_index.sqlite'))
+    cover_store = None
+    if not args.no_store and os.path.isdir(os.path.join('covers', '.store')):
+        cover_store = CoverStore(os.path.join('covers', '.store'))
+    if args.http2 and not http2_available():
+        print("未安装 httpx[http2]，使用 HTTP/1.1")
+    transport = Transport(DEFAULT_HOST_LIMITS, http2=args.http2,
+                          cookie_path=os.path.join(args.cache_dir, 'cookies.txt'))
+    cover_getter = DoubanBookCover(http_cache=http_cache, resolution_index=resolution_index,
+                                   cover_store=cover_store, transport=transport)
+    service = CoverService(cover_getter, concurrency=args.concurrency, max_titles=args.max_titles,
+                           max_image_bytes=int(args.max_image_mb * 1024 * 1024))
+
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(service))
+    server.daemon_threads = True
+    # 收到 SIGTERM（例如 systemd 停止服务）时正常退出，保存 Cookie 并关闭缓存
+    signal.signal(signal.SIGTERM, lambda signum, frame: threading.Thread(target=server.shutdown).start())
+    print(f"封面查询服务已启动: http://{args.host}:{server.server_address[1]}/cover?title=书名")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        transport.close()
+        if cover_store is not None:
+            cover_store.close()
+        if resolution_index is not None:
+            resolution_index.close()
+        if http_cache is not None:
+            http_cache.close()
+    stats = service.stats()
+    print(f"服务已停止：书名缓存命中率 {stats['titles']['hit_ratio']:.0%}，图片缓存命中率 {stats['images']['hit_ratio']:.0%}")
+
+
+if __name__ == "__main__":
+    main()
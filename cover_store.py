@@ -0,0 +1,155 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按内容寻址的封面存储
+封面按 SHA-256 只保存一份（blobs/ab/abcdef....jpg），同时按豆瓣图片ID（如 l/s29053580）建立索引，
+下载前先查索引，已有的图片不再下载；分类目录中的封面文件是指向存储的硬链接
+（不支持硬链接时用符号链接，都不支持时复制）
+"""
+
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+
+# 豆瓣封面地址中的尺寸目录和图片ID：/view/subject/l/public/s29053580.jpg
+_IMAGE_ID = re.compile(r'/([sml])/public/([a-z]?\d+)\.(?:jpe?g|png|webp|gif)$', re.I)
+
+
+def image_key(url):
+    """
+    从封面地址中提取 "尺寸/图片ID"，不是豆瓣封面地址时返回 None
+    """
+    match = _IMAGE_ID.search((url or '').split('?', 1)[0])
+    if not match:
+        return None
+    return f"{match.group(1).lower()}/{match.group(2)}"
+
+
+def file_sha256(path, chunk_size=64 * 1024):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class CoverStore:
+    """
+    封面存储，线程安全
+    """
+
+    def __init__(self, root='covers/.store'):
+        self.root = root
+        self.blob_dir = os.path.join(root, 'blobs')
+        os.makedirs(self.blob_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        # 多个进程（任务队列的工作进程）共用同一个数据库，其他进程持有写锁时最多等待 30 秒
+        self._conn = sqlite3.connect(os.path.join(root, 'index.sqlite'), timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS images (
+                image_key TEXT PRIMARY KEY,
+                sha256 TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def blob_path(self, sha256):
+        return os.path.join(self.blob_dir, sha256[:2], f"{sha256}.jpg")
+
+    def lookup(self, url):
+        """
+        按封面地址查找已保存的图片，返回存储中的文件路径，没有时返回 None
+        """
+        key = image_key(url)
+        if key is None:
+            return None
+        with self._lock:
+            row = self._conn.execute('SELECT sha256 FROM images WHERE image_key = ?', (key,)).fetchone()
+        if row is None:
+            return None
+        path = self.blob_path(row[0])
+        return path if os.path.exists(path) else None
+
+    def adopt(self, path, url=None):
+        """
+        把刚下载的文件移入存储（内容相同的图片只保留一份），再链接回原路径
+        返回存储中的文件路径
+        """
+        sha256 = file_sha256(path)
+        blob = self.blob_path(sha256)
+        size = os.path.getsize(path)
+        if os.path.exists(blob):
+            os.remove(path)
+        else:
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.replace(path, blob)
+        self.link(blob, path)
+
+        key = image_key(url)
+        if key is not None:
+            with self._lock:
+                self._conn.execute(
+                    'INSERT OR REPLACE INTO images (image_key, sha256, size, stored_at) VALUES (?, ?, ?, ?)',
+                    (key, sha256, size, time.time())
+                )
+                self._conn.commit()
+        return blob
+
+    def release(self, sha256):
+        """
+        分类目录中的一个封面文件删除后调用：没有其他文件硬链接到这张图片时，删除图片及其索引，
+        之后再遇到同一地址时会重新下载；仍被其他书使用时保留，返回是否已删除
+        """
+        blob = self.blob_path(sha256)
+        if os.path.exists(blob) and os.stat(blob).st_nlink > 1:
+            return False
+        with self._lock:
+            self._conn.execute('DELETE FROM images WHERE sha256 = ?', (sha256,))
+            self._conn.commit()
+        if os.path.exists(blob):
+            os.remove(blob)
+        return True
+
+    def link(self, blob, dest):
+        """
+        在 dest 创建指向存储文件的链接：优先硬链接，其次符号链接，最后复制
+        先在同一目录下创建临时链接再重命名，替换已有文件时不会出现不完整的状态
+        返回使用的方式：hardlink / symlink / copy
+        """
+        directory = os.path.dirname(dest) or '.'
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(prefix='.link-', suffix='.part', dir=directory)
+        os.close(fd)
+        os.remove(temp_path)
+        try:
+            try:
+                os.link(blob, temp_path)
+                mode = 'hardlink'
+            except OSError:
+                try:
+                    os.symlink(os.path.relpath(blob, directory), temp_path)
+                    mode = 'symlink'
+                except OSError:
+                    shutil.copyfile(blob, temp_path)
+                    mode = 'copy'
+            os.replace(temp_path, dest)
+            if os.path.lexists(temp_path):
+                # dest 已经是同一个文件的硬链接时 rename 不做任何事，临时链接会留下
+                os.remove(temp_path)
+            return mode
+        except BaseException:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+已保存封面的验证信息（SQLite）
+每个封面文件记录下载地址、ETag、Last-Modified、文件大小和 SHA-256，
+--refresh 时据此发送条件请求（If-None-Match / If-Modified-Since），
+服务器返回 304 时封面没有变化，不重新下载也不改写任何文件
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from cover_store import image_key
+
+
+def _key(filepath):
+    return os.path.normpath(filepath)
+
+
+class CoverValidators:
+    """
+    封面验证信息，线程安全
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # 多个进程（任务队列的工作进程）共用同一个数据库，其他进程持有写锁时最多等待 30 秒
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS covers (
+                path TEXT PRIMARY KEY,
+                url TEXT NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                length INTEGER NOT NULL,
+                sha256 TEXT NOT NULL,
+                downloaded_at REAL NOT NULL,
+                checked_at REAL NOT NULL
+            )
+        """)
+        self._conn.commit()
+
+    def lookup(self, filepath):
+        """
+        封面文件的验证信息，没有记录时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT url, etag, last_modified, length, sha256, downloaded_at, checked_at '
+                'FROM covers WHERE path = ?', (_key(filepath),)
+            ).fetchone()
+        if row is None:
+            return None
+        url, etag, last_modified, length, sha256, downloaded_at, checked_at = row
+        return {
+            'url': url,
+            'etag': etag,
+            'last_modified': last_modified,
+            'length': length,
+            'sha256': sha256,
+            'downloaded_at': downloaded_at,
+            'checked_at': checked_at,
+        }
+
+    def is_current(self, entry, filepath, url):
+        """
+        记录是否仍对应磁盘上的文件：同一张图片（镜像主机不同也算）、文件存在且大小一致
+        """
+        same_image = entry['url'] == url or (image_key(url) is not None and image_key(entry['url']) == image_key(url))
+        try:
+            return same_image and os.path.getsize(filepath) == entry['length']
+        except OSError:
+            return False
+
+    def conditional_headers(self, entry):
+        """
+        条件请求头
+        """
+        headers = {}
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
+
+    def store(self, filepath, url, headers, length, sha256):
+        """
+        记录刚下载的封面（headers 为响应头）
+        """
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO covers '
+                '(path, url, etag, last_modified, length, sha256, downloaded_at, checked_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (_key(filepath), url, headers.get('ETag'), headers.get('Last-Modified'), length, sha256, now, now)
+            )
+            self._conn.commit()
+
+    def touch(self, filepath):
+        """
+        条件请求确认封面没有变化
+        """
+        with self._lock:
+            self._conn.execute('UPDATE covers SET checked_at = ? WHERE path = ?', (time.time(), _key(filepath)))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
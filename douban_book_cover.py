@@ -8,103 +8,322 @@
 import requests
 import json
 import os
-import sys
-from urllib.parse import quote
+import argparse
+import asyncio
+import functools
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+import re
+import shutil
+import sqlite3
 import time
 
+from rate_limiter import HostRateLimiter, THROTTLE_STATUS_CODES
+from transport import Transport, IMAGE_HEADERS, ALTERNATIVE_IMAGE_HEADERS, http2_available
+from retry_scheduler import Throttled, HostCircuitBreakers, RetryScheduler, parse_retry_after
+from hedged_fetch import HedgedFetcher, mirror_urls, DEFAULT_HEDGE_DELAY, DEFAULT_MAX_FANOUT
+from singleflight import SingleFlight
+from http_cache import HttpCache, OfflineCacheMiss
+from page_extractors import extract_search_results, extract_subject_page, available_backends
+from title_matcher import TitleMatcher, DEFAULT_THRESHOLD, title_key
+from resolution_index import ResolutionIndex
+from cover_store import CoverStore, file_sha256
+from cover_validators import CoverValidators
+from book_catalog import BookCatalog, CATALOG_NAME, legacy_info, write_info_file
+from cover_resizer import CoverResizer, parse_targets, DEFAULT_TARGETS, DEFAULT_QUALITY
+from run_metrics import RunMetrics
+from book_sources import iter_books
+from shard_merge import parse_shard, shard_of, write_manifest
+from progress_journal import (ProgressJournal, journal_key, FINISHED_STATUSES, STATUS_RESOLVED,
+                              STATUS_DOWNLOADED, STATUS_NOT_FOUND, STATUS_TOO_OLD, STATUS_FAILED)
+
+# 常见图片格式的文件头，用于在下载第一块数据时识别伪装成图片的错误页面
+IMAGE_SIGNATURES = (b'\xff\xd8\xff', b'\x89PNG\r\n\x1a\n', b'GIF87a', b'GIF89a')
+
+# 封面图片可访问性的验证策略
+VERIFY_NONE = 'none'  # 不验证，下载时按优先级逐个尝试
+VERIFY_LAZY = 'lazy'  # 不单独验证，下载结果即验证结果
+VERIFY_PARALLEL = 'parallel'  # 获取详情页时并发发送 HEAD 请求验证各个尺寸
+VERIFY_STRATEGIES = (VERIFY_NONE, VERIFY_LAZY, VERIFY_PARALLEL)
+
+# 豆瓣搜索页和详情页地址，可用环境变量覆盖（例如指向本地模拟服务器做基准测试）
+SEARCH_URL = os.environ.get('DOUBAN_SEARCH_URL', 'https://www.douban.com/search')
+SUBJECT_URL = os.environ.get('DOUBAN_SUBJECT_URL', 'https://book.douban.com/subject/{book_id}/')
+
+# 按主机限制同时进行的请求数（键可以是完整主机名或域名后缀）
+DEFAULT_HOST_LIMITS = {
+    'www.douban.com': 2,
+    'book.douban.com': 2,
+    'doubanio.com': 4,
+}
+
+# 运行结束时最多列出的失败书籍数，完整列表写入失败记录文件
+MAX_FAILED_SHOWN = 20
+
+# 封面尺寸，按下载优先级排列：高清图 → 中等尺寸 → 缩略图
+COVER_SIZES = [
+    ('large_cover', '高清图'),
+    ('medium_cover', '中等尺寸'),
+    ('small_cover', '缩略图')
+]
+
+# download_cover 的返回值：刷新模式下条件请求确认封面没有变化（真值，与下载成功同样处理）
+DOWNLOAD_UNCHANGED = 'unchanged'
+# download_cover 的返回值：服务器确认没有这张图片（404/410，或返回的不是图片），其他镜像上也不会有（假值）；
+# 超时、连接错误和 5xx 返回 False，仍会尝试镜像主机
+DOWNLOAD_MISSING = None
+# 表示图片不存在的状态码
+MISSING_STATUS_CODES = (404, 410)
+
+# 输出级别：quiet 只输出最终统计，info 输出每本书的结果和错误，debug 输出完整的查找过程
+LOG_LEVELS = ('quiet', 'info', 'debug')
+_log_level = LOG_LEVELS.index('info')
+
+def set_log_level(level):
+    """
+    设置输出级别（见 LOG_LEVELS）
+    """
+    global _log_level
+    _log_level = LOG_LEVELS.index(level)
+
+def info(*args, **kwargs):
+    """
+    每本书的处理结果、警告和错误（info 及以上级别输出）
+    """
+    if _log_level >= 1:
+        print(*args, **kwargs)
+
+def debug(*args, **kwargs):
+    """
+    查找过程的详细信息：搜索结果、页面字段、限速等待、缓存命中等（只在 debug 级别输出）
+    """
+    if _log_level >= 2:
+        print(*args, **kwargs)
+
+def looks_like_image(head):
+    """
+    根据文件头判断数据是否为图片
+    """
+    if head.startswith(IMAGE_SIGNATURES):
+        return True
+    # WebP: RIFF....WEBP
+    return head[:4] == b'RIFF' and head[8:12] == b'WEBP'
+
 class DoubanBookCover:
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
-        })
-        self.request_count = 0  # 记录请求次数
-        self.last_request_time = time.time()  # 上次请求时间
+    def __init__(self, http_cache=None, resolution_index=None, cover_store=None, transport=None):
         self.base_delay = 2  # 基础延迟时间（秒）
         self.max_delay = 30  # 最大延迟时间（秒）
-        self.request_interval = 3  # 请求间隔（秒）
+        # 被限流的书放入延迟重试队列的等待策略（指数退避 + 随机抖动）
+        self.retry_scheduler = RetryScheduler(base_delay=self.base_delay, max_delay=self.max_delay)
+        # 按主机的熔断器：连续被限流时暂停向该主机发送请求，其他主机不受影响
+        self.circuit_breakers = HostCircuitBreakers(groups=DEFAULT_HOST_LIMITS)
+        self.max_image_bytes = 10 * 1024 * 1024  # 单张封面的大小上限（字节）
+        self.verify_strategy = VERIFY_LAZY  # 封面可访问性的验证策略，见 VERIFY_STRATEGIES
+        self.parser_backend = 'auto'  # 页面解析器：auto / selectolax / lxml / bs4
+        self.candidate_fanout = 2  # 同时获取详情页的候选版本数
+        self.title_matcher = TitleMatcher()  # 书名归一化与相似度打分
+        self._subject_executor = None
+        # 封面下载的对冲请求：超过 hedge_delay 秒没有结果时同时请求镜像主机或下一个尺寸
+        self.hedge_delay = DEFAULT_HEDGE_DELAY
+        self.hedge_fanout = DEFAULT_MAX_FANOUT  # 同一张封面同时进行的请求数上限，1 表示不对冲
+        self.hedge_mirrors = 1  # 每个尺寸额外尝试的镜像主机数
+        self._hedge_executor = None
+        self._verify_executor = None
+        # 按主机的令牌桶限速，被限流时降速、持续成功后逐步恢复
+        self.rate_limiter = HostRateLimiter()
+        # 搜索页和详情页的磁盘缓存（HttpCache 实例，None 表示不缓存）
+        self.http_cache = http_cache
+        # 书名 → 书籍ID 的解析索引（ResolutionIndex 实例，None 表示不使用）
+        self.resolution_index = resolution_index
+        # 按内容寻址的封面存储（CoverStore 实例，None 表示直接保存到分类目录）
+        self.cover_store = cover_store
+        # 已保存封面的 ETag / Last-Modified 等验证信息（CoverValidators 实例，None 表示不记录）
+        self.cover_validators = None
+        # 刷新模式：已有封面用条件请求检查，只重新下载有变化的
+        self.refresh = False
+        # 书籍信息目录（BookCatalog 实例，None 表示不使用）
+        self.book_catalog = None
+        # 是否在分类文件夹中按旧格式为每本书保存 _info.json
+        self.legacy_info = False
+        # 本地生成其他尺寸的封面（CoverResizer 实例，None 表示不生成）
+        self.cover_resizer = None
+        # 各阶段耗时、请求数、下载量、等待时间和缓存命中率
+        self.metrics = RunMetrics()
+        # 合并重复的并发操作：同一书名的搜索、同一书籍ID的详情页、同一地址的封面都只进行一次
+        self.singleflight = SingleFlight()
+        # 记录当前线程本次查找中被排除的版本及原因
+        self._lookup_state = threading.local()
         
-    def _control_request_rate(self):
+        # 按主机限制同时进行的请求数（键可以是完整主机名或域名后缀）
+        self.host_limits = dict(DEFAULT_HOST_LIMITS)
+        self.default_host_limit = 2
+        self._host_semaphores = {}
+        self._host_lock = threading.Lock()
+        # 所有请求共用的传输层：按主机的连接池、预先构造的请求头、持久化的 Cookie
+        self.transport = transport or Transport(self.host_limits, self.default_host_limit)
+        self.session = self.transport.session
+        
+    def _host_semaphore(self, host):
+        """
+        获取指定主机的并发信号量（按需创建）
+        """
+        with self._host_lock:
+            semaphore = self._host_semaphores.get(host)
+            if semaphore is None:
+                limit = self.host_limits.get(host)
+                if limit is None:
+                    for suffix, suffix_limit in self.host_limits.items():
+                        if host.endswith('.' + suffix):
+                            limit = suffix_limit
+                            break
+                    else:
+                        limit = self.default_host_limit
+                semaphore = threading.BoundedSemaphore(limit)
+                self._host_semaphores[host] = semaphore
+            return semaphore
+    
+    def _request(self, method, url, **kwargs):
+        """
+        统一的HTTP请求入口：先查缓存，再按主机限速并限制并发请求数
         """
-        智能请求频率控制
+        if self.http_cache is not None:
+            if method == 'GET' and not kwargs.get('stream') and self.http_cache.ttl_for(url) is not None:
+                return self._cached_get(url, **kwargs)
+            if self.http_cache.offline:
+                raise OfflineCacheMiss(f"离线模式，跳过网络请求: {url}")
+        return self._send(method, url, **kwargs)
+    
+    def _cached_get(self, url, **kwargs):
+        """
+        带缓存的GET：未过期直接返回，过期则用条件请求重新验证
         """
-        current_time = time.time()
-        time_since_last = current_time - self.last_request_time
+        entry = self.http_cache.lookup(url)
+        if entry is not None and (self.http_cache.offline or self.http_cache.is_fresh(entry)):
+            debug(f"   命中缓存: {url}")
+            self.metrics.cache_result('hit')
+            return self.http_cache.to_response(entry)
+        if self.http_cache.offline:
+            raise OfflineCacheMiss(f"离线模式，缓存中没有: {url}")
         
-        # 计算需要等待的时间
-        wait_time = max(0, self.request_interval - time_since_last)
+        if entry is not None:
+            headers = dict(kwargs.pop('headers', None) or {})
+            headers.update(self.http_cache.conditional_headers(entry))
+            kwargs['headers'] = headers
         
+        response = self._send('GET', url, **kwargs)
+        if response.status_code == 304 and entry is not None:
+            debug(f"   缓存验证未变化: {url}")
+            self.metrics.cache_result('revalidated')
+            self.http_cache.touch(url)
+            return self.http_cache.to_response(entry)
+        self.metrics.cache_result('miss')
+        if response.status_code == 200:
+            self.http_cache.store(url, response)
+        return response
+    
+    def _send(self, method, url, **kwargs):
+        """
+        实际发送网络请求：按主机限速并限制并发请求数
+        主机处于熔断状态或返回 418/429/503 时抛出 Throttled，由批处理引擎延迟重试
+        """
+        host = urlsplit(url).netloc
+        self.circuit_breakers.check(host)
+        
+        # 控制请求频率
+        wait_time = self.rate_limiter.acquire(host)
         if wait_time > 0:
-            print(f"智能延迟: {wait_time:.1f}秒")
-            time.sleep(wait_time)
+            debug(f"智能延迟({host}): {wait_time:.1f}秒")
+            self.metrics.add_sleep('rate_limit', wait_time)
         
-        # 更新请求信息
-        self.last_request_time = time.time()
-        self.request_count += 1
+        with self._host_semaphore(host):
+            start = time.perf_counter()
+            try:
+                response = self.transport.request(method, url, **kwargs)
+            except requests.RequestException as e:
+                status_code = getattr(e.response, 'status_code', None)
+                self.metrics.record_request(host, status_code or 'error', time.perf_counter() - start)
+                if status_code is not None:
+                    self._record_status(host, status_code)
+                raise
+            if not kwargs.get('stream'):
+                # 流式响应（图片）的字节数在保存时统计
+                self.metrics.add_bytes(host, len(response.content))
+            self.metrics.record_request(host, response.status_code, time.perf_counter() - start)
         
-        # 每10次请求增加延迟时间
-        if self.request_count % 10 == 0:
-            self.request_interval = min(self.request_interval * 1.5, self.max_delay)
-            print(f"累计请求 {self.request_count} 次，调整请求间隔为 {self.request_interval:.1f}秒")
+        self._record_status(host, response.status_code)
+        if response.status_code in THROTTLE_STATUS_CODES:
+            response.close()
+            raise Throttled(host, response.status_code, parse_retry_after(response.headers.get('Retry-After')))
+        return response
+    
+    def _record_status(self, host, status_code):
+        """
+        把响应状态反馈给限速器和熔断器
+        """
+        old_rate = self.rate_limiter.bucket(host).rate
+        new_rate = self.rate_limiter.record_response(host, status_code)
+        throttled = status_code in THROTTLE_STATUS_CODES
+        if throttled:
+            info(f"{host} 返回 {status_code}，请求速率降为 {new_rate:.2f} 次/秒")
+        elif new_rate > old_rate:
+            debug(f"{host} 请求持续成功，请求速率升为 {new_rate:.2f} 次/秒")
+        if self.circuit_breakers.record(host, throttled):
+            breaker = self.circuit_breakers.breaker(host)
+            info(f"{self.circuit_breakers.key_for(host)} 连续被限流，暂停请求 {breaker.cooldown:.0f} 秒")
         
     def search_book(self, book_title):
         """
         搜索书籍信息
+        被限流时抛出 Throttled，不在这里等待，由批处理引擎把这本书放入延迟重试队列
         """
-        try:
-            # 尝试多种搜索方法
-            search_methods = [
-                # self._search_via_douban_api,
-                self._search_via_web_page,
-                # self._search_via_alternative_api,
-                # self._search_via_dangdang,
-                # self._search_via_demo_data
-            ]
-            
-            # 控制请求频率
-            self._control_request_rate()
-            
-            max_retries = 3  # 最大重试次数
-            retry_count = 0
-            
-            while retry_count < max_retries:
-                for method in search_methods:
-                    try:
-                        result = method(book_title)
-                        if result:
-                            print('========================================')
-                            print(result)
-                            return result
-                    except requests.RequestException as e:
-                        status_code = getattr(e.response, 'status_code', None)
-                        
-                        if status_code in [429, 418, 503]:
-                            # 频率限制或反爬虫错误
-                            retry_count += 1
-                            if retry_count >= max_retries:
-                                print(f"搜索方法失败（达到最大重试次数）: {e}")
-                                break
-                            
-                            # 指数退避策略
-                            backoff_time = min(2 ** retry_count, self.max_delay)
-                            print(f"遇到频率限制，{backoff_time}秒后重试 ({retry_count}/{max_retries})...")
-                            time.sleep(backoff_time)
-                            # 增加请求间隔
-                            self.request_interval = min(self.request_interval * 2, self.max_delay)
-                        else:
-                            print(f"搜索方法失败: {e}")
-                    except Exception as e:
-                        print(f"搜索方法失败: {e}")
-                else:
-                    # 所有方法都尝试失败
-                    break
-            
-            print(f"所有搜索方法都未找到书籍: {book_title}")
-            return None
-                
-        except Exception as e:
-            print(f"搜索请求失败: {e}")
-            return None
+        # 尝试多种搜索方法
+        search_methods = [
+            # self._search_via_douban_api,
+            self._search_via_web_page,
+            # self._search_via_alternative_api,
+            # self._search_via_dangdang,
+            # self._search_via_demo_data
+        ]
+        
+        for method in search_methods:
+            try:
+                result = method(book_title)
+                if result:
+                    debug('========================================')
+                    debug(result)
+                    return result
+            except Throttled:
+                raise
+            except Exception as e:
+                info(f"搜索方法失败: {e}")
+        
+        debug(f"所有搜索方法都未找到书籍: {book_title}")
+        return None
+    
+    def _search_shared(self, book_title):
+        """
+        搜索书籍信息；同一书名（按 title_key，卷次和版本号不同的书不合并）的搜索正在进行或刚刚完成时直接使用它的结果
+        查找中被排除的版本及原因也一并共享，调用方据此给出未找到的原因
+        """
+        def search():
+            outer = getattr(self._lookup_state, 'rejections', None)
+            self._lookup_state.rejections = []
+            try:
+                return self.search_book(book_title), self._lookup_state.rejections
+            finally:
+                self._lookup_state.rejections = outer
+        
+        book_info, rejections = self.singleflight.do(
+            ('title', title_key(book_title)), search,
+            # 网络错误导致的失败不复用
+            memo=lambda result: not any(status == STATUS_FAILED for status, _ in result[1])
+        )
+        own = getattr(self._lookup_state, 'rejections', None)
+        if own is not None:
+            own.extend(rejections)
+        return book_info
     
     def _search_via_douban_api(self, book_title):
         """
@@ -113,7 +332,7 @@ class DoubanBookCover:
         try:
             # 使用豆瓣图书搜索API，获取多个结果以便选择最新版本
             search_url = f"https://api.douban.com/v2/book/search?q={quote(book_title)}&count=10"
-            response = self.session.get(search_url, timeout=10)
+            response = self._request('GET', search_url, timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -199,7 +418,7 @@ class DoubanBookCover:
             from bs4 import BeautifulSoup
             
             search_url = f"https://search.dangdang.com/?key={quote(book_title)}"
-            response = self.session.get(search_url, timeout=10)
+            response = self._request('GET', search_url, timeout=10)
             response.raise_for_status()
             
             soup = BeautifulSoup(response.text, 'html.parser')
@@ -210,7 +429,7 @@ class DoubanBookCover:
                 book_url = book_links[0].get('href')
                 if book_url:
                     # 访问书籍详情页
-                    book_response = self.session.get(book_url, timeout=10)
+                    book_response = self._request('GET', book_url, timeout=10)
                     book_response.raise_for_status()
                     
                     book_soup = BeautifulSoup(book_response.text, 'html.parser')
@@ -247,13 +466,11 @@ class DoubanBookCover:
         通过豆瓣网页搜索，打印搜索结果
         """
         try:
-            search_url = f"https://www.douban.com/search?cat=1001&q={quote(book_title)}"
-            print(f"正在搜索豆瓣读书: {search_url}")
-            
-            # 控制请求频率
-            self._control_request_rate()
+            search_url = f"{SEARCH_URL}?cat=1001&q={quote(book_title)}"
+            debug(f"正在搜索豆瓣读书: {search_url}")
             
-            response = self.session.get(search_url, timeout=10)
+            with self.metrics.timer('search_page'):
+                response = self._request('GET', search_url, timeout=10)
             response.raise_for_status()
             
             # 解析搜索结果并打印
@@ -264,8 +481,11 @@ class DoubanBookCover:
                 return self._get_book_info(book_id)
             return None
             
+        except Throttled:
+            raise
         except Exception as e:
-            print(f"网页搜索失败: {e}")
+            info(f"网页搜索失败: {e}")
+            self._note_rejection(STATUS_FAILED, f"搜索失败: {e}")
             return None
     
     def _parse_and_print_search_results(self, html_content, book_title):
@@ -273,104 +493,120 @@ class DoubanBookCover:
         解析并打印豆瓣搜索结果
         """
         try:
-            from bs4 import BeautifulSoup
-            import re
-            
-            soup = BeautifulSoup(html_content, 'html.parser')
-            
-            print(f"\n=== 豆瓣读书搜索结果: {book_title} ===")
+            debug(f"\n=== 豆瓣读书搜索结果: {book_title} ===")
             
             # 查找搜索结果
-            result_items = soup.find_all('div', class_='result')
-            
-            if not result_items:
-                # 尝试其他可能的搜索结果容器
-                result_items = soup.find_all('div', class_='item-root')
-            
-            if not result_items:
-                # 尝试查找书籍链接
-                book_links = soup.find_all('a', href=re.compile(r'/subject/\d+/'))
-                if book_links:
-                    print(f"找到 {len(book_links)} 个相关书籍:")
-                    for i, link in enumerate(book_links[:10], 1):  # 只显示前10个
-                        href = link.get('href', '')
-                        title = link.get_text().strip()
-                        if title and href:
-                            # 从链接中提取真正的书籍ID
-                            book_id_match = re.search(r'/subject/(\d+)/', href)
-                            if book_id_match:
-                                book_id = book_id_match.group(1)
-                                # print(f"{i}. 标题: {title}")
-                                # print(f"   链接: {href}")
-                                # print(f"   书籍ID: {book_id}")
-                                # print()
+            with self.metrics.timer('parse_search'):
+                results = extract_search_results(html_content, self.parser_backend)
+            
+            if not results or results[0]['source'] != 'result':
+                # 页面中没有搜索结果容器，只找到了书籍链接
+                if results:
+                    debug(f"找到 {len(results)} 个相关书籍:")
                 else:
-                    print("未找到相关书籍")
+                    debug("未找到相关书籍")
                 return
             
-            print(f"找到 {len(result_items)} 个搜索结果:")
-            print("result_items ====== ", result_items)
+            debug(f"找到 {len(results)} 个搜索结果:")
             
-            for i, item in enumerate(result_items[:10], 1):  # 只显示前10个结果
-                try:
-                    # 提取标题
-                    title_elem = item.find('a', class_='title')
-                    if not title_elem:
-                        title_elem = item.find('a')
-                    
-                    title = title_elem.get_text().strip() if title_elem else "未知标题"
-                    href = title_elem.get('href', '') if title_elem else ''
-                    
-                    # 从链接中提取真正的书籍ID
-                    book_id = "未知ID"
-                    if href:
-                        # 处理豆瓣的跳转链接
-                        if 'link2' in href:
-                            # 从URL参数中提取真正的书籍ID
-                            url_match = re.search(r'url=.*?%2Fsubject%2F(\d+)%2F', href)
-                            if url_match:
-                                book_id = url_match.group(1)
-                        else:
-                            # 直接从链接中提取
-                            book_id_match = re.search(r'/subject/(\d+)/', href)
-                            if book_id_match:
-                                book_id = book_id_match.group(1)
-                    
-                    # 提取其他信息
-                    rating_elem = item.find('span', class_='rating_nums')
-                    rating = rating_elem.get_text().strip() if rating_elem else "无评分"
-                    
-                    # 提取作者和出版社信息
-                    info_elem = item.find('p', class_='')
-                    if not info_elem:
-                        info_elem = item.find('div', class_='info')
-                    
-                    info_text = info_elem.get_text().strip() if info_elem else ""
-                    
-                    # print(f"{i}. 标题: {title}")
-                    # print(f"   书籍ID: {book_id}")
-                    # print(f"   链接: {href}")
-                    # print(f"   评分: {rating}")
-                    # print(f"   信息: {info_text}")
-                    
-                    # 获取页面内容
-                    if book_id != "未知ID":
-                        print("书籍ID ====== ", book_id)
-                        result = self._get_and_print_book_page(book_id, title, book_title)
-                        if result:
-                            print("找到匹配的书籍信息，返回结果")
-                            return result
-                    
-                except Exception as e:
-                    print(f"解析第{i}个结果时出错: {e}")
-                    continue
+            # 只根据搜索页信息给前10个结果打分，排除明显不符合的版本
+            candidates = self._rank_search_candidates(results[:10], book_title)
+            if candidates:
+                result = self._fetch_best_candidate(candidates, book_title)
+                if result:
+                    debug("找到匹配的书籍信息，返回结果")
+                    return result
             
-            print("=" * 50)
+            debug("=" * 50)
             
+        except Throttled:
+            raise
         except Exception as e:
-            print(f"解析搜索结果失败: {e}")
-            print("原始HTML内容片段:")
-            print(html_content[:1000] + "..." if len(html_content) > 1000 else html_content)
+            info(f"解析搜索结果失败: {e}")
+            self._note_rejection(STATUS_FAILED, f"解析搜索结果失败: {e}")
+            debug("原始HTML内容片段:")
+            debug(html_content[:1000] + "..." if len(html_content) > 1000 else html_content)
+    
+    def _rank_search_candidates(self, results, book_title):
+        """
+        只根据搜索结果页的标题和出版信息给候选版本打分排序
+        标题不匹配或出版年不符合要求的结果直接排除，不再请求详情页
+        """
+        candidates = []
+        for position, item in enumerate(results):
+            if not item['book_id']:
+                continue
+            title = item['title']
+            
+            # 标题：相似度低于阈值的直接排除，相似度高的优先（没有标题时按刚好达到阈值处理）
+            title_score = self.title_matcher.threshold
+            if title:
+                title_score = self.title_matcher.score(title, book_title)
+                if title_score < self.title_matcher.threshold:
+                    debug(f"   ✗ 排除（标题不匹配，相似度 {title_score:.2f}）: {title}")
+                    continue
+            
+            # 出版年：搜索页显示的出版年不符合要求的直接排除，较新的版本优先
+            year = self._search_result_year(item['cast'] or item['info'])
+            if year is not None and year <= 2015:
+                debug(f"   ✗ 排除（出版年 {year}）: {title}")
+                self._note_rejection(STATUS_TOO_OLD, f"出版年 {year}")
+                continue
+            
+            candidates.append({
+                'book_id': item['book_id'],
+                'title': title,
+                'year': year,
+                'score': (round(title_score, 2), year or 0, -position),
+            })
+        
+        candidates.sort(key=lambda candidate: candidate['score'], reverse=True)
+        for rank, candidate in enumerate(candidates, 1):
+            debug(f"   {rank}. {candidate['title'] or '未知标题'} (书籍ID: {candidate['book_id']}, 出版年: {candidate['year'] or '未知'})")
+        return candidates
+    
+    def _search_result_year(self, text):
+        """
+        从搜索结果的出版信息（如 "余华 / 作家出版社 / 2012"）中提取出版年
+        """
+        years = re.findall(r'(?<!\d)(1[89]\d{2}|20\d{2})(?!\d)', text or '')
+        return int(years[-1]) if years else None
+    
+    def _fetch_best_candidate(self, candidates, book_title):
+        """
+        按排名并发获取前几个候选版本的详情页（同时进行的数量由 candidate_fanout 控制），
+        排名靠前的版本符合要求后取消其余请求
+        """
+        if self._subject_executor is None:
+            self._subject_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix='douban-subject')
+        
+        # 把当前线程的查找记录带到线程池中
+        rejections = getattr(self._lookup_state, 'rejections', None)
+        
+        def fetch(candidate):
+            self._lookup_state.rejections = rejections
+            try:
+                debug("书籍ID ====== ", candidate['book_id'])
+                return self._get_and_print_book_page(candidate['book_id'], candidate['title'], book_title)
+            finally:
+                self._lookup_state.rejections = None
+        
+        fanout = max(1, self.candidate_fanout)
+        futures = [self._subject_executor.submit(fetch, candidate) for candidate in candidates[:fanout]]
+        next_index = len(futures)
+        try:
+            for index in range(len(candidates)):
+                result = futures[index].result()
+                if result:
+                    return result
+                # 当前候选不符合要求，补充下一个候选保持并发数
+                if next_index < len(candidates):
+                    futures.append(self._subject_executor.submit(fetch, candidates[next_index]))
+                    next_index += 1
+            return None
+        finally:
+            for future in futures:
+                future.cancel()
     
     def _get_and_print_book_page(self, book_id, title, search_title):
         """
@@ -378,129 +614,81 @@ class DoubanBookCover:
         返回书籍信息字典，包含封面图片URL等
         """
         try:
-            book_url = f"https://book.douban.com/subject/{book_id}/"
-            print(f"   正在获取页面内容: {book_url}")
-            
-            response = self.session.get(book_url, timeout=10)
-            response.raise_for_status()
-            
-            # 解析页面内容
-            from bs4 import BeautifulSoup
-            soup = BeautifulSoup(response.text, 'html.parser')
+            page = self._fetch_subject_page(book_id)
             
-            print(f"   --- 页面内容详情 ---")
+            debug(f"   --- 页面内容详情 ---")
             
             # 提取书籍标题
-            title_elem = soup.find('h1')
-            if title_elem:
-                page_title = title_elem.get_text().strip()
-                print(f"   页面标题: {page_title}")
+            page_title = page.get('title') if page else None
+            if page_title:
+                debug(f"   页面标题: {page_title}")
                 
                 # 检查标题是否匹配搜索的书籍名
                 if not self._is_title_match(page_title, search_title):
-                    print(f"   ⚠️  标题不匹配，跳过此版本")
+                    debug(f"   ⚠️  标题不匹配，跳过此版本")
                     return None
             else:
-                print(f"   ⚠️  未找到页面标题，跳过此版本")
+                debug(f"   ⚠️  未找到页面标题，跳过此版本")
                 return None
             
             # 提取作者信息
-            author_info = "未知作者"
-            author_elem = soup.find('a', {'name': 'author'})
-            if author_elem:
-                author_info = author_elem.get_text().strip()
-                print(f"   作者: {author_info}")
+            author_info = page['author'] or "未知作者"
+            if page['author']:
+                debug(f"   作者: {author_info}")
             
             # 提取出版社信息
-            publisher_info = "未知出版社"
-            publisher_elem = soup.find('span', string='出版社:')
-            if publisher_elem:
-                publisher_elem = publisher_elem.find_next_sibling('a')
-                if publisher_elem:
-                    publisher_info = publisher_elem.get_text().strip()
-                    print(f"   出版社: {publisher_info}")
+            publisher_info = page['publisher'] or "未知出版社"
+            if page['publisher']:
+                debug(f"   出版社: {publisher_info}")
             
             # 提取出版日期
-            pubdate = "未知"
-            pubdate_elem = soup.find('span', string='出版年:')
-            if pubdate_elem:
-                # 尝试多种方式获取出版年
-                pubdate_info = pubdate_elem.find_next_sibling('text')
-                if not pubdate_info:
-                    pubdate_info = pubdate_elem.parent.find_next_sibling('text')
-                if not pubdate_info:
-                    # 查找包含出版年的文本
-                    pubdate_text = pubdate_elem.parent.get_text()
-                    import re
-                    year_match = re.search(r'(\d{4})', pubdate_text)
-                    if year_match:
-                        pubdate = year_match.group(1)
-                else:
-                    pubdate = pubdate_info.strip()
-                print(f"   出版年: {pubdate}")
-            else:
-                print(f"   出版年: {pubdate}")
+            pubdate = page['pubdate'] or "未知"
+            debug(f"   出版年: {pubdate}")
             
             # 检查出版日期是否大于2015年
             try:
                 if pubdate and pubdate != "未知":
                     # 提取年份（处理不同格式的日期）
-                    import re
                     year_match = re.search(r'(\d{4})', str(pubdate))
                     if year_match:
                         year = int(year_match.group(1))
                         if year <= 2015:
-                            print(f"   ⚠️ 出版年不符合要求（{year}），跳过")
+                            debug(f"   ⚠️ 出版年不符合要求（{year}），跳过")
+                            self._note_rejection(STATUS_TOO_OLD, f"出版年 {year}")
                             return None
                         else:
-                            print(f"   ✓ 出版年符合要求（{year}）")
+                            debug(f"   ✓ 出版年符合要求（{year}）")
                     else:
-                        print(f"   ⚠️ 无法解析出版年（{pubdate}），跳过")
+                        debug(f"   ⚠️ 无法解析出版年（{pubdate}），跳过")
                         return None
                 else:
-                    print(f"   ⚠️ 出版年未知，跳过")
+                    debug(f"   ⚠️ 出版年未知，跳过")
                     return None
             except Exception as e:
-                print(f"   ⚠️ 解析出版年时出错（{e}），跳过")
+                debug(f"   ⚠️ 解析出版年时出错（{e}），跳过")
                 return None
 
             # 提取ISBN
-            isbn_elem = soup.find('span', string='ISBN:')
-            if isbn_elem:
-                isbn_info = isbn_elem.find_next_sibling('text')
-                if isbn_info:
-                    print(f"   ISBN: {isbn_info.strip()}")
+            if page['isbn']:
+                debug(f"   ISBN: {page['isbn']}")
             
             # 提取评分
-            rating_elem = soup.find('strong', class_='rating_num')
-            if rating_elem:
-                rating = rating_elem.get_text().strip()
-                print(f"   评分: {rating}")
+            if page['rating']:
+                debug(f"   评分: {page['rating']}")
             
             # 提取评分人数
-            rating_people_elem = soup.find('a', class_='rating_people')
-            if rating_people_elem:
-                rating_people = rating_people_elem.get_text().strip()
-                print(f"   评分人数: {rating_people}")
-            
-            # 提取封面图片
-            cover_elem = soup.find('img', {'title': title})
-            if not cover_elem:
-                cover_elem = soup.find('img', id='mainpic')
-            if not cover_elem:
-                # 尝试其他可能的封面图片选择器
-                cover_elem = soup.find('img', class_='nbg')
-            if not cover_elem:
-                cover_elem = soup.find('div', id='mainpic').find('img') if soup.find('div', id='mainpic') else None
+            if page['rating_people']:
+                debug(f"   评分人数: {page['rating_people']}")
             
             # 初始化封面图片URL
             small_cover = ""
             medium_cover = ""
             large_cover = ""
+            verified = {}  # 各尺寸的验证结果：True 可访问，False 不可访问，缺省为未验证
             
-            if cover_elem:
-                cover_url = cover_elem.get('src', '')
-                print(f"   封面图片: {cover_url}")
+            cover_url = page['cover_url']
+            if cover_url:
+                debug(f"   封面图片: {cover_url}")
                 
                 # 获取不同尺寸的封面图片
                 if cover_url:
@@ -510,74 +698,113 @@ class DoubanBookCover:
                     medium_cover = base_url.replace('/public/', '/m/public/')
                     large_cover = base_url.replace('/public/', '/l/public/')
                     
-                    print(f"   缩略图: {small_cover}")
-                    print(f"   中等尺寸: {medium_cover}")
-                    print(f"   高清图: {large_cover}")
+                    debug(f"   缩略图: {small_cover}")
+                    debug(f"   中等尺寸: {medium_cover}")
+                    debug(f"   高清图: {large_cover}")
                     
-                    # 验证图片URL是否可访问
-                    print(f"   验证图片可访问性:")
-                    for size_name, url in [("缩略图", small_cover), ("中等尺寸", medium_cover), ("高清图", large_cover)]:
-                        try:
-                            response = self.session.head(url, timeout=5)
-                            if response.status_code == 200:
-                                print(f"     ✓ {size_name}: 可访问")
-                            else:
-                                print(f"     ✗ {size_name}: 状态码 {response.status_code}")
-                        except Exception as e:
-                            print(f"     ✗ {size_name}: 访问失败 - {e}")
+                    if self.verify_strategy == VERIFY_PARALLEL:
+                        to_verify = {'large_cover': large_cover}
+                        if self.cover_resizer is None:
+                            # 本地生成其他尺寸时只需要大图，不必验证中小尺寸
+                            to_verify['medium_cover'] = medium_cover
+                            to_verify['small_cover'] = small_cover
+                        with self.metrics.timer('verify'):
+                            verified = self._verify_cover_urls(to_verify)
             else:
-                print(f"   封面图片: 未找到")
+                debug(f"   封面图片: 未找到")
             
             # 提取内容简介
-            intro_elem = soup.find('div', {'id': 'link-report'})
-            if intro_elem:
-                intro_text = intro_elem.get_text().strip()
-                if intro_text:
-                    # 只显示前200个字符
-                    intro_preview = intro_text[:200] + "..." if len(intro_text) > 200 else intro_text
-                    print(f"   内容简介: {intro_preview}")
+            intro_text = page['intro']
+            if intro_text:
+                # 只显示前200个字符
+                intro_preview = intro_text[:200] + "..." if len(intro_text) > 200 else intro_text
+                debug(f"   内容简介: {intro_preview}")
             
-            print(f"   --- 页面内容结束 ---")
+            debug(f"   --- 页面内容结束 ---")
             
             # 返回书籍信息字典
             book_info = {
+                'id': book_id,
                 'title': page_title,
                 'author': [author_info],
                 'publisher': publisher_info,
                 'pubdate': pubdate,
+                'isbn': page['isbn'] or '',
+                'rating': page['rating'] or '',
+                'rating_people': page['rating_people'] or '',
+                'intro': intro_text or '',
                 'images': {
                     'small': small_cover,
                     'medium': medium_cover,
                     'large': large_cover
-                }
+                },
+                'verified': verified
             }
             
             return book_info
             
+        except Throttled:
+            raise
         except Exception as e:
-            print(f"   获取页面内容失败: {e}")
+            info(f"   获取页面内容失败: {e}")
+            self._note_rejection(STATUS_FAILED, f"获取详情页失败: {e}")
             return None
     
-    def _is_title_match(self, page_title, search_title):
+    def _fetch_subject_page(self, book_id):
         """
-        检查页面标题是否与搜索的书籍名匹配
+        获取并解析详情页；同一书籍ID的请求正在进行或刚刚完成时直接使用它的结果
         """
-        # 清理标题，移除括号内容和其他修饰词
-        def clean_title(title):
-            import re
-            # 移除括号及其内容
-            title = re.sub(r'[（(].*?[）)]', '', title)
-            # 移除版本标识
-            title = re.sub(r'(新版|精装|典藏|定本|2021|2020|2019|2018|2017|2016|2015|2014|2013|2012|2011|2010)', '', title)
-            # 移除多余空格
-            title = re.sub(r'\s+', '', title)
-            return title.strip()
+        def fetch():
+            book_url = SUBJECT_URL.format(book_id=book_id)
+            debug(f"   正在获取页面内容: {book_url}")
+            
+            with self.metrics.timer('subject_page'):
+                response = self._request('GET', book_url, timeout=10)
+            response.raise_for_status()
+            
+            # 解析页面内容（只解析标题、封面、#info、评分和简介区域）
+            with self.metrics.timer('parse_subject'):
+                return extract_subject_page(response.text, self.parser_backend)
+        
+        return self.singleflight.do(('subject', str(book_id)), fetch)
+    
+    def _verify_cover_urls(self, urls):
+        """
+        并发发送 HEAD 请求验证各尺寸封面是否可访问
+        urls 为 {尺寸键: URL}，返回 {尺寸键: 是否可访问}
+        """
+        if self._verify_executor is None:
+            self._verify_executor = ThreadPoolExecutor(max_workers=len(COVER_SIZES), thread_name_prefix='douban-verify')
+        
+        def check(url):
+            try:
+                response = self._request('HEAD', url, timeout=5)
+                return response.status_code == 200, f"状态码 {response.status_code}"
+            except Throttled:
+                raise
+            except Exception as e:
+                return False, f"访问失败 - {e}"
         
-        clean_page_title = clean_title(page_title)
-        clean_search_title = clean_title(search_title)
+        futures = {key: self._verify_executor.submit(check, url) for key, url in urls.items() if url}
         
-        # 检查是否包含主要关键词
-        return clean_search_title in clean_page_title or clean_page_title in clean_search_title
+        debug(f"   验证图片可访问性:")
+        verified = {}
+        for key, description in COVER_SIZES:
+            if key not in futures:
+                continue
+            ok, detail = futures[key].result()
+            verified[key] = ok
+            if ok:
+                debug(f"     ✓ {description}: 可访问")
+            else:
+                debug(f"     ✗ {description}: {detail}")
+        return verified
+    
+    def _is_title_match(self, page_title, search_title):
+        """
+        检查页面标题是否与搜索的书籍名匹配
+        """
+        return self.title_matcher.is_match(page_title, search_title)
     
     def _search_via_alternative_api(self, book_title):
         """
@@ -586,7 +813,7 @@ class DoubanBookCover:
         try:
             # 尝试使用豆瓣图书的备用搜索接口，获取多个结果
             search_url = f"https://frodo.douban.com/api/v2/search/subjects?q={quote(book_title)}&type=book&count=10"
-            response = self.session.get(search_url, timeout=10)
+            response = self._request('GET', search_url, timeout=10)
             response.raise_for_status()
             
             data = response.json()
@@ -636,7 +863,7 @@ class DoubanBookCover:
             # 使用豆瓣图书API获取详细信息
             api_url = f"https://api.douban.com/v2/book/{book_id}"
             
-            response = self.session.get(api_url, timeout=10)
+            response = self._request('GET', api_url, timeout=10)
             response.raise_for_status()
             
             book_data = response.json()
@@ -649,14 +876,22 @@ class DoubanBookCover:
             print(f"解析书籍信息失败: {e}")
             return None
     
-    def get_book_covers(self, book_title="活着"):
+    def get_book_covers(self, book_title="活着", category=""):
         """
         获取书籍封面
+        解析索引中有这本书时直接使用记录的封面地址，不再搜索
         """
-        print(f"正在搜索书籍: {book_title}")
+        book_info = None
+        if self.resolution_index is not None:
+            book_info = self.resolution_index.lookup(book_title, category)
+            if book_info:
+                debug(f"✓ 解析索引命中: {book_title} (书籍ID: {book_info['id']})")
+        from_index = book_info is not None
         
-        book_info = self.search_book(book_title)
-        print(book_info)    
+        if not from_index:
+            debug(f"正在搜索书籍: {book_title}")
+            book_info = self._search_shared(book_title)
+            debug(book_info)    
         if not book_info:
             return None
         
@@ -666,11 +901,11 @@ class DoubanBookCover:
         publisher = book_info.get('publisher', '未知出版社')
         pubdate = book_info.get('pubdate', '未知出版日期')
         
-        print(f"\n找到书籍:")
-        print(f"标题: {title}")
-        print(f"作者: {author}")
-        print(f"出版社: {publisher}")
-        print(f"出版日期: {pubdate}")
+        debug(f"\n找到书籍:")
+        debug(f"标题: {title}")
+        debug(f"作者: {author}")
+        debug(f"出版社: {publisher}")
+        debug(f"出版日期: {pubdate}")
         
         # 获取封面图片
         images = book_info.get('images', {})
@@ -689,17 +924,58 @@ class DoubanBookCover:
             medium_cover = images.get('medium', '')  # 中等尺寸
         
         covers = {
+            'subject_id': book_info.get('id', ''),
             'title': title,
             'author': author,
             'publisher': publisher,
             'pubdate': pubdate,
+            'isbn': book_info.get('isbn', ''),
+            'rating': book_info.get('rating', ''),
+            'rating_people': book_info.get('rating_people', ''),
+            'intro': book_info.get('intro', ''),
             'small_cover': small_cover,
             'medium_cover': medium_cover,
-            'large_cover': large_cover
+            'large_cover': large_cover,
+            # 已知的各尺寸可访问性，保存封面时据此跳过不可访问的尺寸
+            'verified': dict(book_info.get('verified') or {}),
+            # 是否来自解析索引（封面地址可能已失效）
+            'from_index': from_index
         }
         
+        if not from_index and self.resolution_index is not None:
+            self.resolution_index.store(book_title, category, covers)
+        
         return covers
     
+    def _note_rejection(self, status, detail=""):
+        """
+        记录一个被排除的候选版本或查找过程中的错误
+        """
+        rejections = getattr(self._lookup_state, 'rejections', None)
+        if rejections is not None:
+            rejections.append((status, detail))
+    
+    def resolve_book(self, book_title, category=""):
+        """
+        获取书籍封面信息，并给出未找到时的原因
+        返回 (covers, status, reason)，status 为 resolved / too_old / not_found / failed
+        查找过程中出现网络错误时记为 failed，以便之后用 --retry-failed 重试
+        """
+        self._lookup_state.rejections = []
+        try:
+            covers = self.get_book_covers(book_title, category)
+            if covers:
+                return covers, STATUS_RESOLVED, ""
+            rejections = self._lookup_state.rejections
+            for status, detail in rejections:
+                if status == STATUS_FAILED:
+                    return None, STATUS_FAILED, detail
+            if any(status == STATUS_TOO_OLD for status, _ in rejections):
+                return None, STATUS_TOO_OLD, "找到的版本出版年都不符合要求"
+            return None, STATUS_NOT_FOUND, "未能获取到封面信息"
+        finally:
+            self._lookup_state.rejections = None
+    
     def verify_image_url(self, url):
         """
         验证图片URL是否可访问
@@ -709,169 +985,625 @@ class DoubanBookCover:
         
         try:
             # 使用GET请求而不是HEAD，因为有些服务器对HEAD请求有限制
-            response = self.session.get(url, timeout=10, stream=True)
+            response = self._request('GET', url, timeout=10, stream=True)
             return response.status_code == 200
         except:
             return False
     
-    def download_cover(self, url, filename):
+    def download_cover(self, url, filename, race=None):
         """
         下载封面图片
+        传入 race（HedgeRace）时作为对冲请求之一：其他请求已经获胜时放弃，写入文件前先 claim
         """
         if not url:
-            print(f"无效的图片URL: {url}")
+            debug(f"无效的图片URL: {url}")
+            return False
+        if race is not None and race.cancelled():
             return False
         
-        # 增强请求头以应对反爬虫
-        enhanced_headers = {
-            'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
-            'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
-            'Accept-Encoding': 'gzip, deflate, br',
-            'Referer': 'https://book.douban.com/',
-            'DNT': '1',
-            'Connection': 'keep-alive',
-            'Upgrade-Insecure-Requests': '1'
-        }
+        # 刷新模式下，已保存的封面用条件请求检查是否有变化
+        headers = IMAGE_HEADERS
+        entry = None
+        if self.refresh and self.cover_validators is not None:
+            entry = self.cover_validators.lookup(filename)
+            if entry is not None and self.cover_validators.is_current(entry, filename, url):
+                headers = dict(IMAGE_HEADERS)
+                headers.update(self.cover_validators.conditional_headers(entry))
+            else:
+                entry = None
         
         try:
-            # 使用增强的请求头
-            response = self.session.get(url, timeout=30, headers=enhanced_headers)
+            # 使用增强的请求头（预先构造，见 transport.IMAGE_HEADERS）
+            response = self._request('GET', url, timeout=30, headers=headers, stream=True)
             
+            if response.status_code == 304 and entry is not None:
+                response.close()
+                if race is not None and not race.claim():
+                    return False
+                self.cover_validators.touch(filename)
+                debug(f"封面没有变化: {filename}")
+                return DOWNLOAD_UNCHANGED
             if response.status_code == 200:
-                with open(filename, 'wb') as f:
-                    f.write(response.content)
-                print(f"封面已保存: {filename}")
-                return True
+                saved = self._save_image_response(response, filename, race)
+                if saved:
+                    debug(f"封面已保存: {filename}")
+                    self._remember_validators(response, url, filename)
+                    return True
+                return saved
             else:
-                print(f"下载封面失败，状态码: {response.status_code}")
-                
-                # 如果是反爬虫错误，尝试备用方案
-                if response.status_code == 418:
-                    print("检测到反爬虫机制，尝试备用下载方法...")
-                    return self._download_with_alternative_method(url, filename)
-                
-                return False
+                response.close()
+                info(f"下载封面失败，状态码: {response.status_code}")
+                return DOWNLOAD_MISSING if response.status_code in MISSING_STATUS_CODES else False
             
+        except Throttled as e:
+            if e.status_code != 418:
+                raise
+            # 反爬虫错误，换一组请求头再试一次，仍然失败时交给批处理引擎延迟重试
+            debug("检测到反爬虫机制，尝试备用下载方法...")
+            if self._download_with_alternative_method(url, filename, race):
+                return True
+            raise
         except requests.RequestException as e:
-            print(f"下载封面失败: {e}")
+            info(f"下载封面失败: {e}")
             return False
 
-    def _download_with_alternative_method(self, url, filename):
+    def fetch_image(self, url):
         """
-        备用下载方法：尝试使用不同的策略绕过反爬虫
+        把图片下载到内存，返回图片内容；不是图片、超过 max_image_bytes 或下载失败时返回 None
+        以流的方式读取，超过大小上限时立即放弃；同一地址同时只下载一次
         """
-        import time
-        import random
-        
-        # 策略1：添加延迟后重试
-        print("策略1: 添加随机延迟后重试...")
-        time.sleep(random.uniform(2, 5))
+        def download():
+            try:
+                response = self._request('GET', url, timeout=30, headers=IMAGE_HEADERS, stream=True)
+            except requests.RequestException as e:
+                info(f"下载封面失败: {e}")
+                return None
+            try:
+                if response.status_code != 200:
+                    debug(f"下载封面失败，状态码: {response.status_code}")
+                    return None
+                content_length = response.headers.get('Content-Length', '')
+                if content_length.isdigit() and int(content_length) > self.max_image_bytes:
+                    info(f"图片过大（{content_length} 字节），放弃下载")
+                    return None
+                chunks = []
+                size = 0
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    if not chunks and chunk and len(chunk) >= 12 and not looks_like_image(chunk[:12]):
+                        break
+                    size += len(chunk)
+                    if size > self.max_image_bytes:
+                        info(f"图片超过大小上限（{self.max_image_bytes} 字节），放弃下载")
+                        return None
+                    chunks.append(chunk)
+                data = b''.join(chunks)
+            except requests.RequestException as e:
+                info(f"下载封面失败: {e}")
+                return None
+            finally:
+                response.close()
+            if not looks_like_image(data[:12]):
+                info(f"下载内容不是图片: {url}")
+                return None
+            self.metrics.add_bytes(urlsplit(url).netloc, size)
+            return data
         
-        # 使用不同的User-Agent
-        alternative_headers = {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
-            'Referer': 'https://book.douban.com/',
-            'Sec-Fetch-Dest': 'image',
-            'Sec-Fetch-Mode': 'no-cors',
-            'Sec-Fetch-Site': 'cross-site'
-        }
+        # 图片内容由调用方缓存，这里只合并同时进行的下载
+        return self.singleflight.do(('image_data', url), download, memo=lambda data: False)
+    
+    def _download_shared(self, url, filepath, race):
+        """
+        下载一张封面；同一地址正在下载或刚刚下载过（例如同一本书出现在多个分类）时不重复下载，
+        等它完成后从下载好的文件链接或复制一份
+        """
+        def download():
+            ok = self.download_cover(url, filepath, race=race)
+            if ok is True and self.cover_store is not None:
+                try:
+                    self.cover_store.adopt(filepath, url)
+                except OSError as e:
+                    info(f"⚠️ 封面存入本地存储失败（{e}），保留在分类目录中")
+            return ok, filepath, race
         
+        ok, source, owner = self.singleflight.do(('image', url), download, memo=lambda result: bool(result[0]))
+        if owner is race:
+            return ok
+        if not ok:
+            # 共享的下载失败（也可能只是被对方的其他请求抢先），自己再下载一次
+            return download()[0]
+        if os.path.normpath(source) == os.path.normpath(filepath):
+            return ok if race.claim() else False
+        if self.cover_validators is not None:
+            # 自己的文件已经是同一张图片时不必再复制
+            own = self.cover_validators.lookup(filepath)
+            shared = self.cover_validators.lookup(source)
+            if (own is not None and shared is not None and own['sha256'] == shared['sha256']
+                    and self.cover_validators.is_current(own, filepath, url)):
+                if not race.claim():
+                    return False
+                self.cover_validators.touch(filepath)
+                return DOWNLOAD_UNCHANGED
+
+        save_dir = os.path.dirname(filepath) or '.'
+        fd, temp_path = tempfile.mkstemp(prefix='.copy-', suffix='.part', dir=save_dir)
+        os.close(fd)
         try:
-            response = self.session.get(url, timeout=30, headers=alternative_headers)
-            if response.status_code == 200:
-                with open(filename, 'wb') as f:
-                    f.write(response.content)
-                print(f"备用方法成功保存: {filename}")
+            try:
+                os.remove(temp_path)
+                os.link(source, temp_path)
+            except OSError:
+                shutil.copyfile(source, temp_path)
+                os.chmod(temp_path, 0o644)
+            if not race.claim():
+                return False
+            os.replace(temp_path, filepath)
+        except OSError as e:
+            debug(f"复制已下载的封面失败（{e}），重新下载")
+            return download()[0]
+        finally:
+            if os.path.lexists(temp_path):
+                os.remove(temp_path)
+        if self.cover_validators is not None:
+            entry = self.cover_validators.lookup(source)
+            if entry is not None:
+                self.cover_validators.store(filepath, entry['url'],
+                                            {'ETag': entry['etag'], 'Last-Modified': entry['last_modified']},
+                                            entry['length'], entry['sha256'])
+        debug(f"同一张封面已经下载过，直接使用: {source}")
+        return True
+    
+    def _save_image_response(self, response, filename, race=None):
+        """
+        以流的方式把图片响应写入同目录下的临时文件，写完并同步到磁盘后再原子替换到目标路径
+        第一块数据不是图片（例如反爬虫返回的HTML页面）或超过大小上限时放弃下载
+        作为对冲请求时，其他请求获胜后立即放弃，只有 claim 成功的请求替换目标文件
+        返回 True；内容不是图片时返回 DOWNLOAD_MISSING，其他失败返回 False
+        """
+        try:
+            content_type = response.headers.get('Content-Type', '')
+            if content_type and not content_type.startswith(('image/', 'application/octet-stream')):
+                info(f"响应不是图片（Content-Type: {content_type}），放弃下载")
+                return DOWNLOAD_MISSING
+            
+            content_length = response.headers.get('Content-Length', '')
+            if content_length.isdigit() and int(content_length) > self.max_image_bytes:
+                info(f"图片过大（{content_length} 字节），放弃下载")
+                return False
+            
+            save_dir = os.path.dirname(filename) or '.'
+            fd, temp_path = tempfile.mkstemp(prefix='.download-', suffix='.part', dir=save_dir)
+            try:
+                # mkstemp 创建的文件只有属主可读，改成普通文件的权限
+                os.chmod(temp_path, 0o644)
+                head = b''
+                size = 0
+                with os.fdopen(fd, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=64 * 1024):
+                        if race is not None and race.cancelled():
+                            debug(f"其他请求已完成下载，放弃: {response.url}")
+                            return False
+                        if not chunk:
+                            continue
+                        # 凑够文件头后检查一次格式
+                        if len(head) < 12:
+                            head += chunk[:12 - len(head)]
+                            if len(head) >= 12 and not looks_like_image(head):
+                                info("下载内容不是图片，放弃下载")
+                                return DOWNLOAD_MISSING
+                        size += len(chunk)
+                        if size > self.max_image_bytes:
+                            info(f"图片超过大小上限（{self.max_image_bytes} 字节），放弃下载")
+                            return False
+                        f.write(chunk)
+                    f.flush()
+                    os.fsync(f.fileno())
+                
+                if size == 0 or not looks_like_image(head):
+                    info("下载内容为空或不是图片，放弃下载")
+                    return DOWNLOAD_MISSING
+                if race is not None and not race.claim():
+                    return False
+                
+                os.replace(temp_path, filename)
+                temp_path = None
+                self._fsync_dir(save_dir)
+                self.metrics.add_bytes(urlsplit(response.url or '').netloc, size)
                 return True
-        except:
+            finally:
+                if temp_path and os.path.exists(temp_path):
+                    os.remove(temp_path)
+        except (requests.RequestException, OSError) as e:
+            info(f"保存封面失败: {e}")
+            return False
+        finally:
+            response.close()
+
+    def _remember_validators(self, response, url, filename):
+        """
+        记录刚保存的封面的 ETag、Last-Modified、大小和哈希，供 --refresh 发送条件请求
+        """
+        if self.cover_validators is None:
+            return
+        try:
+            self.cover_validators.store(filename, url, response.headers,
+                                        os.path.getsize(filename), file_sha256(filename))
+        except (OSError, sqlite3.Error) as e:
+            info(f"⚠️ 记录封面验证信息失败: {e}")
+
+    def _fsync_dir(self, directory):
+        """
+        同步目录项，确保重命名在断电后仍然有效（部分平台不支持，忽略错误）
+        """
+        try:
+            fd = os.open(directory, os.O_RDONLY)
+        except OSError:
+            return
+        try:
+            os.fsync(fd)
+        except OSError:
             pass
-        
-        # 策略2：尝试使用requests的原始方法
-        print("策略2: 使用原始requests方法...")
+        finally:
+            os.close(fd)
+
+    def _download_with_alternative_method(self, url, filename, race=None):
+        """
+        备用下载方法：换一组请求头再试一次，同样经过传输层（共用连接和 Cookie）
+        不再原地等待：失败时由调用方抛出 Throttled，延迟重试
+        """
         try:
-            response = requests.get(url, timeout=30, headers=alternative_headers)
+            response = self._request('GET', url, timeout=30, headers=ALTERNATIVE_IMAGE_HEADERS, stream=True)
             if response.status_code == 200:
-                with open(filename, 'wb') as f:
-                    f.write(response.content)
-                print(f"原始方法成功保存: {filename}")
-                return True
-        except:
+                if self._save_image_response(response, filename, race):
+                    debug(f"备用方法成功保存: {filename}")
+                    self._remember_validators(response, url, filename)
+                    return True
+            else:
+                response.close()
+        except Throttled:
+            # 换了请求头仍被限流
             pass
+        except requests.RequestException as e:
+            debug(f"备用方法下载失败: {e}")
         
-        print("所有备用方法都失败了")
+        info("备用下载方法失败")
         return False
 
+    def cover_path(self, book_title, category=""):
+        """
+        返回封面的保存目录和文件路径
+        """
+        return cover_path(book_title, category)
+    
     def save_covers(self, covers, book_title="活着", category=""):
         """
         保存中等尺寸的封面到分类文件夹
+        返回保存目录，所有尺寸的封面都下载失败时返回 None
         """
         if not covers:
             return
         
-        # 创建保存目录，只到分类层
-        if category:
-            save_dir = f"covers/{category}"
-        else:
-            save_dir = "covers"
+        # 创建保存目录
+        save_dir, filepath = self.cover_path(book_title, category)
+        filename = os.path.basename(filepath)
         os.makedirs(save_dir, exist_ok=True)
         
-        print(f"\n正在下载封面到目录: {save_dir}")
+        debug(f"\n正在下载封面到目录: {save_dir}")
         
-        # 按优先级下载封面：高清图 → 中等尺寸 → 缩略图
-        cover_urls = [
-            ('large_cover', '高清图'),
-            ('medium_cover', '中等尺寸'),
-            ('small_cover', '缩略图')
-        ]
+        # 按优先级下载封面：已验证可访问的尺寸优先，跳过已知不可访问的尺寸
+        verified = covers.setdefault('verified', {})
+        candidates = [size for size in COVER_SIZES if verified.get(size[0]) is True]
+        candidates += [size for size in COVER_SIZES if verified.get(size[0]) is None]
+        for cover_type, description in COVER_SIZES:
+            if verified.get(cover_type) is False:
+                debug(f"✗ {description}封面已验证不可访问，跳过")
+        
+        descriptions = dict(COVER_SIZES)
+        failed_sizes = set()
+        
+        def fetch(cover_type, url, primary, race):
+            """
+            下载一个尺寸的封面（对冲请求之一），成功时返回真值
+            """
+            description = descriptions[cover_type]
+            if cover_type in failed_sizes:
+                # 其他主机已确认没有这个尺寸的图片，镜像上也不会有
+                return False
+            if primary and self.cover_store is not None and not self.refresh:
+                blob = self.cover_store.lookup(url)
+                if blob:
+                    if not race.claim():
+                        return False
+                    # 同一张图片已经下载过（其他分类或其他书名），直接链接，不再下载
+                    mode = self.cover_store.link(blob, filepath)
+                    debug(f"✓ {description}封面已在本地存储中（{mode}）: {filename}")
+                    return True
+            try:
+                ok = self._download_shared(url, filepath, race)
+            except Throttled:
+                # 被限流时不再请求其他主机和尺寸，交给批处理引擎延迟重试
+                race.cancel()
+                raise
+            if ok == DOWNLOAD_UNCHANGED:
+                debug(f"✓ {description}封面没有变化: {filename}")
+            elif ok:
+                debug(f"✓ {description}封面下载成功: {filename}")
+            elif not race.cancelled():
+                if ok is DOWNLOAD_MISSING:
+                    # 只有确认不存在时才跳过这个尺寸的镜像；超时、连接错误和 5xx 仍然请求镜像主机
+                    failed_sizes.add(cover_type)
+                debug(f"✗ {description}封面下载失败，尝试下一个...")
+            return ok
         
-        downloaded = False
-        for cover_type, description in cover_urls:
+        # 每个尺寸先请求原地址，再请求镜像主机；按优先级依次发出，请求慢或失败时发出下一个
+        attempts = []
+        for cover_type, description in candidates:
             url = covers.get(cover_type)
-            if url:
-                # 使用书籍名称作为文件名
-                safe_title = "".join(c for c in book_title if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                filename = f"{safe_title}.jpg"
-                filepath = os.path.join(save_dir, filename)
-                
-                if self.download_cover(url, filepath):
-                    print(f"✓ {description}封面下载成功: {filename}")
-                    downloaded = True
-                    break
-                else:
-                    print(f"✗ {description}封面下载失败，尝试下一个...")
+            if not url:
+                debug(f"✗ 未找到{description}封面URL，尝试下一个...")
+                continue
+            for position, attempt_url in enumerate(mirror_urls(url)[:1 + self.hedge_mirrors]):
+                attempts.append(((cover_type, attempt_url), functools.partial(fetch, cover_type, attempt_url, position == 0)))
+        
+        if self._hedge_executor is None:
+            self._hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix='douban-hedge')
+        fetcher = HedgedFetcher(self._hedge_executor, self.hedge_delay, self.hedge_fanout)
+        with self.metrics.timer('download'):
+            winner, ok = fetcher.run(attempts, on_hedge=lambda key: debug(f"下载较慢，同时请求: {key[1]}"))
+        
+        if self.verify_strategy != VERIFY_NONE:
+            # 下载结果即验证结果
+            for cover_type in failed_sizes:
+                verified[cover_type] = False
+        downloaded = winner is not None
+        if downloaded:
+            verified[winner[0]] = True
+            if ok == DOWNLOAD_UNCHANGED:
+                covers['unchanged'] = True
             else:
-                print(f"✗ 未找到{description}封面URL，尝试下一个...")
+                covers.pop('unchanged', None)
         
         if not downloaded:
-            print(f"✗ 所有尺寸的封面都无法下载")
+            debug(f"✗ 所有尺寸的封面都无法下载")
+        
+        # 书籍信息写入目录（批量提交）；需要时按旧格式在分类文件夹中另存一份 _info.json
+        if self.book_catalog is not None:
+            self.book_catalog.record(book_title, category, covers, filepath, downloaded)
+        if self.legacy_info:
+            info_file = os.path.join(save_dir, f"{book_title}_info.json")
+            if write_info_file(info_file, legacy_info(covers)):
+                debug(f"✓ 书籍信息已保存: {info_file}")
+        
+        return save_dir if downloaded else None
+
+    async def iter_batch(self, books, concurrency=4, journal=None):
+        """
+        异步批处理引擎：多本书同时处理，按完成顺序逐个产出结果
+        搜索、详情页获取和封面下载在线程池中执行，实际网络并发受 host_limits 限制
+        books 可以是任意可迭代对象（例如流式读取文件的生成器），经有界队列交给工作协程，
+        队列满时暂停读取，内存占用与书籍总数无关；也可以是异步可迭代对象
+        （例如需要等待才能取得下一本书的任务队列，等待时不阻塞事件循环）
+        传入 journal（ProgressJournal）时，每本书的处理结果都会写入进度日志
+        """
+        loop = asyncio.get_running_loop()
+        worker_count = max(1, concurrency)
+        executor = ThreadPoolExecutor(max_workers=worker_count, thread_name_prefix='douban-batch')
+        book_queue = asyncio.Queue(maxsize=worker_count * 2)
+        result_queue = asyncio.Queue(maxsize=worker_count * 2)
+        # 已读入但还没有最终结果的书数（包括在延迟重试队列中等待的）
+        pending = 0
+        all_done = asyncio.Event()
+        retry_tasks = set()
+        
+        async def iterate():
+            if hasattr(books, '__aiter__'):
+                async for book_info in books:
+                    yield book_info
+            else:
+                for book_info in books:
+                    yield book_info
+        
+        async def producer():
+            nonlocal pending
+            try:
+                index = 0
+                async for book_info in iterate():
+                    index += 1
+                    pending += 1
+                    all_done.clear()
+                    await book_queue.put((index, book_info, 0, None))
+                # 等延迟重试的书也处理完，工作协程才能退出
+                if pending:
+                    await all_done.wait()
+            finally:
+                # 每个工作协程收到一个 None 后退出
+                for _ in range(worker_count):
+                    await book_queue.put(None)
+        
+        async def retry_later(item, delay):
+            await asyncio.sleep(delay)
+            await book_queue.put(item)
+        
+        async def worker():
+            nonlocal pending
+            while True:
+                item = await book_queue.get()
+                if item is None:
+                    await result_queue.put(None)
+                    return
+                index, book_info, attempt, covers = item
+                result = await self._process_book_async(loop, executor, book_info, journal, covers=covers,
+                                                        can_retry=self.retry_scheduler.can_retry(attempt))
+                throttled = result.pop('throttled', None)
+                if throttled is not None:
+                    # 被限流：放入延迟重试队列，已解析的封面信息带到下一次，工作协程继续处理其他书
+                    delay = self.retry_scheduler.delay(attempt + 1, throttled.retry_after)
+                    self.metrics.observe('retry_delay', delay)
+                    info(f"⏳ {book_info['title']}: {throttled}，{delay:.0f} 秒后重试（第 {attempt + 1} 次）")
+                    task = asyncio.create_task(retry_later((index, book_info, attempt + 1, result['covers']), delay))
+                    retry_tasks.add(task)
+                    task.add_done_callback(retry_tasks.discard)
+                    continue
+                result['index'] = index
+                pending -= 1
+                if not pending:
+                    all_done.set()
+                await result_queue.put(result)
+        
+        producer_task = asyncio.create_task(producer())
+        workers = [asyncio.create_task(worker()) for _ in range(worker_count)]
+        try:
+            finished = 0
+            while finished < worker_count:
+                result = await result_queue.get()
+                if result is None:
+                    finished += 1
+                    continue
+                yield result
+            # 读取书籍列表时出现的错误在这里抛出
+            await producer_task
+        finally:
+            for task in [producer_task] + workers + list(retry_tasks):
+                task.cancel()
+            executor.shutdown(wait=False, cancel_futures=True)
+    
+    async def _process_book_async(self, loop, executor, book_info, journal=None, covers=None, can_retry=False):
+        """
+        处理单本书：先解析书籍信息，再下载封面，两个阶段分别提交到线程池
+        result['status'] 取值与进度日志一致：downloaded / not_found / too_old / failed
+        传入 covers（上次已解析的封面信息）时跳过解析，直接下载
+        被限流且 can_retry 为 True 时不记录结果，result['throttled'] 为捕获的 Throttled，由调用方延迟重试
+        """
+        book_title = book_info['title']
+        category = book_info['category']
+        result = {
+            'title': book_title,
+            'category': category,
+            'status': STATUS_FAILED,
+            'covers': None,
+            'save_dir': None,
+            'reason': '',
+        }
+        
+        start = time.perf_counter()
+        try:
+            while True:
+                if covers is None:
+                    covers, status, reason = await loop.run_in_executor(
+                        executor, self.resolve_book, book_title, category
+                    )
+                    if not covers:
+                        result['status'] = status
+                        result['reason'] = reason
+                        break
+                    if journal:
+                        journal.record(book_title, category, STATUS_RESOLVED, cover=covers.get('large_cover', ''))
+                
+                result['covers'] = covers
+                
+                result['save_dir'] = await loop.run_in_executor(
+                    executor, self.save_covers, covers, book_title, category
+                )
+                if result['save_dir']:
+                    result['status'] = STATUS_DOWNLOADED
+                    result['unchanged'] = bool(covers.get('unchanged'))
+                    # 封面没有变化时，之前生成的其他尺寸仍然有效
+                    if self.cover_resizer is not None and not result['unchanged']:
+                        await self._derive_sizes_async(loop, book_title, category)
+                    break
+                result['reason'] = '所有尺寸的封面都无法下载'
+                if not covers.get('from_index'):
+                    break
+                # 索引中的封面地址已失效，删除这条记录后重新搜索
+                info(f"✗ 解析索引中的封面地址已失效，重新搜索: {book_title}")
+                self.resolution_index.invalidate(book_title, category)
+                covers = None
+        except Throttled as e:
+            result['reason'] = f"被限流: {e}"
+            if can_retry:
+                result['throttled'] = e
+                return result
+        except Exception as e:
+            result['reason'] = f"处理出错: {e}"
+        
+        self.metrics.record_book(book_title, result['status'], time.perf_counter() - start)
+        if journal:
+            if result['status'] == STATUS_DOWNLOADED and self.book_catalog is not None:
+                # 进度日志记为完成之前先提交书籍信息（连同缓冲区中其他书的），
+                # 进程被强制结束后续传时不会跳过目录中还没有的书
+                self.book_catalog.flush()
+            journal.record(book_title, category, result['status'], result['reason'])
+        return result
+    
+    async def _derive_sizes_async(self, loop, book_title, category):
+        """
+        用下载好的封面在进程池中生成其他尺寸，失败时只打印警告，不影响下载结果
+        """
+        filepath = self.cover_path(book_title, category)[1]
+        try:
+            with self.metrics.timer('resize'):
+                derived = await self.cover_resizer.derive_async(loop, filepath)
+            for path in derived:
+                debug(f"✓ 已生成: {path}")
+        except Exception as e:
+            info(f"⚠️ 生成其他尺寸失败: {book_title} - {e}")
+    
+    def run_batch(self, books, concurrency=4, on_result=None, journal=None, failures=None):
+        """
+        批量处理书籍（同步入口）
+        每完成一本书调用一次 on_result(result)，最后返回成功/失败统计
+        传入 failures（ProgressJournal）时，每本失败的书都立即写入该文件
+        按 Ctrl-C 中断时返回已完成部分的统计，summary['interrupted'] 为 True
+        """
+        summary = {
+            'total': 0,
+            'success': 0,
+            'unchanged': 0,  # 刷新模式下条件请求确认没有变化的封面
+            'failed': 0,
+            'failed_books': [],  # 前 MAX_FAILED_SHOWN 本失败的书籍名称和原因
+            'interrupted': False,
+        }
         
-        # 保存书籍信息到分类文件夹
-        info_file = os.path.join(save_dir, f"{book_title}_info.json")
-        with open(info_file, 'w', encoding='utf-8') as f:
-            json.dump(covers, f, ensure_ascii=False, indent=2)
-        print(f"✓ 书籍信息已保存: {info_file}")
+        async def consume():
+            async for result in self.iter_batch(books, concurrency, journal):
+                summary['total'] += 1
+                if result['status'] == STATUS_DOWNLOADED:
+                    summary['success'] += 1
+                    if result.get('unchanged'):
+                        summary['unchanged'] += 1
+                else:
+                    summary['failed'] += 1
+                    if len(summary['failed_books']) < MAX_FAILED_SHOWN:
+                        summary['failed_books'].append(f"{result['title']} - {result['reason']}")
+                    if failures:
+                        failures.record(result['title'], result['category'], result['status'], result['reason'])
+                if on_result:
+                    on_result(result)
         
-        return save_dir
+        try:
+            asyncio.run(consume())
+        except KeyboardInterrupt:
+            summary['interrupted'] = True
+        return summary
+
+def cover_path(book_title, category=""):
+    """
+    返回封面的保存目录和文件路径
+    """
+    # 保存目录只到分类层
+    if category:
+        save_dir = f"covers/{category}"
+    else:
+        save_dir = "covers"
+    # 使用书籍名称作为文件名
+    safe_title = "".join(c for c in book_title if c.isalnum() or c in (' ', '-', '_')).rstrip()
+    return save_dir, os.path.join(save_dir, f"{safe_title}.jpg")
 
 def load_books_from_json(json_file="bookNames.json"):
     """
-    从JSON文件加载书籍列表
+    从JSON文件加载书籍列表（一次性读入；大文件请用 book_sources.iter_books 流式读取）
     """
     try:
-        with open(json_file, 'r', encoding='utf-8') as f:
-            data = json.load(f)
-        
-        books = []
-        for category, book_list in data.items():
-            for book in book_list:
-                books.append({
-                    'title': book,
-                    'category': category
-                })
-        
-        return books
+        return list(iter_books(json_file))
     except FileNotFoundError:
         print(f"错误：找不到文件 {json_file}")
         return []
@@ -882,87 +1614,320 @@ def load_books_from_json(json_file="bookNames.json"):
         print(f"错误：读取JSON文件失败 - {e}")
         return []
 
-def main():
+def parse_args(argv=None):
+    """
+    解析命令行参数
+    """
+    parser = argparse.ArgumentParser(description="豆瓣读书封面获取器")
+    parser.add_argument('--books', default='bookNames.json',
+                        help="书籍列表文件，支持 .json（{分类: [书名]}）、.jsonl 和 .csv，流式读取（默认: bookNames.json）")
+    parser.add_argument('--shard', type=parse_shard, default=None, metavar='i/N',
+                        help="只处理书单的第 i 份（共 N 份，按书名哈希划分），用于多台机器分担，之后用 shard_merge.py 合并")
+    parser.add_argument('--failures', default='covers/failed_books.jsonl',
+                        help="本次运行失败的书籍，逐条写入，可直接作为 --books 输入（默认: covers/failed_books.jsonl）")
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help="同时处理的书籍数量（默认: 4）")
+    parser.add_argument('--max-retries', type=int, default=5,
+                        help="被限流的书最多延迟重试的次数，重试期间其他书继续处理（默认: 5）")
+    parser.add_argument('--http2', action='store_true',
+                        help="使用 HTTP/2（需要安装 httpx[http2]），同一主机的请求复用一条连接")
+    parser.add_argument('--no-cookies', action='store_true',
+                        help="不保存 Cookie（默认保存到 <cache-dir>/cookies.txt，下次运行继续使用）")
+    parser.add_argument('--breaker-cooldown', type=float, default=60,
+                        help="同一主机连续被限流时暂停请求的秒数，再次熔断时加倍（默认: 60）")
+    parser.add_argument('--cache-dir', default='.douban_cache',
+                        help="页面缓存和书名解析索引的目录（默认: .douban_cache）")
+    parser.add_argument('--no-cache', action='store_true',
+                        help="不使用页面缓存")
+    parser.add_argument('--offline', action='store_true',
+                        help="离线回放模式：只使用缓存，从不访问网络")
+    parser.add_argument('--no-index', action='store_true',
+                        help="不使用书名解析索引，每本书都重新搜索")
+    parser.add_argument('--index-ttl-days', type=float, default=None,
+                        help="解析索引的有效期，单位天，过期后重新搜索（默认: 永不过期）")
+    parser.add_argument('--catalog', default=os.path.join('covers', CATALOG_NAME),
+                        help=f"书籍信息目录，所有书籍的信息保存在一个数据库中（默认: covers/{CATALOG_NAME}）")
+    parser.add_argument('--legacy-info', action='store_true',
+                        help="同时按旧格式为每本书保存 covers/分类/书名_info.json")
+    parser.add_argument('--no-store', action='store_true',
+                        help="不使用封面存储（covers/.store），每个分类目录各自保存一份封面")
+    parser.add_argument('--derive-sizes', nargs='?', const=DEFAULT_TARGETS, default=None, metavar='SPEC',
+                        help=f"只下载最大尺寸，其他尺寸在本地缩放生成，格式: 名称=宽x高,...（不带参数时: {DEFAULT_TARGETS}）")
+    parser.add_argument('--jpeg-quality', type=int, default=DEFAULT_QUALITY,
+                        help=f"本地生成尺寸的 JPEG 质量（默认: {DEFAULT_QUALITY}）")
+    parser.add_argument('--max-image-mb', type=float, default=10,
+                        help="单张封面的大小上限，单位MB（默认: 10）")
+    parser.add_argument('--verify', choices=VERIFY_STRATEGIES, default=VERIFY_LAZY,
+                        help="封面可访问性的验证策略：none 不验证，lazy 下载时验证，parallel 并发 HEAD 验证（默认: lazy）")
+    parser.add_argument('--parser', choices=['auto'] + available_backends(), default='auto',
+                        help="页面解析器，auto 优先使用 selectolax/lxml，失败时回退到 bs4（默认: auto）")
+    parser.add_argument('--hedge-delay', type=float, default=DEFAULT_HEDGE_DELAY,
+                        help=f"封面下载超过这个时间（秒）没有结果时，同时请求镜像主机或下一个尺寸（默认: {DEFAULT_HEDGE_DELAY:g}）")
+    parser.add_argument('--hedge-fanout', type=int, default=DEFAULT_MAX_FANOUT,
+                        help=f"同一张封面同时进行的请求数上限，1 表示不对冲（默认: {DEFAULT_MAX_FANOUT}）")
+    parser.add_argument('--candidate-fanout', type=int, default=2,
+                        help="每本书同时获取详情页的候选版本数（默认: 2）")
+    parser.add_argument('--title-threshold', type=float, default=DEFAULT_THRESHOLD,
+                        help=f"书名相似度阈值，0~1，越大越严格（默认: {DEFAULT_THRESHOLD}）")
+    parser.add_argument('--log-level', choices=LOG_LEVELS, default='info',
+                        help="输出级别：quiet 只输出最终统计，info 输出每本书的结果，debug 输出完整的查找过程（默认: info）")
+    parser.add_argument('--metrics-json', default=None, metavar='PATH',
+                        help="运行结束后把各阶段耗时、请求数等指标写入 JSON 文件")
+    parser.add_argument('--metrics-prom', default=None, metavar='PATH',
+                        help="运行结束后把指标写入 Prometheus textfile（.prom）")
+    parser.add_argument('--journal', default='covers/progress_journal.jsonl',
+                        help="进度日志文件（默认: covers/progress_journal.jsonl）")
+    parser.add_argument('--retry-failed', action='store_true',
+                        help="只重新处理进度日志中记录为失败的书籍")
+    parser.add_argument('--refresh', action='store_true',
+                        help="刷新已下载的封面：用条件请求检查，只重新下载有变化的封面")
+    return parser.parse_args(argv)
+
+def main(argv=None):
     """
     主函数
     """
+    args = parse_args(argv)
+    set_log_level(args.log_level)
+    
     print("豆瓣读书封面获取器")
     print("=" * 50)
     
-    # 从JSON文件加载书籍列表
-    books = load_books_from_json()
-    
-    if not books:
+    # 书籍列表边读边处理，不一次性读入内存
+    if not os.path.exists(args.books):
+        print(f"错误：找不到文件 {args.books}")
         print("没有找到书籍列表，程序退出")
         return
     
-    print(f"从JSON文件中加载了 {len(books)} 本书籍")
-    print("=" * 50)
+    print(f"读取书籍列表: {args.books}")
+    
+    if args.offline and args.no_cache:
+        print("离线模式需要使用缓存，请去掉 --no-cache")
+        return
+    targets = None
+    if args.derive_sizes is not None:
+        try:
+            targets = parse_targets(args.derive_sizes)
+        except ValueError as e:
+            print(e)
+            return
     
     # 创建获取器实例
-    cover_getter = DoubanBookCover()
+    http_cache = None
+    if not args.no_cache:
+        http_cache = HttpCache(os.path.join(args.cache_dir, 'http_cache.sqlite'), offline=args.offline)
+    resolution_index = None
+    if not args.no_index:
+        ttl = args.index_ttl_days * 24 * 3600 if args.index_ttl_days is not None else None
+        resolution_index = ResolutionIndex(os.path.join(args.cache_dir, 'resolution_index.sqlite'), ttl=ttl)
+    cover_store = None if args.no_store else CoverStore(os.path.join('covers', '.store'))
+    if args.http2 and not http2_available():
+        print("未安装 httpx[http2]，使用 HTTP/1.1")
+    transport = Transport(DEFAULT_HOST_LIMITS, http2=args.http2,
+                          cookie_path=None if args.no_cookies else os.path.join(args.cache_dir, 'cookies.txt'))
+    cover_getter = DoubanBookCover(http_cache=http_cache, resolution_index=resolution_index,
+                                   cover_store=cover_store, transport=transport)
+    cover_validators = CoverValidators(os.path.join(args.cache_dir, 'cover_validators.sqlite'))
+    book_catalog = BookCatalog(args.catalog)
+    try:
+        summary, skipped, started_at = _run_books(args, cover_getter, cover_validators, book_catalog, targets)
+    finally:
+        # 提前返回或出错时也关闭所有数据库并保存 Cookie
+        if cover_getter.cover_resizer is not None:
+            cover_getter.cover_resizer.shutdown()
+        transport.close()
+        cover_validators.close()
+        book_catalog.close()
+        if cover_store is not None:
+            cover_store.close()
+        if resolution_index is not None:
+            resolution_index.close()
+        if http_cache is not None:
+            http_cache.close()
+    if summary is None:
+        return
+    
+    _print_summary(args, cover_getter, summary, skipped, started_at, http_cache is not None)
+
+
+def _run_books(args, cover_getter, cover_validators, book_catalog, targets):
+    """
+    按命令行参数配置获取器并处理书单，返回 (统计, 跳过的书籍数, 开始时间)；读取书单失败时统计为 None
+    """
+    cover_getter.max_image_bytes = int(args.max_image_mb * 1024 * 1024)
+    cover_getter.verify_strategy = args.verify
+    cover_getter.parser_backend = args.parser
+    cover_getter.candidate_fanout = args.candidate_fanout
+    cover_getter.hedge_delay = args.hedge_delay
+    cover_getter.hedge_fanout = args.hedge_fanout
+    cover_getter.title_matcher.threshold = args.title_threshold
+    cover_getter.retry_scheduler.max_retries = args.max_retries
+    cover_getter.circuit_breakers.breaker_options['cooldown'] = args.breaker_cooldown
+    cover_getter.cover_validators = cover_validators
+    cover_getter.refresh = args.refresh
+    cover_getter.book_catalog = book_catalog
+    cover_getter.legacy_info = args.legacy_info
+    if targets is not None:
+        cover_getter.cover_resizer = CoverResizer(targets, quality=args.jpeg_quality)
     
-    # 初始化计数器
-    success_count = 0
-    failed_count = 0
-    failed_books = []  # 存储失败的书籍名称和原因
+    # 根据进度日志筛选需要处理的书籍（边读边筛选）
+    journal = ProgressJournal(args.journal)
+    states = journal.statuses()
+    skipped = {'finished': 0, 'failed': 0, 'other_shards': 0, 'not_downloaded': 0}
     
-    # 逐一处理每本书
-    for i, book_info in enumerate(books, 1):
-        book_title = book_info['title']
-        category = book_info['category']
+    def pending_books():
+        for book_info in iter_books(args.books):
+            if args.shard and shard_of(book_info['title'], args.shard[1]) != args.shard[0]:
+                skipped['other_shards'] += 1
+                continue
+            status = states.get(journal_key(book_info['title'], book_info['category']))
+            cover_exists = os.path.exists(cover_getter.cover_path(book_info['title'], book_info['category'])[1])
+            if args.refresh:
+                # 只检查已经下载过的封面
+                if status == STATUS_DOWNLOADED or cover_exists:
+                    yield book_info
+                else:
+                    skipped['not_downloaded'] += 1
+            elif args.retry_failed:
+                if status == STATUS_FAILED:
+                    yield book_info
+            elif status in FINISHED_STATUSES:
+                skipped['finished'] += 1
+            elif status == STATUS_FAILED:
+                skipped['failed'] += 1
+            elif cover_exists:
+                # 没有日志记录但封面已存在（旧版本下载的）
+                skipped['finished'] += 1
+            else:
+                yield book_info
+    
+    # 失败的书籍逐条写入临时文件，运行结束后替换上次的失败列表（上次的列表可能正作为输入读取）
+    failures_part = args.failures + '.part'
+    if os.path.exists(failures_part):
+        os.remove(failures_part)
+    failures = ProgressJournal(failures_part, fsync=False)
+    
+    if args.refresh:
+        print("刷新模式：检查已下载的封面，只重新下载有变化的")
+    elif args.retry_failed:
+        print("只重新处理进度日志中失败的书籍")
+    if args.shard:
+        print(f"分片 {args.shard[0]}/{args.shard[1]}：只处理属于本分片的书籍")
+    started_at = time.time()
+    print(f"并发处理数: {args.concurrency}")
+    print("=" * 50)
+    
+    def report(result):
+        """
+        每完成一本书打印一次处理结果
+        """
+        book_title = result['title']
+        info(f"\n[{result['index']}] {book_title} (分类: {result['category']})")
+        info("-" * 60)
         
-        print(f"\n[{i}/{len(books)}] 正在处理: {book_title} (分类: {category})")
-        print("-" * 60)
+        if result['status'] != STATUS_DOWNLOADED:
+            info(f"✗ 处理失败: {book_title} - {result['reason']}")
+            return
         
-        try:
-            # 获取封面信息
-            covers = cover_getter.get_book_covers(book_title)
-            
-            if covers:
-                # 保存封面
-                save_dir = cover_getter.save_covers(covers, book_title, category)
-                print(f"✓ 成功处理: {book_title}")
-                print(f"  保存位置: {save_dir}")
-                success_count += 1
-                
-                # 显示封面URL
-                print(f"  封面URL:")
-                if covers.get('small_cover'):
-                    print(f"    缩略图: {covers['small_cover']}")
-                if covers.get('medium_cover'):
-                    print(f"    中等尺寸: {covers['medium_cover']}")
-                if covers.get('large_cover'):
-                    print(f"    高清图: {covers['large_cover']}")
-            else:
-                print(f"✗ 未能获取到书籍封面信息: {book_title}")
-                failed_count += 1
-                failed_books.append(f"{book_title} - 未能获取到封面信息")
-                
-        except Exception as e:
-            print(f"✗ 处理书籍时出错: {book_title} - {e}")
-            failed_count += 1
-            failed_books.append(f"{book_title} - 处理出错: {e}")
+        covers = result['covers']
+        if result.get('unchanged'):
+            info(f"✓ 封面没有变化: {book_title}")
+            return
+        info(f"✓ 成功处理: {book_title}")
+        info(f"  保存位置: {result['save_dir']}")
         
-        # 添加延迟，避免请求过于频繁
-        if i < len(books):
-            print("等待2秒后处理下一本书...")
-            time.sleep(2)
+        # 显示封面URL
+        debug(f"  封面URL:")
+        if covers.get('small_cover'):
+            debug(f"    缩略图: {covers['small_cover']}")
+        if covers.get('medium_cover'):
+            debug(f"    中等尺寸: {covers['medium_cover']}")
+        if covers.get('large_cover'):
+            debug(f"    高清图: {covers['large_cover']}")
     
+    # 并发处理所有书籍，结果按完成顺序返回
+    try:
+        summary = cover_getter.run_batch(pending_books(), concurrency=args.concurrency, on_result=report,
+                                         journal=journal, failures=failures)
+    except (OSError, ValueError) as e:
+        print(f"错误：读取书籍列表失败 - {e}")
+        return None, skipped, started_at
+    finally:
+        journal.close()
+        failures.close()
+        if os.path.exists(failures_part):
+            os.replace(failures_part, args.failures)
+        elif os.path.exists(args.failures):
+            os.remove(args.failures)
+    return summary, skipped, started_at
+
+
+def _print_summary(args, cover_getter, summary, skipped, started_at, use_cache):
+    """
+    显示最终统计、各阶段耗时，并按参数保存运行指标和分片信息
+    """
     # 显示最终统计
     print("\n" + "=" * 60)
-    print("处理完成！")
-    print(f"成功处理: {success_count} 本书")
-    print(f"处理失败: {failed_count} 本书")
-    print(f"总计处理: {len(books)} 本书")
+    if summary['interrupted']:
+        print("处理已中断！进度已记录，再次运行将从中断处继续")
+    else:
+        print("处理完成！")
+    print(f"成功处理: {summary['success']} 本书")
+    print(f"处理失败: {summary['failed']} 本书")
+    print(f"总计处理: {summary['total']} 本书")
+    if args.refresh:
+        print(f"封面未变化: {summary['unchanged']} 本，已更新: {summary['success'] - summary['unchanged']} 本")
+    if skipped['not_downloaded']:
+        print(f"还没有下载封面的书籍: {skipped['not_downloaded']} 本（刷新模式只检查已下载的封面）")
+    if skipped['finished']:
+        print(f"跳过已完成的书籍: {skipped['finished']} 本")
+    if skipped['failed']:
+        print(f"跳过之前失败的书籍: {skipped['failed']} 本（使用 --retry-failed 重新处理）")
+    if skipped['other_shards']:
+        print(f"属于其他分片的书籍: {skipped['other_shards']} 本")
+    if not summary['total'] and not summary['interrupted']:
+        print("没有需要处理的书籍")
     
     # 显示失败的书籍名称
-    if failed_books:
+    if summary['failed_books']:
         print("\n失败的书籍列表:")
         print("-" * 40)
-        for failed_book in failed_books:
+        for failed_book in summary['failed_books']:
             print(f"• {failed_book}")
+        if summary['failed'] > len(summary['failed_books']):
+            print(f"... 共 {summary['failed']} 本")
         print("-" * 40)
+        print(f"完整的失败列表: {args.failures}（可用 --books {args.failures} 重新处理）")
+    
+    # 显示各阶段耗时和请求统计
+    metrics = cover_getter.metrics.snapshot()
+    print("\n各阶段耗时（次数 / 平均 / p90，秒）:")
+    for stage, stats in metrics['stages'].items():
+        print(f"  {stage:<14}{stats['count']:>6} / {stats['mean']:.3f} / {stats['p90']:.3f}")
+    for host, stats in metrics['hosts'].items():
+        statuses = ', '.join(f"{status}: {count}" for status, count in stats['status'].items())
+        print(f"  {host}: {statuses}，下载 {stats['bytes'] / 1024:.0f} KB")
+    if metrics['sleep_seconds']:
+        sleeps = ', '.join(f"{reason} {seconds:.1f} 秒" for reason, seconds in metrics['sleep_seconds'].items())
+        print(f"  等待时间: {sleeps}")
+    if use_cache:
+        print(f"  页面缓存命中率: {metrics['cache']['hit_ratio']:.0%}")
+    coalesced = cover_getter.singleflight.stats()
+    if coalesced['shared'] or coalesced['memo_hits']:
+        print(f"  合并的重复操作: {coalesced['shared'] + coalesced['memo_hits']} 次"
+              f"（等待进行中的 {coalesced['shared']} 次，复用刚完成的 {coalesced['memo_hits']} 次）")
+    for host, breaker in cover_getter.circuit_breakers.snapshot().items():
+        if breaker['trips']:
+            print(f"  {host} 熔断 {breaker['trips']} 次，当前状态: {breaker['state']}")
+    if args.metrics_json:
+        cover_getter.metrics.write_json(args.metrics_json)
+        print(f"运行指标已保存: {args.metrics_json}")
+    if args.metrics_prom:
+        cover_getter.metrics.write_prometheus(args.metrics_prom)
+        print(f"Prometheus 指标已保存: {args.metrics_prom}")
+    if args.shard:
+        manifest = write_manifest('covers', args.shard, args.books, summary, skipped, started_at)
+        print(f"分片信息已保存: {manifest}")
 
 if __name__ == "__main__":
     main()
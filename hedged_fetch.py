@@ -0,0 +1,111 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+封面下载的对冲请求
+同一张封面可以从多个 imgN.doubanio.com 镜像下载，也可以退而下载下一个尺寸。
+先发出优先级最高的请求，超过 hedge_delay 秒还没有结果（或请求失败）时再发出下一个，
+同时进行的请求不超过 max_fanout；第一个完成的请求获胜，其余请求随即放弃
+"""
+
+import threading
+from concurrent.futures import FIRST_COMPLETED, wait
+from urllib.parse import urlsplit, urlunsplit
+
+# 豆瓣封面图片的镜像主机，内容相同
+DEFAULT_MIRRORS = ('img1.doubanio.com', 'img2.doubanio.com', 'img3.doubanio.com', 'img9.doubanio.com')
+
+DEFAULT_HEDGE_DELAY = 3.0  # 请求超过这个时间（秒）没有结果时发出对冲请求
+DEFAULT_MAX_FANOUT = 2  # 同一张封面同时进行的请求数上限，1 表示不对冲
+
+
+def mirror_urls(url, mirrors=DEFAULT_MIRRORS):
+    """
+    url 本身在前，随后是其他镜像主机上的同一张图片；不是镜像主机上的地址时只返回 url
+    """
+    parts = urlsplit(url)
+    if parts.netloc not in mirrors:
+        return [url]
+    return [url] + [urlunsplit(parts._replace(netloc=host)) for host in mirrors if host != parts.netloc]
+
+
+class HedgeRace:
+    """
+    一组对冲请求共享的状态，线程安全
+    请求在写入结果前调用 claim()，只有第一个调用的请求获胜；其余请求看到 cancelled() 后放弃
+    """
+
+    def __init__(self):
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def cancelled(self):
+        return self._done.is_set()
+
+    def claim(self):
+        with self._lock:
+            if self._done.is_set():
+                return False
+            self._done.set()
+            return True
+
+    def cancel(self):
+        self._done.set()
+
+
+class HedgedFetcher:
+    """
+    按顺序发出对冲请求，返回第一个成功的结果
+    """
+
+    def __init__(self, executor, hedge_delay=DEFAULT_HEDGE_DELAY, max_fanout=DEFAULT_MAX_FANOUT):
+        self.executor = executor
+        self.hedge_delay = hedge_delay
+        self.max_fanout = max_fanout
+
+    def run(self, attempts, on_hedge=None):
+        """
+        attempts 为按优先级排列的 [(名称, 函数)]，函数接收 HedgeRace，成功时返回真值
+        返回 (获胜的名称, 结果)；全部失败时返回 (None, None)，有请求抛出异常时重新抛出第一个异常
+        因超时发出对冲请求时调用 on_hedge(名称)
+        """
+        race = HedgeRace()
+        remaining = iter(attempts)
+        running = {}  # future → 名称
+        errors = []
+
+        def launch():
+            for key, func in remaining:
+                running[self.executor.submit(func, race)] = key
+                return key
+            return None
+
+        launch()
+        try:
+            while running:
+                done, _ = wait(running, timeout=self.hedge_delay, return_when=FIRST_COMPLETED)
+                if not done:
+                    # 超过 hedge_delay 没有结果，再发出一个请求
+                    if len(running) < self.max_fanout:
+                        key = launch()
+                        if key is not None and on_hedge:
+                            on_hedge(key)
+                    continue
+                for future in done:
+                    key = running.pop(future)
+                    try:
+                        value = future.result()
+                    except Exception as e:
+                        errors.append(e)
+                        value = None
+                    if value:
+                        return key, value
+                    # 失败的请求由下一个补上
+                    if len(running) < max(1, self.max_fanout):
+                        launch()
+            if errors:
+                raise errors[0]
+            return None, None
+        finally:
+            race.cancel()
+            for future in running:
+                future.cancel()
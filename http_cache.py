@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+持久化的HTTP响应缓存（SQLite）
+按URL类别设置有效期，过期后用 ETag/Last-Modified 重新验证，
+响应体压缩存储，总大小超过上限时按最近最少使用淘汰
+"""
+
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+
+import requests
+from requests.structures import CaseInsensitiveDict
+
+# 按URL类别设置的缓存有效期（秒），未匹配的URL不缓存
+DEFAULT_TTL_RULES = [
+    (r'^https?://www\.douban\.com/search\?', 3 * 24 * 3600),  # 搜索结果页
+    (r'^https?://book\.douban\.com/subject/\d+/?$', 30 * 24 * 3600),  # 书籍详情页
+]
+
+# 需要随响应体一起保存的响应头
+STORED_HEADERS = ('Content-Type', 'ETag', 'Last-Modified')
+
+
+class OfflineCacheMiss(requests.ConnectionError):
+    """
+    离线回放模式下请求的URL不在缓存中
+    """
+
+
+class HttpCache:
+    """
+    基于SQLite的响应缓存，线程安全
+    """
+
+    def __init__(self, path, max_bytes=200 * 1024 * 1024, ttl_rules=None, offline=False):
+        self.path = path
+        self.max_bytes = max_bytes  # 压缩后响应体的总大小上限
+        self.offline = offline  # 离线回放：只读缓存，从不访问网络
+        self.ttl_rules = [(re.compile(pattern), ttl)
+                          for pattern, ttl in (DEFAULT_TTL_RULES if ttl_rules is None else ttl_rules)]
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._accessed = {}  # 命中的 URL → 访问时间，下次写入时一并更新，读缓存时不写数据库
+        # 多个进程（任务队列的工作进程）共用同一个数据库，其他进程持有写锁时最多等待 30 秒
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS responses (
+                url TEXT PRIMARY KEY,
+                status INTEGER NOT NULL,
+                headers TEXT NOT NULL,
+                encoding TEXT,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses (accessed_at)')
+        self._conn.commit()
+        self._total_bytes = self._conn.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+
+    def ttl_for(self, url):
+        """
+        返回URL对应的缓存有效期，None 表示不缓存
+        """
+        for pattern, ttl in self.ttl_rules:
+            if pattern.search(url):
+                return ttl
+        return None
+
+    def lookup(self, url):
+        """
+        查找缓存条目（不论是否过期），访问时间先记在内存中
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT status, headers, encoding, body, stored_at FROM responses WHERE url = ?', (url,)
+            ).fetchone()
+            if row is None:
+                return None
+            self._accessed[url] = time.time()
+        status, headers, encoding, body, stored_at = row
+        return {
+            'url': url,
+            'status': status,
+            'headers': json.loads(headers),
+            'encoding': encoding,
+            'body': zlib.decompress(body),
+            'stored_at': stored_at,
+        }
+
+    def is_fresh(self, entry):
+        """
+        判断缓存条目是否仍在有效期内
+        """
+        ttl = self.ttl_for(entry['url'])
+        return ttl is not None and time.time() - entry['stored_at'] < ttl
+
+    def conditional_headers(self, entry):
+        """
+        构造重新验证用的条件请求头
+        """
+        headers = {}
+        if entry['headers'].get('ETag'):
+            headers['If-None-Match'] = entry['headers']['ETag']
+        if entry['headers'].get('Last-Modified'):
+            headers['If-Modified-Since'] = entry['headers']['Last-Modified']
+        return headers
+
+    def store(self, url, response):
+        """
+        保存一个 200 响应
+        """
+        headers = {name: response.headers[name] for name in STORED_HEADERS if name in response.headers}
+        body = zlib.compress(response.content, 6)
+        now = time.time()
+        with self._lock:
+            old = self._conn.execute('SELECT size FROM responses WHERE url = ?', (url,)).fetchone()
+            self._conn.execute(
+                'INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (url, response.status_code, json.dumps(headers), response.encoding, body, len(body), now, now)
+            )
+            self._total_bytes += len(body) - (old[0] if old else 0)
+            self._write_accessed()
+            self._evict()
+            self._conn.commit()
+
+    def touch(self, url):
+        """
+        重新验证通过（304），刷新缓存时间
+        """
+        with self._lock:
+            now = time.time()
+            self._conn.execute('UPDATE responses SET stored_at = ?, accessed_at = ? WHERE url = ?', (now, now, url))
+            self._conn.commit()
+
+    def _write_accessed(self):
+        """
+        把内存中记录的访问时间写入数据库（调用方持有锁并负责提交），淘汰时按最新的访问时间排序
+        """
+        if self._accessed:
+            self._conn.executemany('UPDATE responses SET accessed_at = ? WHERE url = ?',
+                                   [(accessed_at, url) for url, accessed_at in self._accessed.items()])
+            self._accessed.clear()
+
+    def _evict(self):
+        """
+        超过大小上限时淘汰最久未访问的条目（调用方持有锁）
+        """
+        while self._total_bytes > self.max_bytes:
+            rows = self._conn.execute(
+                'SELECT url, size FROM responses ORDER BY accessed_at LIMIT 64'
+            ).fetchall()
+            if not rows:
+                self._total_bytes = 0
+                break
+            for url, size in rows:
+                self._conn.execute('DELETE FROM responses WHERE url = ?', (url,))
+                self._total_bytes -= size
+                if self._total_bytes <= self.max_bytes:
+                    break
+
+    def to_response(self, entry):
+        """
+        把缓存条目还原为 requests.Response
+        """
+        response = requests.Response()
+        response.status_code = entry['status']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = entry['encoding']
+        response.url = entry['url']
+        response.reason = 'OK'
+        response._content = entry['body']
+        response.from_cache = True
+        return response
+
+    def close(self):
+        with self._lock:
+            try:
+                self._write_accessed()
+                self._conn.commit()
+            except sqlite3.Error:
+                # 其他进程长时间持有写锁时放弃更新访问时间，不影响缓存内容
+                pass
+            self._conn.close()
@@ -0,0 +1,440 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单机多进程任务队列（SQLite）
+书单先导入队列，每本书（书名 + 分类）是一个任务；多个工作进程各自用自己的 DoubanBookCover
+（例如各自使用不同的出口代理）从队列中领取任务。领取的任务带有租约，工作进程定期续约，
+进程退出后租约到期，任务自动回到队列由其他进程领取；每个任务记录尝试次数，超过上限记为失败
+
+python job_queue.py seed --books bookNames.json           # 导入书单
+python job_queue.py work --proxy http://127.0.0.1:8001    # 启动一个工作进程
+python job_queue.py run --workers 3 --proxy http://a:8080 --proxy http://b:8080 --proxy http://c:8080
+python job_queue.py status
+"""
+
+import argparse
+import asyncio
+import hashlib
+import os
+import socket
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+
+from book_sources import iter_books
+from douban_book_cover import (DoubanBookCover, DEFAULT_HOST_LIMITS, VERIFY_STRATEGIES, VERIFY_LAZY, LOG_LEVELS,
+                               STATUS_DOWNLOADED, info, set_log_level)
+from transport import Transport
+from http_cache import HttpCache
+from resolution_index import ResolutionIndex
+from cover_store import CoverStore
+from book_catalog import BookCatalog, CATALOG_NAME
+from progress_journal import ProgressJournal, journal_key, FINISHED_STATUSES
+
+# 任务状态
+JOB_PENDING = 'pending'  # 等待领取
+JOB_LEASED = 'leased'  # 已被工作进程领取，租约到期前其他进程不会领取
+JOB_DONE = 'done'  # 已完成（downloaded / not_found / too_old）
+JOB_FAILED = 'failed'  # 尝试次数用完仍然失败
+JOB_STATES = (JOB_PENDING, JOB_LEASED, JOB_DONE, JOB_FAILED)
+
+DEFAULT_LEASE_SECONDS = 300
+DEFAULT_MAX_ATTEMPTS = 3
+
+# 导入书单时每批写入的任务数
+SEED_BATCH_SIZE = 1000
+
+# 暂时没有可领取的任务、但还有任务未结束时，再次领取前等待的秒数
+CLAIM_POLL_SECONDS = 2.0
+
+
+class JobQueue:
+    """
+    任务队列，可在多个进程中同时打开；同一进程内线程安全
+    """
+
+    def __init__(self, path, lease_seconds=DEFAULT_LEASE_SECONDS, max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.path = path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # 自动提交模式，领取任务时显式开启写事务；其他进程持有写锁时最多等待 30 秒
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                key TEXT PRIMARY KEY,
+                title TEXT NOT NULL,
+                category TEXT NOT NULL,
+                author TEXT,
+                isbn TEXT,
+                state TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                worker TEXT,
+                lease_until REAL,
+                result TEXT,
+                reason TEXT,
+                updated_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute('CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_until)')
+
+    def seed(self, books, skip=None):
+        """
+        导入书籍，已在队列中的书不会重复导入；skip 为 {key: status}（例如进度日志），
+        其中已完成的书不再导入。返回新导入的任务数
+        """
+        added = 0
+        batch = []
+
+        def flush():
+            nonlocal added
+            with self._lock:
+                before = self._conn.total_changes
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    self._conn.executemany(
+                        'INSERT OR IGNORE INTO jobs (key, title, category, author, isbn, state, updated_at) '
+                        'VALUES (?, ?, ?, ?, ?, ?, ?)', batch
+                    )
+                    self._conn.execute('COMMIT')
+                except BaseException:
+                    self._conn.execute('ROLLBACK')
+                    raise
+                added += self._conn.total_changes - before
+            batch.clear()
+
+        now = time.time()
+        for book in books:
+            key = journal_key(book['title'], book['category'])
+            if skip and skip.get(key) in FINISHED_STATUSES:
+                continue
+            batch.append((key, book['title'], book['category'], book.get('author'), book.get('isbn'),
+                          JOB_PENDING, now))
+            if len(batch) >= SEED_BATCH_SIZE:
+                flush()
+        if batch:
+            flush()
+        return added
+
+    def claim(self, worker, limit=1):
+        """
+        领取最多 limit 个任务：等待中的任务，或租约已到期的任务（之前领取它的进程已退出）
+        租约到期且尝试次数已用完的任务直接记为失败
+        """
+        claimed = []
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                while len(claimed) < limit:
+                    now = time.time()
+                    rows = self._conn.execute(
+                        'SELECT key, title, category, author, isbn, attempts FROM jobs '
+                        'WHERE state = ? OR (state = ? AND lease_until < ?) ORDER BY rowid LIMIT ?',
+                        (JOB_PENDING, JOB_LEASED, now, limit - len(claimed))
+                    ).fetchall()
+                    if not rows:
+                        break
+                    for key, title, category, author, isbn, attempts in rows:
+                        if attempts >= self.max_attempts:
+                            self._conn.execute(
+                                'UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL, reason = ?, '
+                                'updated_at = ? WHERE key = ?',
+                                (JOB_FAILED, f"领取 {attempts} 次后仍未完成（工作进程可能已退出）", now, key)
+                            )
+                            continue
+                        self._conn.execute(
+                            'UPDATE jobs SET state = ?, worker = ?, lease_until = ?, attempts = attempts + 1, '
+                            'updated_at = ? WHERE key = ?',
+                            (JOB_LEASED, worker, now + self.lease_seconds, now, key)
+                        )
+                        book = {'title': title, 'category': category}
+                        if author:
+                            book['author'] = author
+                        if isbn:
+                            book['isbn'] = isbn
+                        claimed.append(book)
+                self._conn.execute('COMMIT')
+            except BaseException:
+                self._conn.execute('ROLLBACK')
+                raise
+        return claimed
+
+    def complete(self, title, category, worker, status, reason=''):
+        """
+        记录处理结果：已完成的任务结束，失败的任务在尝试次数用完前回到队列
+        租约已被其他进程接手时不做修改，返回 False
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET state = CASE WHEN ? THEN ? WHEN attempts >= ? THEN ? ELSE ? END, '
+                'worker = NULL, lease_until = NULL, result = ?, reason = ?, updated_at = ? '
+                'WHERE key = ? AND state = ? AND worker = ?',
+                (status in FINISHED_STATUSES, JOB_DONE, self.max_attempts, JOB_FAILED, JOB_PENDING,
+                 status, reason, time.time(), journal_key(title, category), JOB_LEASED, worker)
+            )
+        return cursor.rowcount == 1
+
+    def renew(self, worker):
+        """
+        延长工作进程持有的所有租约
+        """
+        with self._lock:
+            self._conn.execute(
+                'UPDATE jobs SET lease_until = ? WHERE state = ? AND worker = ?',
+                (time.time() + self.lease_seconds, JOB_LEASED, worker)
+            )
+
+    def release(self, worker):
+        """
+        工作进程退出前归还尚未处理完的任务（不计入尝试次数），返回归还的任务数
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET state = ?, worker = NULL, lease_until = NULL, attempts = MAX(attempts - 1, 0), '
+                'updated_at = ? WHERE state = ? AND worker = ?',
+                (JOB_PENDING, time.time(), JOB_LEASED, worker)
+            )
+        return cursor.rowcount
+
+    def retry_failed(self):
+        """
+        把失败的任务放回队列并清零尝试次数，返回放回的任务数
+        """
+        with self._lock:
+            cursor = self._conn.execute(
+                'UPDATE jobs SET state = ?, attempts = 0, updated_at = ? WHERE state = ?',
+                (JOB_PENDING, time.time(), JOB_FAILED)
+            )
+        return cursor.rowcount
+
+    def counts(self):
+        """
+        各状态的任务数；租约已到期的任务计入 expired
+        """
+        with self._lock:
+            rows = self._conn.execute('SELECT state, COUNT(*) FROM jobs GROUP BY state').fetchall()
+            expired = self._conn.execute(
+                'SELECT COUNT(*) FROM jobs WHERE state = ? AND lease_until < ?', (JOB_LEASED, time.time())
+            ).fetchone()[0]
+        counts = {state: 0 for state in JOB_STATES}
+        counts.update(rows)
+        counts['expired'] = expired
+        return counts
+
+    def workers(self):
+        """
+        当前持有租约的工作进程 → 任务数
+        """
+        with self._lock:
+            return dict(self._conn.execute(
+                'SELECT worker, COUNT(*) FROM jobs WHERE state = ? GROUP BY worker', (JOB_LEASED,)
+            ).fetchall())
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def work(args):
+    """
+    工作进程：用自己的 DoubanBookCover 从队列中领取任务，直到队列中没有等待中和已领取的任务
+    """
+    set_log_level(args.log_level)
+    worker_id = args.worker_id or f"{socket.gethostname()}-{os.getpid()}"
+    queue = JobQueue(args.db, lease_seconds=args.lease_seconds, max_attempts=args.max_attempts)
+
+    http_cache = None if args.no_cache else HttpCache(os.path.join(args.cache_dir, 'http_cache.sqlite'))
+    resolution_index = None if args.no_index else ResolutionIndex(
+        os.path.join(args.cache_dir, 'resolution_index.sqlite'))
+    cover_store = None if args.no_store else CoverStore(os.path.join('covers', '.store'))
+    # 每个出口代理各自保存 Cookie
+    cookie_name = f"cookies-{hashlib.md5(args.proxy.encode('utf-8')).hexdigest()[:8]}.txt" if args.proxy else 'cookies.txt'
+    transport = Transport(DEFAULT_HOST_LIMITS, http2=args.http2, proxy=args.proxy,
+                          cookie_path=os.path.join(args.cache_dir, cookie_name))
+    cover_getter = DoubanBookCover(http_cache=http_cache, resolution_index=resolution_index,
+                                   cover_store=cover_store, transport=transport)
+    cover_getter.verify_strategy = args.verify
+    # 各工作进程写入同一个书籍信息目录
+    book_catalog = BookCatalog(os.path.join('covers', CATALOG_NAME))
+    cover_getter.book_catalog = book_catalog
+    cover_getter.legacy_info = args.legacy_info
+    journal = ProgressJournal(args.journal)
+
+    # 定期续约，处理时间较长的任务不会被其他进程接手
+    stop = threading.Event()
+
+    def heartbeat():
+        while not stop.wait(max(1, args.lease_seconds / 3)):
+            queue.renew(worker_id)
+
+    async def claimed_books():
+        # 领取任务是阻塞的 SQLite 写操作，放到线程中执行，不阻塞事件循环
+        # 暂时没有可领取的任务时继续等待：失败的任务会回到队列，已退出的进程持有的任务在租约到期后也可以领取，
+        # 直到没有等待中和已领取的任务才结束
+        while not stop.is_set():
+            books = await asyncio.to_thread(queue.claim, worker_id)
+            if books:
+                yield books[0]
+                continue
+            counts = await asyncio.to_thread(queue.counts)
+            if not counts[JOB_PENDING] and not counts[JOB_LEASED]:
+                return
+            await asyncio.sleep(CLAIM_POLL_SECONDS)
+
+    def report(result):
+        if not queue.complete(result['title'], result['category'], worker_id, result['status'], result['reason']):
+            info(f"⚠️ 任务已被其他进程接手，忽略本次结果: {result['title']}")
+        if result['status'] == STATUS_DOWNLOADED:
+            info(f"✓ [{worker_id}] {result['title']}")
+        else:
+            info(f"✗ [{worker_id}] {result['title']} - {result['reason']}")
+
+    print(f"工作进程 {worker_id} 启动" + (f"，代理: {args.proxy}" if args.proxy else ""))
+    threading.Thread(target=heartbeat, daemon=True, name='job-heartbeat').start()
+    try:
+        summary = cover_getter.run_batch(claimed_books(), concurrency=args.concurrency, on_result=report,
+                                         journal=journal)
+    finally:
+        stop.set()
+        released = queue.release(worker_id)
+        transport.close()
+        book_catalog.close()
+        if cover_store is not None:
+            cover_store.close()
+        if resolution_index is not None:
+            resolution_index.close()
+        if http_cache is not None:
+            http_cache.close()
+        journal.close()
+        queue.close()
+    print(f"工作进程 {worker_id} 结束：成功 {summary['success']} 本，失败 {summary['failed']} 本"
+          + (f"，归还 {released} 个未完成的任务" if released else ""))
+
+
+def run(args):
+    """
+    导入书单后启动多个工作进程并等待全部结束，代理按顺序轮流分配给各进程
+    """
+    if args.books:
+        seed(args)
+    # --db 和 --journal 是全局参数，要放在子命令之前
+    command = [sys.executable, os.path.abspath(__file__), '--db', args.db, '--journal', args.journal,
+               'work', '--cache-dir', args.cache_dir,
+               '--concurrency', str(args.concurrency), '--lease-seconds', str(args.lease_seconds),
+               '--max-attempts', str(args.max_attempts), '--verify', args.verify, '--log-level', args.log_level]
+    for flag in ('no_cache', 'no_index', 'no_store', 'http2', 'legacy_info'):
+        if getattr(args, flag):
+            command.append('--' + flag.replace('_', '-'))
+
+    processes = []
+    for i in range(args.workers):
+        worker_command = list(command)
+        if args.proxy:
+            worker_command += ['--proxy', args.proxy[i % len(args.proxy)]]
+        processes.append(subprocess.Popen(worker_command))
+    try:
+        for process in processes:
+            process.wait()
+    except KeyboardInterrupt:
+        # 子进程同样收到 Ctrl-C，等待它们归还任务后退出
+        for process in processes:
+            process.wait()
+    status(args)
+
+
+def seed(args):
+    if not os.path.exists(args.books):
+        print(f"错误：找不到文件 {args.books}")
+        return
+    queue = JobQueue(args.db)
+    try:
+        added = queue.seed(iter_books(args.books), skip=ProgressJournal(args.journal).statuses())
+    finally:
+        queue.close()
+    print(f"导入任务: {added} 个（已在队列中或已完成的书籍不重复导入）")
+
+
+def status(args):
+    queue = JobQueue(args.db)
+    counts = queue.counts()
+    workers = queue.workers()
+    queue.close()
+    print(f"等待: {counts[JOB_PENDING]}，处理中: {counts[JOB_LEASED]}（租约到期: {counts['expired']}），"
+          f"完成: {counts[JOB_DONE]}，失败: {counts[JOB_FAILED]}")
+    for worker, count in sorted(workers.items()):
+        print(f"  {worker}: {count} 个任务")
+
+
+def retry_failed(args):
+    queue = JobQueue(args.db)
+    print(f"放回队列: {queue.retry_failed()} 个失败的任务")
+    queue.close()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="单机多进程任务队列")
+    parser.add_argument('--db', default='.douban_cache/job_queue.sqlite',
+                        help="任务队列数据库（默认: .douban_cache/job_queue.sqlite）")
+    parser.add_argument('--journal', default='covers/progress_journal.jsonl',
+                        help="进度日志文件（默认: covers/progress_journal.jsonl）")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    seed_parser = subparsers.add_parser('seed', help="导入书单")
+    seed_parser.add_argument('--books', default='bookNames.json',
+                             help="书籍列表文件，.json/.jsonl/.csv（默认: bookNames.json）")
+    seed_parser.set_defaults(func=seed)
+
+    subparsers.add_parser('status', help="查看队列状态").set_defaults(func=status)
+    subparsers.add_parser('retry-failed', help="把失败的任务放回队列").set_defaults(func=retry_failed)
+
+    def add_worker_arguments(subparser):
+        subparser.add_argument('--concurrency', type=int, default=4,
+                               help="每个工作进程同时处理的书籍数量（默认: 4）")
+        subparser.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS,
+                               help=f"任务租约时长，工作进程退出后超过这个时间任务回到队列（默认: {DEFAULT_LEASE_SECONDS}）")
+        subparser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                               help=f"每个任务最多尝试的次数（默认: {DEFAULT_MAX_ATTEMPTS}）")
+        subparser.add_argument('--cache-dir', default='.douban_cache',
+                               help="页面缓存和书名解析索引的目录（默认: .douban_cache）")
+        subparser.add_argument('--no-cache', action='store_true', help="不使用页面缓存")
+        subparser.add_argument('--no-index', action='store_true', help="不使用书名解析索引")
+        subparser.add_argument('--no-store', action='store_true', help="不使用封面存储")
+        subparser.add_argument('--http2', action='store_true', help="使用 HTTP/2（需要安装 httpx[http2]）")
+        subparser.add_argument('--legacy-info', action='store_true',
+                               help="同时按旧格式为每本书保存 _info.json")
+        subparser.add_argument('--verify', choices=VERIFY_STRATEGIES, default=VERIFY_LAZY,
+                               help="封面验证策略（默认: lazy）")
+        subparser.add_argument('--log-level', choices=LOG_LEVELS, default='info',
+                               help="输出级别（默认: info）")
+
+    work_parser = subparsers.add_parser('work', help="启动一个工作进程")
+    add_worker_arguments(work_parser)
+    work_parser.add_argument('--proxy', default=None, help="本进程使用的 HTTP 代理")
+    work_parser.add_argument('--worker-id', default=None, help="工作进程名称（默认: 主机名-进程号）")
+    work_parser.set_defaults(func=work)
+
+    run_parser = subparsers.add_parser('run', help="导入书单并启动多个工作进程")
+    add_worker_arguments(run_parser)
+    run_parser.add_argument('--workers', type=int, default=2, help="工作进程数（默认: 2）")
+    run_parser.add_argument('--proxy', action='append', default=[],
+                            help="HTTP 代理，可重复，按顺序轮流分配给各工作进程")
+    run_parser.add_argument('--books', default='bookNames.json',
+                            help="先导入的书籍列表（默认: bookNames.json，传空字符串跳过导入）")
+    run_parser.set_defaults(func=run)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,421 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+豆瓣搜索页和书籍详情页的字段提取
+只解析需要的区域（标题、封面、#info、评分、简介），优先使用 lxml 或 selectolax，
+快速解析失败时回退到 BeautifulSoup
+"""
+
+import re
+
+try:
+    import lxml.html
+except ImportError:  # 可选依赖
+    lxml = None
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # 可选依赖
+    LexborHTMLParser = None
+
+from bs4 import BeautifulSoup, NavigableString, SoupStrainer
+
+# 详情页中需要的区域都在 <h1> 之后、这些标记之前，截取后再解析可以跳过页头脚本和大量短评
+SUBJECT_REGION_END_MARKERS = ('id="db-tags-section"', 'id="comments"', 'class="aside"')
+SEARCH_REGION_START_MARKERS = ('class="result-list"', 'class="search-result"')
+SEARCH_REGION_END_MARKERS = ('class="aside"', 'id="footer"')
+
+SUBJECT_ID_PATTERNS = (
+    re.compile(r'url=.*?%2Fsubject%2F(\d+)%2F'),  # 豆瓣的跳转链接
+    re.compile(r'/subject/(\d+)/'),
+)
+
+# #info 中的标签名 → 返回的字段名
+INFO_FIELDS = {
+    '作者': 'author',
+    '出版社': 'publisher',
+    '出版年': 'pubdate',
+    'ISBN': 'isbn',
+}
+
+WHITESPACE = re.compile(r'\s+')
+
+
+def _clean(text):
+    return WHITESPACE.sub(' ', text or '').strip()
+
+
+def _clean_block(text):
+    # 多段文本：去掉每行首尾空白和空行
+    return '\n'.join(line.strip() for line in (text or '').splitlines() if line.strip())
+
+
+def _clean_value(text):
+    # #info 中的值前面可能带着标签后的冒号
+    return _clean(text).lstrip(':：').strip()
+
+
+def _clean_label(text):
+    return _clean(text).rstrip(':：').strip()
+
+
+def extract_book_id(href):
+    """
+    从搜索结果链接中提取书籍ID
+    """
+    if not href:
+        return None
+    for pattern in SUBJECT_ID_PATTERNS:
+        match = pattern.search(href)
+        if match:
+            return match.group(1)
+    return None
+
+
+def _slice(html, start_markers, end_markers):
+    """
+    截取页面中需要解析的区域，找不到标记时返回整个页面
+    """
+    start = -1
+    for marker in start_markers:
+        start = html.find(marker)
+        if start != -1:
+            start = html.rfind('<', 0, start + 1)
+            break
+    if start == -1:
+        return html
+    end = len(html)
+    for marker in end_markers:
+        index = html.find(marker, start)
+        if index != -1:
+            end = min(end, html.rfind('<', start, index))
+    return html[start:end]
+
+
+def subject_region(html):
+    return _slice(html, ('<h1',), SUBJECT_REGION_END_MARKERS)
+
+
+def search_region(html):
+    return _slice(html, SEARCH_REGION_START_MARKERS, SEARCH_REGION_END_MARKERS)
+
+
+def _empty_subject():
+    return {
+        'title': None,
+        'author': None,
+        'publisher': None,
+        'pubdate': None,
+        'isbn': None,
+        'rating': None,
+        'rating_people': None,
+        'cover_url': None,
+        'intro': None,
+    }
+
+
+def _apply_info(fields, info):
+    for label, key in INFO_FIELDS.items():
+        if info.get(label):
+            fields[key] = info[label]
+
+
+# ---------------------------------------------------------------- lxml
+
+def _lxml_has_class(element, name):
+    return name in (element.get('class') or '').split()
+
+
+def _lxml_info(info_elem):
+    info = {}
+    for label_elem in info_elem.xpath('.//span[contains(concat(" ", @class, " "), " pl ")]'):
+        parts = [label_elem.tail or '']
+        for sibling in label_elem.itersiblings():
+            if sibling.tag == 'br' or (sibling.tag == 'span' and _lxml_has_class(sibling, 'pl')):
+                break
+            parts.append(sibling.text_content())
+            parts.append(sibling.tail or '')
+        info[_clean_label(label_elem.text_content())] = _clean_value(''.join(parts))
+    return info
+
+
+def _lxml_subject(html):
+    root = lxml.html.fromstring(subject_region(html))
+    fields = _empty_subject()
+
+    h1 = root.xpath('//h1')
+    if h1:
+        fields['title'] = _clean(h1[0].text_content())
+
+    info_elem = root.xpath('//*[@id="info"]')
+    if info_elem:
+        _apply_info(fields, _lxml_info(info_elem[0]))
+
+    rating = root.xpath('//strong[contains(concat(" ", @class, " "), " rating_num ")]')
+    if rating:
+        fields['rating'] = _clean(rating[0].text_content())
+    rating_people = root.xpath('//a[contains(concat(" ", @class, " "), " rating_people ")]')
+    if rating_people:
+        fields['rating_people'] = _clean(rating_people[0].text_content())
+
+    cover = root.xpath('//*[@id="mainpic"]//img')
+    if cover:
+        fields['cover_url'] = cover[0].get('src')
+
+    intro = root.xpath('//*[@id="link-report"]')
+    if intro:
+        fields['intro'] = _clean_block(intro[0].text_content())
+    return fields
+
+
+def _lxml_search(html):
+    root = lxml.html.fromstring(search_region(html))
+    results = []
+    for item in root.xpath('//div[contains(concat(" ", @class, " "), " result ") '
+                           'or contains(concat(" ", @class, " "), " item-root ")]'):
+        link = item.xpath('.//div[contains(concat(" ", @class, " "), " title ")]//a')
+        if not link:
+            link = item.xpath('.//a')
+        href = link[0].get('href', '') if link else ''
+        title = _clean(link[0].text_content()) if link else ''
+        if link and not title:
+            title = _clean(link[0].get('title'))
+        rating = item.xpath('.//span[contains(concat(" ", @class, " "), " rating_nums ")]')
+        cast = item.xpath('.//span[contains(concat(" ", @class, " "), " subject-cast ")]')
+        info = item.xpath('.//p') or item.xpath('.//div[contains(concat(" ", @class, " "), " info ")]')
+        results.append({
+            'title': title,
+            'href': href,
+            'book_id': extract_book_id(href),
+            'rating': _clean(rating[0].text_content()) if rating else None,
+            'cast': _clean(cast[0].text_content()) if cast else '',
+            'info': _clean(info[0].text_content()) if info else '',
+            'source': 'result',
+        })
+    return results
+
+
+# ---------------------------------------------------------------- selectolax
+
+def _selectolax_info(info_node):
+    info = {}
+    for label_node in info_node.css('span.pl'):
+        parts = []
+        sibling = label_node.next
+        while sibling is not None:
+            if sibling.tag == 'br' or (sibling.tag == 'span' and 'pl' in (sibling.attributes.get('class') or '').split()):
+                break
+            parts.append(sibling.text(deep=True))
+            sibling = sibling.next
+        info[_clean_label(label_node.text())] = _clean_value(''.join(parts))
+    return info
+
+
+def _selectolax_subject(html):
+    tree = LexborHTMLParser(subject_region(html))
+    fields = _empty_subject()
+
+    h1 = tree.css_first('h1')
+    if h1 is not None:
+        fields['title'] = _clean(h1.text())
+
+    info_node = tree.css_first('#info')
+    if info_node is not None:
+        _apply_info(fields, _selectolax_info(info_node))
+
+    rating = tree.css_first('strong.rating_num')
+    if rating is not None:
+        fields['rating'] = _clean(rating.text())
+    rating_people = tree.css_first('a.rating_people')
+    if rating_people is not None:
+        fields['rating_people'] = _clean(rating_people.text())
+
+    cover = tree.css_first('#mainpic img')
+    if cover is not None:
+        fields['cover_url'] = cover.attributes.get('src')
+
+    intro = tree.css_first('#link-report')
+    if intro is not None:
+        fields['intro'] = _clean_block(intro.text())
+    return fields
+
+
+def _selectolax_search(html):
+    tree = LexborHTMLParser(search_region(html))
+    results = []
+    for item in tree.css('div.result, div.item-root'):
+        link = item.css_first('div.title a') or item.css_first('a')
+        href = (link.attributes.get('href') or '') if link is not None else ''
+        title = _clean(link.text()) if link is not None else ''
+        if link is not None and not title:
+            title = _clean(link.attributes.get('title'))
+        rating = item.css_first('span.rating_nums')
+        cast = item.css_first('span.subject-cast')
+        info = item.css_first('p') or item.css_first('div.info')
+        results.append({
+            'title': title,
+            'href': href,
+            'book_id': extract_book_id(href),
+            'rating': _clean(rating.text()) if rating is not None else None,
+            'cast': _clean(cast.text()) if cast is not None else '',
+            'info': _clean(info.text()) if info is not None else '',
+            'source': 'result',
+        })
+    return results
+
+
+# ---------------------------------------------------------------- BeautifulSoup
+
+# 只为这些区域建树，<h1> 单独解析
+SUBJECT_STRAINER = SoupStrainer(id=['mainpic', 'info', 'interest_sectl', 'link-report'])
+
+
+def _bs4_info(info_elem):
+    info = {}
+    for label_elem in info_elem.find_all('span', class_='pl'):
+        parts = []
+        for sibling in label_elem.next_siblings:
+            if isinstance(sibling, NavigableString):
+                parts.append(str(sibling))
+                continue
+            if sibling.name == 'br' or (sibling.name == 'span' and 'pl' in (sibling.get('class') or [])):
+                break
+            parts.append(sibling.get_text())
+        info[_clean_label(label_elem.get_text())] = _clean_value(''.join(parts))
+    return info
+
+
+def _bs4_subject(html):
+    region = subject_region(html)
+    soup = BeautifulSoup(region, 'html.parser', parse_only=SUBJECT_STRAINER)
+    fields = _empty_subject()
+
+    h1_end = region.find('</h1>')
+    h1 = BeautifulSoup(region[:h1_end + 5] if h1_end != -1 else region, 'html.parser').find('h1')
+    if h1:
+        fields['title'] = _clean(h1.get_text())
+
+    info_elem = soup.find(id='info')
+    if info_elem:
+        _apply_info(fields, _bs4_info(info_elem))
+
+    rating = soup.find('strong', class_='rating_num')
+    if rating:
+        fields['rating'] = _clean(rating.get_text())
+    rating_people = soup.find('a', class_='rating_people')
+    if rating_people:
+        fields['rating_people'] = _clean(rating_people.get_text())
+
+    mainpic = soup.find(id='mainpic')
+    cover = mainpic.find('img') if mainpic else None
+    if cover:
+        fields['cover_url'] = cover.get('src')
+
+    intro = soup.find(id='link-report')
+    if intro:
+        fields['intro'] = _clean_block(intro.get_text())
+    return fields
+
+
+def _bs4_search(html):
+    soup = BeautifulSoup(search_region(html), 'html.parser')
+    results = []
+    items = soup.find_all('div', class_='result') or soup.find_all('div', class_='item-root')
+    for item in items:
+        title_div = item.find('div', class_='title')
+        link = (title_div.find('a') if title_div else None) or item.find('a')
+        href = link.get('href', '') if link else ''
+        title = _clean(link.get_text()) if link else ''
+        if link and not title:
+            title = _clean(link.get('title'))
+        rating = item.find('span', class_='rating_nums')
+        cast = item.find('span', class_='subject-cast')
+        info = item.find('p') or item.find('div', class_='info')
+        results.append({
+            'title': title,
+            'href': href,
+            'book_id': extract_book_id(href),
+            'rating': _clean(rating.get_text()) if rating else None,
+            'cast': _clean(cast.get_text()) if cast else '',
+            'info': _clean(info.get_text()) if info else '',
+            'source': 'result',
+        })
+
+    if not results:
+        # 没有搜索结果容器时，退而查找所有书籍链接
+        for link in soup.find_all('a', href=re.compile(r'/subject/\d+/')):
+            title = _clean(link.get_text())
+            href = link.get('href', '')
+            if title and href:
+                results.append({
+                    'title': title,
+                    'href': href,
+                    'book_id': extract_book_id(href),
+                    'rating': None,
+                    'cast': '',
+                    'info': '',
+                    'source': 'link',
+                })
+    return results
+
+
+# ---------------------------------------------------------------- 对外接口
+
+SUBJECT_BACKENDS = {'bs4': _bs4_subject}
+SEARCH_BACKENDS = {'bs4': _bs4_search}
+if lxml is not None:
+    SUBJECT_BACKENDS['lxml'] = _lxml_subject
+    SEARCH_BACKENDS['lxml'] = _lxml_search
+if LexborHTMLParser is not None:
+    SUBJECT_BACKENDS['selectolax'] = _selectolax_subject
+    SEARCH_BACKENDS['selectolax'] = _selectolax_search
+
+# auto 模式下依次尝试的解析器，最后总会回退到 bs4
+FAST_BACKENDS = ('selectolax', 'lxml')
+
+
+def available_backends():
+    """
+    返回当前环境可用的解析器
+    """
+    return [name for name in FAST_BACKENDS if name in SUBJECT_BACKENDS] + ['bs4']
+
+
+def _backend_chain(backend):
+    if backend == 'auto':
+        return available_backends()
+    if backend not in SUBJECT_BACKENDS:
+        raise ValueError(f"解析器不可用: {backend}（可用: {', '.join(available_backends())}）")
+    return [backend] if backend == 'bs4' else [backend, 'bs4']
+
+
+def extract_subject_page(html, backend='auto'):
+    """
+    提取书籍详情页字段：title, author, publisher, pubdate, isbn, rating, rating_people, cover_url, intro
+    缺失的字段为 None；快速解析器出错或找不到标题时回退到下一个解析器
+    """
+    fields = None
+    for name in _backend_chain(backend):
+        try:
+            fields = SUBJECT_BACKENDS[name](html)
+        except Exception:
+            continue
+        if fields.get('title'):
+            return fields
+    return fields
+
+
+def extract_search_results(html, backend='auto'):
+    """
+    提取搜索结果列表，每项包含 title, href, book_id, rating, cast, info, source
+    source 为 'link' 表示页面中没有搜索结果容器，只找到了书籍链接
+    """
+    results = []
+    for name in _backend_chain(backend):
+        try:
+            results = SEARCH_BACKENDS[name](html)
+        except Exception:
+            continue
+        if results:
+            return results
+    return results
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批处理进度日志
+每本书的处理结果以 JSON 行追加写入并立即落盘，程序中断后重新运行时
+据此跳过已完成的书籍，只处理剩余部分
+"""
+
+import json
+import os
+import threading
+import time
+
+# 每本书可能的处理结果
+STATUS_RESOLVED = 'resolved'  # 已找到书籍信息，尚未下载封面
+STATUS_DOWNLOADED = 'downloaded'  # 封面已下载
+STATUS_NOT_FOUND = 'not_found'  # 没有找到匹配的书籍
+STATUS_TOO_OLD = 'too_old'  # 找到的版本出版年都不符合要求
+STATUS_FAILED = 'failed'  # 处理出错（原因记录在 reason 中）
+
+# 不需要再处理的结果
+FINISHED_STATUSES = (STATUS_DOWNLOADED, STATUS_NOT_FOUND, STATUS_TOO_OLD)
+
+
+def journal_key(title, category):
+    """
+    日志中标识一本书的键
+    """
+    return f"{category}\t{title}"
+
+
+class ProgressJournal:
+    """
+    只追加写入的进度日志，线程安全
+    """
+
+    def __init__(self, path, fsync=True):
+        self.path = path
+        self.fsync = fsync  # 每条记录写入后是否立即同步到磁盘
+        self._lock = threading.Lock()
+        self._file = None
+
+    def load(self):
+        """
+        读取日志，返回每本书最新的一条记录 {key: record}
+        程序崩溃时可能留下写了一半的最后一行，解析失败的行直接忽略
+        """
+        states = {}
+        if not os.path.exists(self.path):
+            return states
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    states[journal_key(record['title'], record['category'])] = record
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+        return states
+
+    def statuses(self):
+        """
+        只读取每本书最新的处理结果 {key: status}，书籍很多时比 load() 占用的内存少
+        """
+        states = {}
+        if not os.path.exists(self.path):
+            return states
+
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                    states[journal_key(record['title'], record['category'])] = record['status']
+                except (json.JSONDecodeError, KeyError, TypeError):
+                    continue
+        return states
+
+    def _open(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # 上次写入被中断时文件末尾没有换行，先补上，避免新记录接在残缺行后面
+        needs_newline = False
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                needs_newline = f.read(1) != b'\n'
+        self._file = open(self.path, 'a', encoding='utf-8')
+        if needs_newline:
+            self._file.write('\n')
+
+    def record(self, title, category, status, reason='', **extra):
+        """
+        追加一条处理结果
+        """
+        record = {
+            'title': title,
+            'category': category,
+            'status': status,
+            'reason': reason,
+            'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+        }
+        record.update(extra)
+        line = json.dumps(record, ensure_ascii=False) + '\n'
+
+        with self._lock:
+            if self._file is None:
+                self._open()
+            self._file.write(line)
+            self._file.flush()
+            if self.fsync:
+                os.fsync(self._file.fileno())
+
+    def close(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按主机划分的自适应请求频率控制
+每个主机一个令牌桶，速率按 AIMD 调整：遇到 418/429/503 时成倍降低，
+连续成功一段时间后线性恢复
+"""
+
+import threading
+import time
+
+# 表示被限流或触发反爬虫的状态码
+THROTTLE_STATUS_CODES = (418, 429, 503)
+
+# 各主机的默认配置（键可以是完整主机名或域名后缀），速率单位为 次/秒
+DEFAULT_HOST_CONFIGS = {
+    'www.douban.com': {'rate': 1 / 3, 'min_rate': 1 / 30, 'max_rate': 1.0},
+    'book.douban.com': {'rate': 0.5, 'min_rate': 1 / 30, 'max_rate': 2.0},
+    'doubanio.com': {'rate': 4.0, 'min_rate': 0.2, 'max_rate': 10.0},
+}
+
+DEFAULT_CONFIG = {'rate': 0.5, 'min_rate': 1 / 30, 'max_rate': 2.0}
+
+
+class TokenBucket:
+    """
+    单个主机的令牌桶
+    令牌可以被预支为负数，调用方在锁外等待，不会阻塞其他线程
+    """
+
+    def __init__(self, rate, min_rate, max_rate, capacity=1,
+                 decrease_factor=0.5, increase_step=None, success_window=10):
+        self.rate = rate  # 当前速率（次/秒）
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.capacity = capacity  # 允许的突发请求数
+        self.decrease_factor = decrease_factor  # 被限流时速率乘以该系数
+        self.increase_step = increase_step if increase_step is not None else max_rate / 20  # 每次恢复增加的速率
+        self.success_window = success_window  # 连续成功多少次后恢复一次
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.success_streak = 0
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def reserve(self):
+        """
+        预留一个令牌，返回需要等待的秒数
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= 1
+            if self.tokens >= 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def on_throttled(self):
+        """
+        被限流：速率成倍降低，并清空已积累的令牌
+        """
+        with self._lock:
+            self._refill(time.monotonic())
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self.tokens = min(self.tokens, 0)
+            self.success_streak = 0
+            return self.rate
+
+    def on_success(self):
+        """
+        请求成功：连续成功达到窗口大小后线性提升速率
+        """
+        with self._lock:
+            self.success_streak += 1
+            if self.success_streak >= self.success_window:
+                self.success_streak = 0
+                self._refill(time.monotonic())
+                self.rate = min(self.max_rate, self.rate + self.increase_step)
+            return self.rate
+
+
+class HostRateLimiter:
+    """
+    按主机管理令牌桶，线程安全
+    """
+
+    def __init__(self, host_configs=None, default_config=None):
+        self.host_configs = dict(DEFAULT_HOST_CONFIGS if host_configs is None else host_configs)
+        self.default_config = dict(DEFAULT_CONFIG if default_config is None else default_config)
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _config_for(self, host):
+        config = self.host_configs.get(host)
+        if config is None:
+            for suffix, suffix_config in self.host_configs.items():
+                if host.endswith('.' + suffix):
+                    config = suffix_config
+                    break
+            else:
+                config = self.default_config
+        return config
+
+    def bucket(self, host):
+        """
+        获取指定主机的令牌桶（按需创建）
+        """
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                bucket = TokenBucket(**self._config_for(host))
+                self._buckets[host] = bucket
+            return bucket
+
+    def acquire(self, host):
+        """
+        阻塞等待直到可以向该主机发送请求，返回实际等待的秒数
+        """
+        wait_time = self.bucket(host).reserve()
+        if wait_time > 0:
+            time.sleep(wait_time)
+        return wait_time
+
+    def record_response(self, host, status_code):
+        """
+        根据响应状态码调整该主机的速率，返回调整后的速率
+        """
+        bucket = self.bucket(host)
+        if status_code in THROTTLE_STATUS_CODES:
+            return bucket.on_throttled()
+        if status_code is not None and status_code < 400:
+            return bucket.on_success()
+        return bucket.rate
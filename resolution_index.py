@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+书名 → 豆瓣书籍ID 的持久化解析索引（SQLite）
+书名解析成功后记录书籍ID、出版信息和封面地址，之后的运行直接命中索引，
+跳过搜索页和详情页，只需下载封面；可设置有效期，过期后重新解析
+"""
+
+import os
+import sqlite3
+import threading
+import time
+
+from title_matcher import title_key
+
+# 索引键的格式版本；早期版本用模糊匹配的归一化书名作为键，不同卷次、版本会共用一条记录
+KEY_VERSION = 1
+
+
+def index_key(title, category=''):
+    """
+    索引键：书名标识键 + 分类（卷次、版本号和年份不同的书是不同的键）
+    """
+    return f"{category or ''}\t{title_key(title)}"
+
+
+def cover_base_url(cover_url):
+    """
+    去掉封面地址中的尺寸目录（/s/ /m/ /l/），得到可以构造各尺寸地址的基础地址
+    """
+    return (cover_url or '').replace('/l/', '/').replace('/m/', '/').replace('/s/', '/')
+
+
+class ResolutionIndex:
+    """
+    解析索引，线程安全
+    """
+
+    def __init__(self, path, ttl=None):
+        self.path = path
+        self.ttl = ttl  # 条目有效期（秒），None 表示永不过期
+
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        # 多个进程（任务队列的工作进程）共用同一个数据库，其他进程持有写锁时最多等待 30 秒
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS resolutions (
+                key TEXT PRIMARY KEY,
+                search_title TEXT NOT NULL,
+                category TEXT NOT NULL,
+                subject_id TEXT NOT NULL,
+                title TEXT,
+                author TEXT,
+                publisher TEXT,
+                pubdate TEXT,
+                cover_base TEXT NOT NULL,
+                resolved_at REAL NOT NULL
+            )
+        """)
+        if self._conn.execute('PRAGMA user_version').fetchone()[0] < KEY_VERSION:
+            self._rekey()
+        self._conn.commit()
+
+    def _rekey(self):
+        """
+        按记录中的原始书名重新计算旧版本的索引键
+        """
+        rows = self._conn.execute('SELECT key, search_title, category FROM resolutions').fetchall()
+        with self._conn:
+            for key, search_title, category in rows:
+                new_key = index_key(search_title, category)
+                if new_key != key:
+                    self._conn.execute('UPDATE OR REPLACE resolutions SET key = ? WHERE key = ?', (new_key, key))
+            self._conn.execute(f'PRAGMA user_version = {KEY_VERSION}')
+
+    def lookup(self, title, category=''):
+        """
+        查找书名对应的解析结果，返回与 search_book 相同格式的书籍信息，
+        images 为封面基础地址；没有记录或已过期时返回 None
+        """
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT subject_id, title, author, publisher, pubdate, cover_base, resolved_at '
+                'FROM resolutions WHERE key = ?', (index_key(title, category),)
+            ).fetchone()
+        if row is None:
+            return None
+        subject_id, page_title, author, publisher, pubdate, cover_base, resolved_at = row
+        if self.ttl is not None and time.time() - resolved_at >= self.ttl:
+            return None
+        return {
+            'id': subject_id,
+            'title': page_title,
+            'author': [author] if author else ['未知作者'],
+            'publisher': publisher,
+            'pubdate': pubdate,
+            'images': cover_base,
+        }
+
+    def store(self, title, category, covers):
+        """
+        记录解析结果（covers 为 get_book_covers 的返回值），没有书籍ID或封面地址时不记录
+        """
+        subject_id = covers.get('subject_id')
+        cover_base = cover_base_url(covers.get('large_cover') or covers.get('medium_cover')
+                                    or covers.get('small_cover'))
+        if not subject_id or not cover_base:
+            return
+        with self._lock:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO resolutions '
+                '(key, search_title, category, subject_id, title, author, publisher, pubdate, cover_base, resolved_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (index_key(title, category), title, category or '', str(subject_id), covers.get('title'),
+                 covers.get('author'), covers.get('publisher'), covers.get('pubdate'), cover_base, time.time())
+            )
+            self._conn.commit()
+
+    def invalidate(self, title, category=''):
+        """
+        删除一条解析结果（例如索引中的封面地址已失效）
+        """
+        with self._lock:
+            self._conn.execute('DELETE FROM resolutions WHERE key = ?', (index_key(title, category),))
+            self._conn.commit()
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+被限流时的延迟重试与按主机的熔断
+遇到 418/429/503 时不再让整个进程 sleep：请求抛出 Throttled，批处理引擎把这本书放入延迟重试队列
+（指数退避 + 随机抖动），其他书继续处理；同一主机连续被限流时熔断一段时间，
+熔断期间发往该主机的请求直接抛出 Throttled，不再访问网络，其他主机的请求不受影响
+"""
+
+import random
+import threading
+import time
+
+# 熔断器状态
+BREAKER_CLOSED = 'closed'  # 正常放行
+BREAKER_OPEN = 'open'  # 熔断中，拒绝所有请求
+BREAKER_HALF_OPEN = 'half_open'  # 冷却结束，放行一个探测请求
+
+DEFAULT_FAILURE_THRESHOLD = 3  # 连续被限流多少次后熔断
+DEFAULT_COOLDOWN = 60.0  # 首次熔断的冷却时间（秒），再次熔断时加倍
+DEFAULT_MAX_COOLDOWN = 600.0
+
+
+class Throttled(Exception):
+    """
+    请求被限流（418/429/503），或目标主机正处于熔断状态
+    retry_after 为建议的最短等待时间（秒），没有时为 None
+    """
+
+    def __init__(self, host, status_code=None, retry_after=None, circuit_open=False):
+        self.host = host
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.circuit_open = circuit_open
+        if circuit_open:
+            message = f"{host} 熔断中，{retry_after:.0f} 秒后恢复"
+        else:
+            message = f"{host} 返回 {status_code}，请求被限流"
+        super().__init__(message)
+
+
+def parse_retry_after(value):
+    """
+    解析 Retry-After 响应头（只支持秒数），无法解析时返回 None
+    """
+    value = (value or '').strip()
+    return float(value) if value.isdigit() else None
+
+
+class CircuitBreaker:
+    """
+    单个主机的熔断器，线程安全
+    """
+
+    def __init__(self, failure_threshold=DEFAULT_FAILURE_THRESHOLD, cooldown=DEFAULT_COOLDOWN,
+                 max_cooldown=DEFAULT_MAX_COOLDOWN):
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.cooldown = cooldown
+        self.state = BREAKER_CLOSED
+        self.failures = 0  # 连续被限流的次数
+        self.opened_at = 0.0
+        self.trips = 0  # 累计熔断次数
+        self._probing = False
+        self._probe_started = 0.0
+        self._lock = threading.Lock()
+
+    def remaining(self):
+        """
+        熔断剩余的冷却时间（秒）
+        """
+        return max(0.0, self.opened_at + self.cooldown - time.monotonic())
+
+    def allow(self):
+        """
+        是否可以发送请求；冷却结束后只放行一个探测请求，其结果决定恢复还是继续熔断
+        """
+        with self._lock:
+            if self.state == BREAKER_CLOSED:
+                return True
+            if self.state == BREAKER_OPEN:
+                if self.remaining() > 0:
+                    return False
+                self.state = BREAKER_HALF_OPEN
+                self._probing = False
+            # 探测请求因网络错误没有结果时，过一个冷却周期后再放行下一个
+            if self._probing and time.monotonic() - self._probe_started < self.base_cooldown:
+                return False
+            self._probing = True
+            self._probe_started = time.monotonic()
+            return True
+
+    def record(self, throttled):
+        """
+        记录一次请求结果，返回这次是否触发了熔断
+        """
+        with self._lock:
+            if not throttled:
+                self.state = BREAKER_CLOSED
+                self.failures = 0
+                self.cooldown = self.base_cooldown
+                self._probing = False
+                return False
+            self.failures += 1
+            if self.state == BREAKER_HALF_OPEN:
+                # 探测请求仍被限流，冷却时间加倍
+                self.cooldown = min(self.cooldown * 2, self.max_cooldown)
+            elif self.state == BREAKER_OPEN or self.failures < self.failure_threshold:
+                return False
+            self.state = BREAKER_OPEN
+            self.opened_at = time.monotonic()
+            self.trips += 1
+            self._probing = False
+            return True
+
+
+class HostCircuitBreakers:
+    """
+    按主机管理熔断器；groups 中的域名后缀共用一个熔断器（例如 img1/img3/img9.doubanio.com）
+    """
+
+    def __init__(self, groups=(), **breaker_options):
+        self.groups = tuple(groups)
+        self.breaker_options = breaker_options
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+    def key_for(self, host):
+        for suffix in self.groups:
+            if host == suffix or host.endswith('.' + suffix):
+                return suffix
+        return host
+
+    def breaker(self, host):
+        key = self.key_for(host)
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(**self.breaker_options)
+            return breaker
+
+    def check(self, host):
+        """
+        主机处于熔断状态时抛出 Throttled
+        """
+        breaker = self.breaker(host)
+        if not breaker.allow():
+            raise Throttled(self.key_for(host), retry_after=breaker.remaining(), circuit_open=True)
+
+    def record(self, host, throttled):
+        return self.breaker(host).record(throttled)
+
+    def snapshot(self):
+        """
+        各主机的熔断状态和累计熔断次数
+        """
+        with self._lock:
+            return {key: {'state': breaker.state, 'trips': breaker.trips} for key, breaker in self._breakers.items()}
+
+
+class RetryScheduler:
+    """
+    延迟重试的等待时间：指数退避加随机抖动，至少等到 Retry-After 或熔断冷却结束
+    """
+
+    def __init__(self, max_retries=5, base_delay=2.0, max_delay=300.0):
+        self.max_retries = max_retries  # 每本书最多延迟重试的次数
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def can_retry(self, attempt):
+        """
+        attempt 为已经重试过的次数
+        """
+        return attempt < self.max_retries
+
+    def delay(self, attempt, retry_after=None):
+        """
+        第 attempt 次重试（从 1 开始）前的等待时间
+        在 [退避时间/2, 退避时间] 之间随机取值，避免同时被限流的书在同一时刻一起重试
+        """
+        backoff = min(self.base_delay * 2 ** (attempt - 1), self.max_delay)
+        delay = random.uniform(backoff / 2, backoff)
+        if retry_after:
+            delay = max(delay, retry_after + random.uniform(0, self.base_delay))
+        return delay
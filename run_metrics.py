@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+批处理运行指标
+记录各阶段耗时分布、按主机和状态码统计的请求数、下载字节数、限速/退避等待时间和缓存命中率，
+可导出为 JSON 运行汇总或 Prometheus textfile（供 node_exporter 的 textfile collector 读取）
+"""
+
+import heapq
+import json
+import os
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+# 耗时直方图的分桶上界（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+# 运行汇总中保留的最慢书籍数
+SLOWEST_TITLES = 10
+
+
+class Histogram:
+    """
+    固定分桶的耗时直方图
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # 最后一个是 +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        """
+        按分桶线性插值估计分位数
+        """
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for i, bucket_count in enumerate(self.counts):
+            upper = self.buckets[i] if i < len(self.buckets) else self.max
+            if bucket_count and seen + bucket_count >= rank:
+                return min(lower + (upper - lower) * (rank - seen) / bucket_count, self.max)
+            seen += bucket_count
+            lower = upper
+        return self.max
+
+    def summary(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 4),
+            'mean': round(self.sum / self.count, 4) if self.count else 0.0,
+            'p50': round(self.quantile(0.5), 4),
+            'p90': round(self.quantile(0.9), 4),
+            'p99': round(self.quantile(0.99), 4),
+            'max': round(self.max, 4),
+        }
+
+
+def _label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _write_atomic(path, text):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.metrics-', suffix='.part', dir=directory)
+    try:
+        os.chmod(temp_path, 0o644)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(text)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+class RunMetrics:
+    """
+    一次运行的指标，线程安全
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.started_at = time.time()
+        self._lock = threading.Lock()
+        self.stages = {}  # 阶段 → Histogram
+        self.host_latency = {}  # 主机 → Histogram
+        self.requests = {}  # (主机, 状态码) → 次数，网络错误的状态码记为 error
+        self.bytes = {}  # 主机 → 下载字节数
+        self.sleep = {}  # 原因（rate_limit / backoff）→ 等待秒数
+        self.cache = {'hit': 0, 'revalidated': 0, 'miss': 0}
+        self.books = {}  # 处理结果 → 本数
+        self._slowest = []  # (耗时, 书名) 小顶堆
+
+    def observe(self, stage, seconds):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    @contextmanager
+    def timer(self, stage):
+        """
+        记录 with 块的耗时（出错时同样记录）
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - start)
+
+    def record_request(self, host, status, seconds):
+        with self._lock:
+            key = (host, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            histogram = self.host_latency.get(host)
+            if histogram is None:
+                histogram = self.host_latency[host] = Histogram(self.buckets)
+            histogram.observe(seconds)
+
+    def add_bytes(self, host, size):
+        with self._lock:
+            self.bytes[host] = self.bytes.get(host, 0) + size
+
+    def add_sleep(self, reason, seconds):
+        if seconds <= 0:
+            return
+        with self._lock:
+            self.sleep[reason] = self.sleep.get(reason, 0.0) + seconds
+
+    def cache_result(self, result):
+        """
+        result 为 hit（直接使用缓存）/ revalidated（304 后使用缓存）/ miss（重新下载）
+        """
+        with self._lock:
+            self.cache[result] += 1
+
+    def record_book(self, title, status, seconds):
+        with self._lock:
+            self.books[status] = self.books.get(status, 0) + 1
+            item = (seconds, title)
+            if len(self._slowest) < SLOWEST_TITLES:
+                heapq.heappush(self._slowest, item)
+            elif item > self._slowest[0]:
+                heapq.heapreplace(self._slowest, item)
+        self.observe('book', seconds)
+
+    def cache_hit_ratio(self):
+        total = sum(self.cache.values())
+        return (self.cache['hit'] + self.cache['revalidated']) / total if total else 0.0
+
+    def snapshot(self):
+        """
+        JSON 运行汇总
+        """
+        with self._lock:
+            return {
+                'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+                'elapsed_seconds': round(time.time() - self.started_at, 3),
+                'books': dict(self.books),
+                'stages': {stage: histogram.summary() for stage, histogram in sorted(self.stages.items())},
+                'hosts': {
+                    host: {
+                        'latency': histogram.summary(),
+                        'status': {status: count for (h, status), count in sorted(self.requests.items()) if h == host},
+                        'bytes': self.bytes.get(host, 0),
+                    }
+                    for host, histogram in sorted(self.host_latency.items())
+                },
+                'sleep_seconds': {reason: round(seconds, 3) for reason, seconds in sorted(self.sleep.items())},
+                'cache': dict(self.cache, hit_ratio=round(self.cache_hit_ratio(), 4)),
+                'slowest_titles': [
+                    {'title': title, 'seconds': round(seconds, 3)}
+                    for seconds, title in sorted(self._slowest, reverse=True)
+                ],
+            }
+
+    def write_json(self, path):
+        _write_atomic(path, json.dumps(self.snapshot(), ensure_ascii=False, indent=2) + '\n')
+
+    def prometheus_text(self, prefix='douban_cover'):
+        """
+        Prometheus 文本格式
+        """
+        lines = []
+
+        def histogram_lines(name, label, histograms, help_text):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} histogram")
+            for key, histogram in sorted(histograms.items()):
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'{prefix}_{name}_bucket{{{label}="{_label(key)}",le="{bound}"}} {cumulative}')
+                lines.append(f'{prefix}_{name}_sum{{{label}="{_label(key)}"}} {histogram.sum:.6f}')
+                lines.append(f'{prefix}_{name}_count{{{label}="{_label(key)}"}} {histogram.count}')
+
+        def counter_lines(name, help_text, samples):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for labels, value in samples:
+                label_text = ','.join(f'{key}="{_label(val)}"' for key, val in labels)
+                lines.append(f"{prefix}_{name}{{{label_text}}} {value}")
+
+        with self._lock:
+            histogram_lines('stage_seconds', 'stage', self.stages, 'Time spent per processing stage.')
+            histogram_lines('request_seconds', 'host', self.host_latency, 'HTTP request latency per host.')
+            counter_lines('requests_total', 'HTTP requests by host and status code.',
+                          [((('host', host), ('status', status)), count)
+                           for (host, status), count in sorted(self.requests.items())])
+            counter_lines('downloaded_bytes_total', 'Response bytes downloaded per host.',
+                          [((('host', host),), size) for host, size in sorted(self.bytes.items())])
+            counter_lines('sleep_seconds_total', 'Time spent waiting for rate limits and backoff.',
+                          [((('reason', reason),), f"{seconds:.6f}") for reason, seconds in sorted(self.sleep.items())])
+            counter_lines('cache_lookups_total', 'Page cache lookups by result.',
+                          [((('result', result),), count) for result, count in sorted(self.cache.items())])
+            counter_lines('books_total', 'Books processed by final status.',
+                          [((('status', status),), count) for status, count in sorted(self.books.items())])
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        _write_atomic(path, self.prometheus_text())
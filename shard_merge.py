@@ -0,0 +1,375 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+分片运行与结果合并
+同一个出口 IP 很快会被豆瓣限流，书单可以分给多台机器处理：
+每台机器运行 douban_book_cover.py --shard i/N，按归一化书名的哈希只处理属于自己的那一份
+（分片结果与书单顺序和增删无关），结束时在 covers/shard_manifest.json 写入本分片的运行信息。
+把各台机器的 covers/ 目录拷贝回来后，用本脚本合并成一个 covers/ 目录和一份进度日志：
+
+python shard_merge.py shard1/covers shard2/covers shard3/covers --output covers
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import socket
+import tempfile
+import time
+
+from title_matcher import normalize_title
+from progress_journal import ProgressJournal, FINISHED_STATUSES
+from cover_store import CoverStore, file_sha256
+from book_catalog import BookCatalog, CATALOG_NAME
+
+MANIFEST_NAME = 'shard_manifest.json'
+JOURNAL_NAME = 'progress_journal.jsonl'
+
+# 分片目录顶层不参与合并的文件（各自的运行记录）
+BOOKKEEPING_FILES = (MANIFEST_NAME, JOURNAL_NAME, 'failed_books.jsonl', 'scan_report.json')
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp', '.gif')
+
+
+def parse_shard(text):
+    """
+    解析 "i/N"（1 <= i <= N），返回 (i, N)
+    """
+    try:
+        index, count = (int(part) for part in text.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"分片格式应为 i/N，例如 1/4: {text}")
+    if count < 1 or not 1 <= index <= count:
+        raise argparse.ArgumentTypeError(f"分片编号应在 1 到 {count} 之间: {text}")
+    return index, count
+
+
+def shard_of(title, count):
+    """
+    书名所属的分片（1 到 count）
+    按归一化书名取哈希，同一本书在不同分类、不同写法下都落在同一个分片，解析索引也不会重复
+    """
+    key = normalize_title(title) or title.strip()
+    digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+    return int(digest[:15], 16) % count + 1
+
+
+def write_json(path, data):
+    """
+    先写临时文件再重命名，中断时不会留下写了一半的文件
+    """
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.shard-', suffix='.part', dir=directory)
+    try:
+        os.chmod(temp_path, 0o644)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def write_manifest(root, shard, books_file, summary, skipped, started_at):
+    """
+    分片运行结束时写入本分片的运行信息
+    """
+    index, count = shard
+    path = os.path.join(root, MANIFEST_NAME)
+    write_json(path, {
+        'shard': f"{index}/{count}",
+        'index': index,
+        'count': count,
+        'host': socket.gethostname(),
+        'books_file': os.path.abspath(books_file),
+        'started_at': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(started_at)),
+        'finished_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'interrupted': summary['interrupted'],
+        'processed': summary['total'],
+        'success': summary['success'],
+        'failed': summary['failed'],
+        'skipped': skipped,
+    })
+    return path
+
+
+def load_manifest(root):
+    try:
+        with open(os.path.join(root, MANIFEST_NAME), 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def shard_entries(manifest):
+    """
+    运行信息中记录的分片：分片输出目录是它本身，合并后的输出目录是合并进来的各个分片
+    """
+    if not manifest:
+        return []
+    if manifest.get('count'):
+        return [manifest]
+    return [entry for entry in manifest.get('shards', []) if entry.get('count')]
+
+
+def check_manifests(manifests):
+    """
+    检查各分片是否来自同一种划分，返回 (错误信息, 警告列表)
+    合并后的输出目录可以再次作为分片传入，按它包含的各个分片检查
+    """
+    warnings = []
+    entries = {root: shard_entries(manifest) for root, manifest in manifests.items()}
+    counts = {entry['count'] for items in entries.values() for entry in items}
+    if len(counts) > 1:
+        return f"分片数不一致: {sorted(counts)}，不能合并不同划分的结果", warnings
+    for root, manifest in manifests.items():
+        if manifest is None:
+            warnings.append(f"{root} 没有 {MANIFEST_NAME}，按普通输出目录合并")
+        elif not entries[root]:
+            warnings.append(f"{root} 的 {MANIFEST_NAME} 中没有分片信息，按普通输出目录合并")
+    if counts:
+        count = counts.pop()
+        seen = {}
+        for root, items in entries.items():
+            for entry in items:
+                seen.setdefault(entry['index'], []).append(root)
+        for index, roots in sorted(seen.items()):
+            if len(roots) > 1:
+                warnings.append(f"分片 {index}/{count} 出现了 {len(roots)} 次: {', '.join(roots)}")
+        missing = [f"{index}/{count}" for index in range(1, count + 1) if index not in seen]
+        if missing:
+            warnings.append(f"缺少分片: {', '.join(missing)}")
+    return None, warnings
+
+
+def _rank(record):
+    """
+    同一本书在多个分片中都有记录时（例如调整过分片数），已完成的优先，其次取较新的
+    """
+    return record.get('status') in FINISHED_STATUSES, record.get('time', '')
+
+
+def merge_journals(roots):
+    """
+    合并各分片的进度日志，每本书保留一条记录
+    """
+    merged = {}
+    for root in roots:
+        for key, record in ProgressJournal(os.path.join(root, JOURNAL_NAME)).load().items():
+            if key not in merged or _rank(record) > _rank(merged[key]):
+                merged[key] = record
+    return merged
+
+
+def write_journal(path, records):
+    directory = os.path.dirname(path) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.journal-', suffix='.part', dir=directory)
+    try:
+        os.chmod(temp_path, 0o644)
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            for key in sorted(records):
+                f.write(json.dumps(records[key], ensure_ascii=False) + '\n')
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def walk_outputs(root):
+    """
+    遍历分片目录中的封面和书籍信息文件，返回相对路径
+    跳过以 . 开头的文件和目录（封面存储、索引、临时文件）和顶层的运行记录
+    """
+    for directory, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith('.')]
+        for name in filenames:
+            if name.startswith('.') or name.endswith('.part'):
+                continue
+            if directory == root and name in BOOKKEEPING_FILES:
+                continue
+            yield os.path.relpath(os.path.join(directory, name), root)
+
+
+def cover_urls(root):
+    """
+    分片中各封面文件的下载地址（文件路径 → 地址），合并时用来给封面存储建立按地址的索引
+    候选地址来自分片的书籍信息目录（大/中/小），由分片自己的封面存储确认实际下载的是哪一个；
+    分片没有书籍信息目录或封面存储时返回空字典
+    """
+    catalog_path = os.path.join(root, CATALOG_NAME)
+    store_root = os.path.join(root, '.store')
+    if not os.path.exists(catalog_path) or not os.path.isdir(store_root):
+        return {}
+    urls = {}
+    catalog = BookCatalog(catalog_path)
+    store = CoverStore(store_root)
+    try:
+        for entry in catalog.entries():
+            path = entry['cover_path']
+            if not path or not os.path.exists(path):
+                continue
+            for name in ('large_cover', 'medium_cover', 'small_cover'):
+                url = entry['book'][name]
+                blob = store.lookup(url) if url else None
+                if blob is None:
+                    continue
+                # 链接到存储的文件直接比较，复制的文件比较内容哈希（存储中的文件名）
+                if os.path.samefile(blob, path) or file_sha256(path) == os.path.basename(blob)[:-len('.jpg')]:
+                    urls[os.path.join(root, os.path.relpath(path, root))] = url
+                    break
+    finally:
+        store.close()
+        catalog.close()
+    return urls
+
+
+def _copy_atomic(source, dest):
+    directory = os.path.dirname(dest) or '.'
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(prefix='.merge-', suffix='.part', dir=directory)
+    os.close(fd)
+    try:
+        shutil.copyfile(source, temp_path)
+        os.chmod(temp_path, 0o644)
+        os.replace(temp_path, dest)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def merge(roots, output, use_store=True):
+    """
+    把各分片目录合并到 output，返回统计信息
+    同一路径在多个分片中都有时：内容相同只保留一份，内容不同取修改时间最新的一份
+    """
+    output_abs = os.path.abspath(output)
+    sources = {}  # 相对路径 → [分片中的文件路径]
+    for root in roots:
+        if os.path.abspath(root) == output_abs:
+            continue
+        for relative in walk_outputs(root):
+            sources.setdefault(relative, []).append(os.path.join(root, relative))
+
+    store = CoverStore(os.path.join(output, '.store')) if use_store else None
+    urls = {}
+    if store is not None:
+        for root in roots:
+            if os.path.abspath(root) != output_abs:
+                urls.update(cover_urls(root))
+
+    stats = {'copied': 0, 'unchanged': 0, 'duplicates': 0, 'conflicts': 0, 'catalog': 0}
+    try:
+        for relative, paths in sorted(sources.items()):
+            if len(paths) > 1:
+                digests = {file_sha256(path) for path in paths}
+                stats['duplicates'] += len(paths) - 1
+                if len(digests) > 1:
+                    stats['conflicts'] += 1
+                    print(f"⚠️ {relative} 在 {len(paths)} 个分片中内容不同，使用最新的一份")
+            source = max(paths, key=os.path.getmtime)
+            dest = os.path.join(output, relative)
+            if os.path.exists(dest) and file_sha256(dest) == file_sha256(source):
+                stats['unchanged'] += 1
+                continue
+            _copy_atomic(source, dest)
+            if store is not None and relative.lower().endswith(IMAGE_EXTENSIONS):
+                # 不同分类中的同一张封面在存储中只保存一份，有下载地址时同时建立索引，之后不再重复下载
+                store.adopt(dest, urls.get(source))
+            stats['copied'] += 1
+    finally:
+        if store is not None:
+            store.close()
+
+    # 各分片的书籍信息目录合并到输出目录的目录中
+    catalogs = [os.path.join(root, CATALOG_NAME) for root in roots
+                if os.path.abspath(root) != output_abs and os.path.exists(os.path.join(root, CATALOG_NAME))]
+    if catalogs:
+        catalog = BookCatalog(os.path.join(output, CATALOG_NAME))
+        try:
+            for path in catalogs:
+                catalog.merge_from(path)
+            stats['catalog'] = catalog.counts()['books']
+        finally:
+            catalog.close()
+
+    # 输出目录中原有的进度日志也参与合并
+    records = merge_journals(list(roots) + [output])
+    write_journal(os.path.join(output, JOURNAL_NAME), records)
+    books = {}
+    for record in records.values():
+        books[record['status']] = books.get(record['status'], 0) + 1
+    stats['books'] = books
+    return stats
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="合并 --shard 分片运行的输出目录")
+    parser.add_argument('shards', nargs='+', help="各分片的 covers 目录")
+    parser.add_argument('--output', default='covers', help="合并后的目录（默认: covers）")
+    parser.add_argument('--no-store', action='store_true',
+                        help="不使用封面存储，每个文件各自复制一份")
+    parser.add_argument('--force', action='store_true', help="分片数不一致时也合并")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    roots = list(dict.fromkeys(os.path.normpath(root) for root in args.shards))
+    for root in roots:
+        if not os.path.isdir(root):
+            print(f"目录不存在: {root}")
+            return
+
+    manifests = {root: load_manifest(root) for root in roots}
+    error, warnings = check_manifests(manifests)
+    for warning in warnings:
+        print(f"⚠️ {warning}")
+    if error:
+        print(f"错误：{error}")
+        if not args.force:
+            print("使用 --force 强制合并")
+            return
+
+    print(f"合并 {len(roots)} 个分片到 {args.output}")
+    print("=" * 50)
+    start = time.time()
+    stats = merge(roots, args.output, use_store=not args.no_store)
+
+    # 合并后的输出目录记录它包含的各个分片，再次合并时可以照常检查
+    shards = []
+    for root, manifest in manifests.items():
+        entries = shard_entries(manifest)
+        if not entries:
+            shards.append({'path': os.path.abspath(root)})
+        for entry in entries:
+            shards.append(dict(entry, path=entry.get('path', os.path.abspath(root))))
+
+    write_json(os.path.join(args.output, MANIFEST_NAME), {
+        'merged_at': time.strftime('%Y-%m-%d %H:%M:%S'),
+        'shards': shards,
+        'warnings': warnings,
+        'files': {key: stats[key] for key in ('copied', 'unchanged', 'duplicates', 'conflicts')},
+        'books': stats['books'],
+    })
+
+    print(f"复制文件: {stats['copied']} 个，已是最新: {stats['unchanged']} 个")
+    print(f"重复文件: {stats['duplicates']} 个（其中内容不同: {stats['conflicts']} 个）")
+    books = ', '.join(f"{status}: {count}" for status, count in sorted(stats['books'].items()))
+    print(f"进度日志: {sum(stats['books'].values())} 本书（{books}）")
+    if stats['catalog']:
+        print(f"书籍信息目录: {stats['catalog']} 本书")
+    print(f"用时 {time.time() - start:.1f} 秒")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合并重复的并发操作（single-flight）
+同一个键的操作正在进行时，后来的调用不再重复执行，而是等待它完成并共享结果；
+完成后的结果在短时间内（memo_ttl 秒）继续复用，紧接着到来的相同请求也不必重新执行。
+书单中重复出现的书名、不同书名解析到同一本书、同一张封面出现在多个分类时，
+搜索、详情页和封面下载都只进行一次，不会重复消耗请求配额
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_MEMO_TTL = 60.0  # 完成的结果复用的时间（秒）
+DEFAULT_MAX_MEMO = 4096  # 最多保留的结果数
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    按键合并并发调用，线程安全
+    抛出的异常同样交给所有等待的调用，但不会被复用
+    """
+
+    def __init__(self, memo_ttl=DEFAULT_MEMO_TTL, max_memo=DEFAULT_MAX_MEMO):
+        self.memo_ttl = memo_ttl
+        self.max_memo = max_memo
+        self.executed = 0  # 实际执行的次数
+        self.shared = 0  # 等待正在进行的操作并共享结果的次数
+        self.memo_hits = 0  # 直接复用已完成结果的次数
+        self._calls = {}  # 键 → 正在进行的 _Call
+        self._memo = OrderedDict()  # 键 → (完成时间, 结果)
+        self._lock = threading.Lock()
+
+    def do(self, key, func, memo=None):
+        """
+        执行 func() 并返回结果；同一个键的操作正在进行或刚刚完成时直接使用它的结果
+        memo(result) 返回 False 时这次结果不复用（例如网络错误导致的失败），默认都复用
+        """
+        with self._lock:
+            item = self._memo.get(key)
+            if item is not None:
+                if time.monotonic() - item[0] < self.memo_ttl:
+                    self.memo_hits += 1
+                    return item[1]
+                del self._memo[key]
+            call = self._calls.get(key)
+            if call is not None:
+                self.shared += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                self.executed += 1
+                leader = True
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+                if call.error is None and self.memo_ttl > 0 and (memo is None or memo(call.result)):
+                    self._memo[key] = (time.monotonic(), call.result)
+                    while len(self._memo) > self.max_memo:
+                        self._memo.popitem(last=False)
+            call.done.set()
+        return call.result
+
+    def stats(self):
+        with self._lock:
+            return {'executed': self.executed, 'shared': self.shared, 'memo_hits': self.memo_hits}
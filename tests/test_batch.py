@@ -0,0 +1,75 @@
+# -*- coding: utf-8 -*-
+"""
+异步批处理引擎：不访问网络，解析和下载用桩方法代替
+"""
+
+import asyncio
+import threading
+
+import pytest
+
+from douban_book_cover import DoubanBookCover
+from progress_journal import ProgressJournal, STATUS_DOWNLOADED, STATUS_NOT_FOUND, STATUS_RESOLVED
+
+
+class StubCover(DoubanBookCover):
+    def __init__(self):
+        super().__init__()
+        self.active = 0
+        self.max_active = 0
+        self._active_lock = threading.Lock()
+
+    def resolve_book(self, book_title, category=""):
+        if book_title.startswith('missing'):
+            return None, STATUS_NOT_FOUND, '没有找到'
+        return {'title': book_title, 'large_cover': f'https://img1.doubanio.com/{book_title}.jpg'}, STATUS_RESOLVED, ''
+
+    def save_covers(self, covers, book_title="活着", category=""):
+        with self._active_lock:
+            self.active += 1
+            self.max_active = max(self.max_active, self.active)
+        try:
+            return f'covers/{category}'
+        finally:
+            with self._active_lock:
+                self.active -= 1
+
+
+def run_batch(getter, books, concurrency, journal=None):
+    async def collect():
+        return [result async for result in getter.iter_batch(books, concurrency=concurrency, journal=journal)]
+    return asyncio.run(collect())
+
+
+def books(count):
+    return [{'title': f'book{i}', 'category': '小说'} for i in range(count)]
+
+
+@pytest.mark.parametrize('concurrency', [0, 1])
+def test_low_concurrency_processes_every_book(concurrency):
+    getter = StubCover()
+    results = run_batch(getter, books(5), concurrency)
+    assert sorted(result['index'] for result in results) == [1, 2, 3, 4, 5]
+    assert all(result['status'] == STATUS_DOWNLOADED for result in results)
+    # 0 按 1 处理：只有一个工作协程，结果按书单顺序产出
+    assert [result['title'] for result in results] == [f'book{i}' for i in range(5)]
+    assert getter.max_active == 1
+
+
+def test_generator_input_and_unresolved_books():
+    getter = StubCover()
+    source = iter(books(3) + [{'title': 'missing1', 'category': ''}])
+    results = {result['title']: result for result in run_batch(getter, source, 4)}
+    assert results['missing1']['status'] == STATUS_NOT_FOUND
+    assert results['missing1']['reason'] == '没有找到'
+    assert results['book2']['save_dir'] == 'covers/小说'
+
+
+def test_results_are_written_to_journal(tmp_path):
+    journal = ProgressJournal(str(tmp_path / 'journal.jsonl'), fsync=False)
+    run_batch(StubCover(), books(3) + [{'title': 'missing1', 'category': ''}], 2, journal=journal)
+    journal.close()
+    states = ProgressJournal(journal.path).statuses()
+    assert len(states) == 4
+    assert list(states.values()).count(STATUS_DOWNLOADED) == 3
+    assert list(states.values()).count(STATUS_NOT_FOUND) == 1
@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""
+任务队列：租约到期后其他工作进程可以接手，原工作进程的结果不再生效
+"""
+
+import time
+
+import pytest
+
+from job_queue import JobQueue, JOB_DONE, JOB_FAILED, JOB_LEASED, JOB_PENDING
+from progress_journal import STATUS_DOWNLOADED, STATUS_FAILED, journal_key, STATUS_NOT_FOUND
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = JobQueue(str(tmp_path / 'queue.sqlite'), lease_seconds=0.2, max_attempts=2)
+    yield queue
+    queue.close()
+
+
+def test_seed_skips_duplicates_and_finished_books(queue):
+    books = [{'title': '活着', 'category': '小说'}, {'title': '兄弟', 'category': '小说'}]
+    assert queue.seed(books, skip={journal_key('兄弟', '小说'): STATUS_NOT_FOUND}) == 1
+    assert queue.seed(books) == 1
+    assert queue.seed(books) == 0
+    assert queue.counts()[JOB_PENDING] == 2
+
+
+def test_lease_blocks_other_workers_until_it_expires(queue):
+    queue.seed([{'title': '活着', 'category': '小说', 'isbn': '9787506365437'}])
+    claimed = queue.claim('worker-a')
+    assert claimed == [{'title': '活着', 'category': '小说', 'isbn': '9787506365437'}]
+    assert queue.claim('worker-b') == []
+    assert queue.workers() == {'worker-a': 1}
+
+    time.sleep(0.3)
+    assert queue.counts()['expired'] == 1
+    assert queue.claim('worker-b') == claimed
+    # 租约已被接手，原工作进程的结果不再生效
+    assert not queue.complete('活着', '小说', 'worker-a', STATUS_DOWNLOADED)
+    assert queue.complete('活着', '小说', 'worker-b', STATUS_DOWNLOADED)
+    assert queue.counts()[JOB_DONE] == 1
+
+
+def test_renew_keeps_the_lease(queue):
+    queue.seed([{'title': '活着', 'category': '小说'}])
+    queue.claim('worker-a')
+    for _ in range(3):
+        time.sleep(0.1)
+        queue.renew('worker-a')
+    assert queue.claim('worker-b') == []
+    assert queue.counts()[JOB_LEASED] == 1
+
+
+def test_expired_lease_fails_after_max_attempts(queue):
+    queue.seed([{'title': '活着', 'category': '小说'}])
+    queue.claim('worker-a')
+    time.sleep(0.3)
+    queue.claim('worker-b')
+    time.sleep(0.3)
+    assert queue.claim('worker-c') == []
+    counts = queue.counts()
+    assert counts[JOB_FAILED] == 1 and counts[JOB_LEASED] == 0
+
+    assert queue.retry_failed() == 1
+    assert queue.claim('worker-c') == [{'title': '活着', 'category': '小说'}]
+
+
+def test_failed_result_returns_to_queue_until_attempts_run_out(queue):
+    queue.seed([{'title': '活着', 'category': '小说'}])
+    queue.claim('worker-a')
+    assert queue.complete('活着', '小说', 'worker-a', STATUS_FAILED, '处理出错')
+    assert queue.counts()[JOB_PENDING] == 1
+    queue.claim('worker-a')
+    assert queue.complete('活着', '小说', 'worker-a', STATUS_FAILED, '处理出错')
+    assert queue.counts()[JOB_FAILED] == 1
+
+
+def test_release_does_not_count_an_attempt(queue):
+    queue.seed([{'title': '活着', 'category': '小说'}])
+    queue.claim('worker-a')
+    assert queue.release('worker-a') == 1
+    queue.claim('worker-b')
+    assert queue.complete('活着', '小说', 'worker-b', STATUS_FAILED)
+    # 归还的那次不算，第一次真正失败后仍回到队列
+    assert queue.counts()[JOB_PENDING] == 1
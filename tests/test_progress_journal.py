@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""
+进度日志：中断后重新运行时据此跳过已完成的书
+"""
+
+from progress_journal import (ProgressJournal, journal_key, FINISHED_STATUSES,
+                              STATUS_DOWNLOADED, STATUS_FAILED, STATUS_NOT_FOUND, STATUS_RESOLVED)
+
+
+def test_latest_record_wins(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = ProgressJournal(path)
+    journal.record('活着', '小说', STATUS_RESOLVED)
+    journal.record('活着', '小说', STATUS_DOWNLOADED)
+    journal.record('兄弟', '小说', STATUS_FAILED, '处理出错')
+    journal.close()
+
+    reopened = ProgressJournal(path)
+    assert reopened.statuses() == {
+        journal_key('活着', '小说'): STATUS_DOWNLOADED,
+        journal_key('兄弟', '小说'): STATUS_FAILED,
+    }
+    assert reopened.load()[journal_key('兄弟', '小说')]['reason'] == '处理出错'
+
+
+def test_same_title_in_different_categories(tmp_path):
+    journal = ProgressJournal(str(tmp_path / 'journal.jsonl'))
+    journal.record('活着', '小说', STATUS_DOWNLOADED)
+    journal.record('活着', '传记', STATUS_NOT_FOUND)
+    journal.close()
+    assert len(journal.statuses()) == 2
+
+
+def test_resume_after_interrupted_write(tmp_path):
+    path = tmp_path / 'journal.jsonl'
+    journal = ProgressJournal(str(path))
+    journal.record('活着', '小说', STATUS_DOWNLOADED)
+    journal.close()
+    # 进程在写入一行的中途被结束
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"title": "兄弟", "category": "小说", "sta')
+
+    resumed = ProgressJournal(str(path))
+    assert resumed.statuses() == {journal_key('活着', '小说'): STATUS_DOWNLOADED}
+    resumed.record('许三观卖血记', '小说', STATUS_DOWNLOADED)
+    resumed.close()
+
+    states = ProgressJournal(str(path)).statuses()
+    assert states == {
+        journal_key('活着', '小说'): STATUS_DOWNLOADED,
+        journal_key('许三观卖血记', '小说'): STATUS_DOWNLOADED,
+    }
+    remaining = [title for title in ('活着', '兄弟', '许三观卖血记')
+                 if states.get(journal_key(title, '小说')) not in FINISHED_STATUSES]
+    assert remaining == ['兄弟']
+
+
+def test_missing_journal_is_empty(tmp_path):
+    journal = ProgressJournal(str(tmp_path / 'none.jsonl'))
+    assert journal.load() == {}
+    assert journal.statuses() == {}
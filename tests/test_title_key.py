@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+"""
+书名标识键和解析索引键：不同的书不能得到相同的键
+"""
+
+import pytest
+
+from title_matcher import title_key, normalize_title
+from resolution_index import index_key
+
+
+DISTINCT_TITLES = [
+    ('三体', '三体（第二部）', '三体（第三部）'),
+    ('明朝那些事儿（壹）', '明朝那些事儿（贰）'),
+    ('经济学原理（第7版）', '经济学原理（第8版）'),
+    ('2001太空漫游', '3001太空漫游'),
+    ('C++ Primer', 'C Primer'),
+    ('C# 入门经典', 'C 入门经典'),
+]
+
+
+@pytest.mark.parametrize('titles', DISTINCT_TITLES)
+def test_title_key_keeps_different_books_apart(titles):
+    assert len({title_key(title) for title in titles}) == len(titles)
+
+
+@pytest.mark.parametrize('titles', DISTINCT_TITLES)
+def test_index_key_keeps_different_books_apart(titles):
+    assert len({index_key(title, '小说') for title in titles}) == len(titles)
+
+
+def test_normalize_title_may_merge_volumes():
+    # 相似度比较用的归一化会去掉卷次，所以不能用作键
+    assert normalize_title('三体（第二部）') == normalize_title('三体（第三部）')
+
+
+@pytest.mark.parametrize('title, variant', [
+    ('三体', '  三体  '),
+    ('三体', '三體'),
+    ('abc 三体', 'ＡＢＣ　三体'),
+    ('三体 地球往事', '三体：地球往事'),
+])
+def test_title_key_folds_presentation_differences(title, variant):
+    assert title_key(variant) == title_key(title)
+
+
+def test_index_key_includes_category():
+    assert index_key('活着', '小说') != index_key('活着', '传记')
+    assert index_key('活着') == index_key('活着', None)
+
+
+def test_title_key_of_punctuation_only_title_is_not_empty():
+    assert title_key('？？？') == '？？？'
+    assert title_key('？？？') != title_key('！！！')
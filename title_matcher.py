@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+书名归一化与模糊匹配
+标识键（title_key）：全角转半角、繁体转简体、合并空白和标点，卷次、版本号和年份都保留，
+用于索引、缓存和合并重复请求；
+归一化（normalize_title）：在此基础上再去掉括号内容、版本标识、年份和标点，只用于相似度比较；
+匹配：完全一致 > 主标题一致（忽略副标题）> 字符二元组/编辑距离相似度，
+归一化结果带缓存，适合大批量书名反复比较
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+
+try:
+    from opencc import OpenCC  # 可选依赖，安装后使用完整的繁简转换
+    _OPENCC = OpenCC('t2s')
+except Exception:
+    _OPENCC = None
+
+# 常用繁体字 → 简体字（未安装 opencc 时使用）
+_TRADITIONAL = (
+    '與個們來時國學書說長東車馬門問間開關見現電話語讀記詩詞論這還進過運邊達選遠遊會後從應愛發萬無為對將當歲歷歸氣漢湯滿灣點熱爲爺牆狀獨獲環產畫異療盡監盤眾確種穩窮競筆節簡範紅紀約級紙紛細終組結絕給統經綠網緣線練縣總繼續罷義習聖聞聯聲聽職腦舊艱藝蘇蘭處號蟲術衛裝製複親覺觀訂計討訓設許診評試詳誌認誕誤課誰調談請諸講謝識譯議護變讓豐貝負財貧貨責貴買費賀資賊賓賞賢賣質趙趕跡踐蹤軍軟較載輕輝輪轉辦辭農迴適遲遺鄉鄭醫釋裡針鈴銀錢錯鍾鐘鐵閃閱闊陽陰陳陸隊際險隱雖雙雜雞離難雲靈靜頁頂項順須預領頭題顏願類風飛飯飲養餘館驗驚體鬥魚鳥鳳鳴麗麥黃齊齒龍龜亂亞佔侶係俠倫偉側傳傷傾僅價億儀儘優兒兩冊凍劃劍劇勁動務勝勞勢勵區協卻厭參叢吳員啟喚單嚴團園圍圖圓執堅報場塊塵墳壓壞壯壽夢夥奪奮婦媽孫寧實寫寬審寶專尋導屆屬島峽嶺巖帥師帳帶幫幾庫廟廠廣彈彎徑復徵恆悅惡惱態慘慣慶憂憑憶懷懸戀戰戲戶拋挾捨掃掛採揚換損搖擁擇擊擔據擠擴攝敗敘數斃斷於昇晉晝暫曆曉條構槍樂樓標樹橋機檢櫃權歡殘殺殼毀決沒況淚淺渾湧準溝滅漁漸潔潛濃濕濟濤濱瀏灑災烏煙煩燈燒營燦爭爾牽犧猶獄獎獸瑪甦畢疊癒盜盞睏矯礎礙禮禍禪稅稱穀積穫窩竊築籃籠糧純紗紡紹絲綁維綱綿緊緒緩編緯縮績織繩繪繭纖罰羅翹聰肅脅脫腎腳膚臉臨臺興舉艦莊華葉蒼蓋蔣蕭薦薩藍藥蘋虛蝦螢蠶衝補裏襲規視覽觸訪訴該誇誠誦諾謀謎證譜讚豎豬貓貞貢貪販貫貼賬賺購贈贏趨躍軌軒輔輩輸轟辯遞邏郵鄰醜釣鈔鉛銅鋼錄鍊鎖鎮鏡鑰閉閒閣闆隨隻霧響頓頗頻顆顧顯颱飄飢餅饑駐騎騙騰驅驕髮鬆鬧魯鮮鯨鴨鴻鵝鶴鷹鹽麼麵黨齡'
+)
+_SIMPLIFIED = (
+    '与个们来时国学书说长东车马门问间开关见现电话语读记诗词论这还进过运边达选远游会后从应爱发万无为对将当岁历归气汉汤满湾点热为爷墙状独获环产画异疗尽监盘众确种稳穷竞笔节简范红纪约级纸纷细终组结绝给统经绿网缘线练县总继续罢义习圣闻联声听职脑旧艰艺苏兰处号虫术卫装制复亲觉观订计讨训设许诊评试详志认诞误课谁调谈请诸讲谢识译议护变让丰贝负财贫货责贵买费贺资贼宾赏贤卖质赵赶迹践踪军软较载轻辉轮转办辞农回适迟遗乡郑医释里针铃银钱错钟钟铁闪阅阔阳阴陈陆队际险隐虽双杂鸡离难云灵静页顶项顺须预领头题颜愿类风飞饭饮养余馆验惊体斗鱼鸟凤鸣丽麦黄齐齿龙龟乱亚占侣系侠伦伟侧传伤倾仅价亿仪尽优儿两册冻划剑剧劲动务胜劳势励区协却厌参丛吴员启唤单严团园围图圆执坚报场块尘坟压坏壮寿梦伙夺奋妇妈孙宁实写宽审宝专寻导届属岛峡岭岩帅师帐带帮几库庙厂广弹弯径复征恒悦恶恼态惨惯庆忧凭忆怀悬恋战戏户抛挟舍扫挂采扬换损摇拥择击担据挤扩摄败叙数毙断于升晋昼暂历晓条构枪乐楼标树桥机检柜权欢残杀壳毁决没况泪浅浑涌准沟灭渔渐洁潜浓湿济涛滨浏洒灾乌烟烦灯烧营灿争尔牵牺犹狱奖兽玛苏毕叠愈盗盏困矫础碍礼祸禅税称谷积获窝窃筑篮笼粮纯纱纺绍丝绑维纲绵紧绪缓编纬缩绩织绳绘茧纤罚罗翘聪肃胁脱肾脚肤脸临台兴举舰庄华叶苍盖蒋萧荐萨蓝药苹虚虾萤蚕冲补里袭规视览触访诉该夸诚诵诺谋谜证谱赞竖猪猫贞贡贪贩贯贴账赚购赠赢趋跃轨轩辅辈输轰辩递逻邮邻丑钓钞铅铜钢录炼锁镇镜钥闭闲阁板随只雾响顿颇频颗顾显台飘饥饼饥驻骑骗腾驱骄发松闹鲁鲜鲸鸭鸿鹅鹤鹰盐么面党龄'
+)
+_T2S_TABLE = str.maketrans(_TRADITIONAL, _SIMPLIFIED)
+
+# 括号及其内容：（精装）[套装]【典藏】〔修订〕
+_BRACKETS = re.compile(r'[(\[【〔][^)\]】〕]*[)\]】〕]')
+# 书名号本身去掉，保留其中的书名
+_TITLE_MARKS = re.compile(r'[《》〈〉「」『』"\']')
+# 版本标识
+_EDITION_WORDS = re.compile(
+    r'(第[一二三四五六七八九十\d]+版|(?:全新|最新|修订|增订|纪念|珍藏|典藏|插图|精装|平装|新|中英双语|双语)[版本]'
+    r'|精装|平装|典藏|定本|套装)'
+)
+# 任意四位年份（前后不是数字）
+_YEARS = re.compile(r'(?<!\d)(?:19|20)\d{2}(?!\d)')
+# 副标题分隔符
+_SUBTITLE_SEPARATORS = re.compile(r'[:：—–\-·|/]')
+# 去掉标点和空白，只保留文字和数字
+_NON_WORD = re.compile(r'[\W_]+')
+# 标识键中合并为一个空格的字符（+ 和 # 有区分作用，例如 C++、C#）
+_KEY_SEPARATORS = re.compile(r'[^\w+#]+')
+
+DEFAULT_THRESHOLD = 0.75
+
+
+def _fold(title):
+    """
+    全角转半角、繁体转简体、统一小写
+    """
+    title = unicodedata.normalize('NFKC', title or '')
+    if _OPENCC is not None:
+        title = _OPENCC.convert(title)
+    else:
+        title = title.translate(_T2S_TABLE)
+    return title.lower()
+
+
+def _strip(title):
+    title = _BRACKETS.sub('', title)
+    title = _TITLE_MARKS.sub('', title)
+    return _EDITION_WORDS.sub('', title)
+
+
+def _stripped(title):
+    folded = _fold(title)
+    stripped = _strip(folded)
+    without_years = _YEARS.sub('', stripped)
+    # 书名本身就是年份或版本词（例如 "1984"）时不做删减
+    if _NON_WORD.sub('', without_years):
+        return without_years
+    if _NON_WORD.sub('', stripped):
+        return stripped
+    return folded
+
+
+@lru_cache(maxsize=65536)
+def title_key(title):
+    """
+    书名的标识键：用于索引、缓存和合并重复请求，不同的书不会得到相同的键
+    例如《三体（第二部）》和《三体（第三部）》、《经济学原理（第7版）》和《经济学原理（第8版）》是不同的键
+    """
+    return _KEY_SEPARATORS.sub(' ', _fold(title)).strip() or (title or '').strip()
+
+
+@lru_cache(maxsize=65536)
+def normalize_title(title):
+    """
+    归一化书名：只用于相似度比较（卷次、版本号和年份都被去掉，不同的书可能相同），
+    索引和缓存的键使用 title_key
+    """
+    return _NON_WORD.sub('', _stripped(title))
+
+
+@lru_cache(maxsize=65536)
+def _profile(title):
+    """
+    书名的比较信息：(归一化全名, 归一化主标题, 字符二元组集合)
+    """
+    folded = _stripped(title)
+    full = _NON_WORD.sub('', folded)
+    main = _NON_WORD.sub('', _SUBTITLE_SEPARATORS.split(folded, 1)[0]) or full
+    bigrams = frozenset(full[i:i + 2] for i in range(len(full) - 1)) or frozenset([full])
+    return full, main, bigrams
+
+
+def _edit_distance(a, b, limit):
+    """
+    编辑距离，超过 limit 时提前返回 limit + 1
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        row_min = i
+        for j, char_b in enumerate(b, 1):
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            current.append(value)
+            row_min = min(row_min, value)
+        if row_min > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+class TitleMatcher:
+    """
+    书名匹配器，score 返回 0~1 的相似度，is_match 按阈值判断
+    """
+
+    def __init__(self, threshold=DEFAULT_THRESHOLD):
+        self.threshold = threshold
+
+    def score(self, page_title, search_title):
+        """
+        计算页面标题与搜索书名的相似度
+        """
+        page_full, page_main, page_bigrams = _profile(page_title)
+        search_full, search_main, search_bigrams = _profile(search_title)
+        if not page_full or not search_full:
+            return 0.0
+        if page_full == search_full:
+            return 1.0
+        # 只差副标题，例如 "世事如烟：余华中短篇小说集"
+        if page_main == search_full or search_main == page_full:
+            return 0.95
+
+        # 字符二元组的 Dice 系数
+        overlap = len(page_bigrams & search_bigrams)
+        dice = 2 * overlap / (len(page_bigrams) + len(search_bigrams))
+
+        # 编辑距离相似度（只在可能超过 dice 时计算）
+        longest = max(len(page_full), len(search_full))
+        limit = int(longest * (1 - dice))
+        distance = _edit_distance(page_full, search_full, limit)
+        edit = 1 - distance / longest if distance <= limit else 0.0
+
+        return max(dice, edit)
+
+    def is_match(self, page_title, search_title):
+        return self.score(page_title, search_title) >= self.threshold
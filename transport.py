@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享的 HTTP 传输层
+搜索页、详情页和封面图片的请求都经过同一个 Transport：
+- 按主机分配连接池，池大小按该主机的并发上限设置；同一域名后缀的主机
+  （img1/img3/img9.doubanio.com）共用一个连接池管理器，保持长连接，不会互相挤出
+- 常用的请求头预先构造好，不在每次下载时重新生成
+- 可选 HTTP/2（需要安装 httpx[http2]），同一主机的并发请求复用一条连接
+- Cookie 保存到磁盘，下次运行继续使用（保持 bid 等 Cookie，减少反爬虫验证）
+"""
+
+import http.cookiejar
+import os
+import ssl
+import tempfile
+import threading
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, select_proxy
+
+try:
+    import httpx
+    import h2  # noqa: F401  httpx 的 HTTP/2 支持依赖 h2
+except ImportError:
+    httpx = None
+
+USER_AGENT = ('Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 '
+              '(KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36')
+
+# 会话的默认请求头
+DEFAULT_HEADERS = {
+    'User-Agent': USER_AGENT,
+}
+
+# 下载封面时使用的请求头（增强的请求头以应对反爬虫）
+IMAGE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,image/apng,*/*;q=0.8',
+    'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
+    'Accept-Encoding': 'gzip, deflate, br',
+    'Referer': 'https://book.douban.com/',
+    'DNT': '1',
+    'Connection': 'keep-alive',
+    'Upgrade-Insecure-Requests': '1'
+}
+
+# 封面下载遇到反爬虫时换用的请求头
+ALTERNATIVE_IMAGE_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+    'Accept': 'image/webp,image/apng,image/*,*/*;q=0.8',
+    'Referer': 'https://book.douban.com/',
+    'Sec-Fetch-Dest': 'image',
+    'Sec-Fetch-Mode': 'no-cors',
+    'Sec-Fetch-Site': 'cross-site'
+}
+
+# 并发上限之外预留的连接数（并发验证封面、重试等）
+POOL_HEADROOM = 4
+
+# 一个连接池管理器最多保留的主机数（同一后缀下的镜像主机）
+POOL_HOSTS = 16
+
+
+def http2_available():
+    return httpx is not None
+
+
+class _StreamReader:
+    """
+    把 httpx 的流式响应包装成 requests.Response.raw，供 iter_content / content / close 使用
+    """
+
+    def __init__(self, response, request):
+        self._response = response
+        self._request = request
+
+    def stream(self, chunk_size=None, decode_content=True):
+        try:
+            for chunk in self._response.iter_bytes(chunk_size):
+                yield chunk
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(e, request=self._request)
+        except httpx.HTTPError as e:
+            raise requests.ConnectionError(e, request=self._request)
+
+    def read(self, amt=None, decode_content=True):
+        return b''.join(self.stream(amt))
+
+    def close(self):
+        self._response.close()
+
+    def release_conn(self):
+        self._response.close()
+
+
+def _ssl_context(verify, cert):
+    """
+    把 requests 的 verify / cert 参数转换成 httpx 接受的形式（证书路径和客户端证书用 SSLContext 传入）
+    """
+    if not cert and not isinstance(verify, str):
+        return verify
+    context = ssl.create_default_context()
+    if verify is False:
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+    elif isinstance(verify, str):
+        if os.path.isdir(verify):
+            context.load_verify_locations(capath=verify)
+        else:
+            context.load_verify_locations(cafile=verify)
+    if cert:
+        if isinstance(cert, tuple):
+            context.load_cert_chain(*cert)
+        else:
+            context.load_cert_chain(cert)
+    return context
+
+
+class Http2Adapter(BaseAdapter):
+    """
+    用 httpx 发送请求的 requests 适配器，同一主机的请求在一条 HTTP/2 连接上多路复用
+    返回普通的 requests.Response，调用方不需要区分
+    httpx 的代理和证书设置属于整个连接，每种 (代理, verify, cert) 组合各用一个 httpx.Client
+    """
+
+    def __init__(self, max_connections, cookie_jar=None):
+        super().__init__()
+        self.max_connections = max_connections
+        self.cookie_jar = cookie_jar  # 响应中的 Cookie 写入会话的 Cookie 中
+        self._clients = {}  # (代理, verify, cert) → httpx.Client
+        self._lock = threading.Lock()
+
+    def _client_for(self, proxy, verify, cert):
+        if isinstance(cert, list):
+            cert = tuple(cert)
+        key = (proxy, verify, cert)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self._clients[key] = httpx.Client(
+                        http2=True,
+                        proxy=proxy,
+                        verify=_ssl_context(verify, cert),
+                        follow_redirects=False,  # 重定向由 requests 处理
+                        limits=httpx.Limits(max_connections=self.max_connections,
+                                            max_keepalive_connections=self.max_connections),
+                    )
+        return client
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        # 与 HTTPAdapter 相同：按请求地址从 proxies 中选出代理（包括环境变量中的代理）
+        client = self._client_for(select_proxy(request.url, proxies or {}), verify, cert)
+        http_request = client.build_request(
+            request.method, request.url, headers=dict(request.headers), content=request.body, timeout=timeout
+        )
+        try:
+            response = client.send(http_request, stream=True)
+        except httpx.TimeoutException as e:
+            raise requests.Timeout(e, request=request)
+        except httpx.HTTPError as e:
+            raise requests.ConnectionError(e, request=request)
+        # Cookie 只保存在会话中
+        client.cookies.clear()
+
+        result = requests.Response()
+        result.status_code = response.status_code
+        result.reason = response.reason_phrase
+        headers = CaseInsensitiveDict()
+        for key, value in response.headers.multi_items():
+            headers[key] = f"{headers[key]}, {value}" if key in headers else value
+        result.headers = headers
+        result.encoding = get_encoding_from_headers(headers)
+        result.url = request.url
+        result.request = request
+        result.connection = self
+        result.raw = _StreamReader(response, request)
+        for cookie in response.cookies.jar:
+            result.cookies.set_cookie(cookie)
+            if self.cookie_jar is not None:
+                self.cookie_jar.set_cookie(cookie)
+        return result
+
+    def close(self):
+        with self._lock:
+            for client in self._clients.values():
+                client.close()
+            self._clients.clear()
+
+
+class _Session(requests.Session):
+    """
+    按主机组选择适配器的会话
+    适配器不挂到 session.adapters 上：运行中第一次访问某个主机时不修改这个字典，
+    其他线程查找适配器时不会遇到“字典在遍历时被修改”
+    """
+
+    def __init__(self, transport):
+        super().__init__()
+        self._transport = transport
+
+    def get_adapter(self, url):
+        parts = urlsplit(url)
+        if parts.scheme.lower() in ('http', 'https') and parts.netloc:
+            return self._transport.adapter_for(parts.netloc.lower())
+        return super().get_adapter(url)
+
+
+class Transport:
+    """
+    所有网络请求共用的传输层，线程安全
+    host_limits 为 {主机名或域名后缀: 并发上限}，与 DoubanBookCover.host_limits 相同
+    """
+
+    def __init__(self, host_limits=None, default_limit=2, http2=False, cookie_path=None, proxy=None):
+        self.host_limits = host_limits if host_limits is not None else {}
+        self.default_limit = default_limit
+        self.http2 = http2 and http2_available()
+        self.cookie_path = cookie_path
+        self.proxy = proxy
+        self.session = _Session(self)
+        self.session.headers.update(DEFAULT_HEADERS)
+        if proxy:
+            self.session.proxies.update({'http': proxy, 'https': proxy})
+        self._adapters = {}  # 主机组 → 适配器
+        self._lock = threading.Lock()
+        if cookie_path:
+            self.load_cookies()
+
+    def group_for(self, host):
+        """
+        主机所属的组：host_limits 中匹配的主机名或域名后缀，没有匹配时为主机本身
+        """
+        if host in self.host_limits:
+            return host
+        for suffix in self.host_limits:
+            if host.endswith('.' + suffix):
+                return suffix
+        return host
+
+    def adapter_for(self, host):
+        """
+        主机所属组的适配器（按需创建），连接池大小按该组的并发上限设置
+        """
+        group = self.group_for(host)
+        adapter = self._adapters.get(group)
+        if adapter is not None:
+            return adapter
+        with self._lock:
+            adapter = self._adapters.get(group)
+            if adapter is None:
+                pool_size = self.host_limits.get(group, self.default_limit) + POOL_HEADROOM
+                if self.http2:
+                    adapter = Http2Adapter(pool_size, cookie_jar=self.session.cookies)
+                else:
+                    adapter = HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=pool_size)
+                self._adapters[group] = adapter
+            return adapter
+
+    def request(self, method, url, **kwargs):
+        """
+        发送请求；会话按主机组选择适配器（见 _Session.get_adapter）
+        """
+        return self.session.request(method, url, **kwargs)
+
+    def set_proxy(self, proxy):
+        """
+        设置出口代理
+        """
+        self.proxy = proxy
+        self.session.proxies.update({'http': proxy, 'https': proxy})
+
+    def load_cookies(self):
+        """
+        读取上次运行保存的 Cookie，文件不存在或格式不对时忽略
+        """
+        jar = http.cookiejar.MozillaCookieJar(self.cookie_path)
+        try:
+            jar.load(ignore_discard=True)
+        except (OSError, http.cookiejar.LoadError):
+            return 0
+        for cookie in jar:
+            self.session.cookies.set_cookie(cookie)
+        return len(jar)
+
+    def save_cookies(self):
+        """
+        先写临时文件再重命名，保存当前会话的 Cookie
+        """
+        if not self.cookie_path:
+            return
+        directory = os.path.dirname(self.cookie_path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        jar = http.cookiejar.MozillaCookieJar()
+        for cookie in self.session.cookies:
+            jar.set_cookie(cookie)
+        fd, temp_path = tempfile.mkstemp(prefix='.cookies-', suffix='.part', dir=directory)
+        os.close(fd)
+        try:
+            jar.save(temp_path, ignore_discard=True)
+            os.replace(temp_path, self.cookie_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def close(self):
+        self.save_cookies()
+        with self._lock:
+            for adapter in self._adapters.values():
+                adapter.close()
+        self.session.close()